@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+DOCUMENTATION = '''
+    name: reef_events
+    type: notification
+    short_description: Newline-delimited JSON event stream for reef
+    description:
+      - Writes one JSON object per line for playbook, play and task starts, every host
+        result (loop items included) and the final stats, so reef can follow a run
+        without parsing the human-readable output.
+      - Events go to the file descriptor in REEF_EVENTS_FD (a pipe opened by reef) or are
+        appended to REEF_EVENTS_FILE. Without either the plugin does nothing.
+    requirements:
+      - enabled through ANSIBLE_CALLBACKS_ENABLED (see reef.manager.ansible_events)
+'''
+
+import json
+import os
+import time
+
+from ansible.plugins.callback import CallbackBase
+
+MAX_MSG = 500
+
+
+class CallbackModule(CallbackBase):
+    CALLBACK_VERSION = 2.0
+    CALLBACK_TYPE = 'notification'
+    CALLBACK_NAME = 'reef_events'
+    CALLBACK_NEEDS_ENABLED = True
+
+    def __init__(self):
+        super().__init__()
+        self._out = None
+        self._task_started = {}
+        try:
+            if os.environ.get('REEF_EVENTS_FD'):
+                self._out = os.fdopen(int(os.environ['REEF_EVENTS_FD']), 'w', buffering=1)
+            elif os.environ.get('REEF_EVENTS_FILE'):
+                self._out = open(os.environ['REEF_EVENTS_FILE'], 'a', buffering=1)
+        except (OSError, ValueError):
+            self._out = None
+
+    def _emit(self, event, **data):
+        if self._out is None:
+            return
+        try:
+            self._out.write(json.dumps({'event': event, 'time': round(time.time(), 3), **data}, default=str) + "\n")
+        except (OSError, ValueError):
+            # Reader went away: keep the playbook running
+            self._out = None
+
+    def _task_fields(self, task):
+        role = task._role.get_name() if task._role else None
+        return {'task': task.get_name().strip(), 'uuid': task._uuid, 'action': task.action, 'role': role}
+
+    def _result(self, status, result, item=False, **extra):
+        res = result._result
+        task = result._task
+        started = self._task_started.get(task._uuid)
+        if status == 'ok' and res.get('changed'):
+            status = 'changed'
+        msg = res.get('msg') or res.get('stderr') or ""
+        data = {
+            'host': result._host.get_name(),
+            'status': status,
+            'changed': bool(res.get('changed')),
+            'msg': str(msg)[:MAX_MSG],
+            'duration': round(time.monotonic() - started, 3) if started else None,
+            **self._task_fields(task),
+            **extra,
+        }
+        if item:
+            data['item'] = str(self._get_item_label(res))[:MAX_MSG]
+        self._emit('item' if item else 'result', **data)
+
+    def v2_playbook_on_start(self, playbook):
+        self._emit('playbook_start', playbook=os.path.basename(playbook._file_name))
+
+    def v2_playbook_on_play_start(self, play):
+        self._emit('play_start', play=play.get_name().strip())
+
+    def v2_playbook_on_task_start(self, task, is_conditional):
+        self._task_started[task._uuid] = time.monotonic()
+        self._emit('task_start', **self._task_fields(task))
+
+    def v2_playbook_on_handler_task_start(self, task):
+        self._task_started[task._uuid] = time.monotonic()
+        self._emit('task_start', handler=True, **self._task_fields(task))
+
+    def v2_runner_on_ok(self, result):
+        self._result('ok', result)
+
+    def v2_runner_on_failed(self, result, ignore_errors=False):
+        self._result('failed', result, ignored=bool(ignore_errors))
+
+    def v2_runner_on_skipped(self, result):
+        self._result('skipped', result)
+
+    def v2_runner_on_unreachable(self, result):
+        self._result('unreachable', result)
+
+    def v2_runner_item_on_ok(self, result):
+        self._result('ok', result, item=True)
+
+    def v2_runner_item_on_failed(self, result):
+        self._result('failed', result, item=True)
+
+    def v2_runner_item_on_skipped(self, result):
+        self._result('skipped', result, item=True)
+
+    def v2_playbook_on_stats(self, stats):
+        # Per host: ok, changed, failures, unreachable, skipped, rescued, ignored
+        self._emit('stats', hosts={host: stats.summarize(host) for host in sorted(stats.processed)})
+        if self._out is not None:
+            try:
+                self._out.close()
+            except OSError:
+                pass
+            self._out = None
@@ -1,4 +1,4 @@
-import reef.click
+import click
 import os
 import subprocess
 import sys
@@ -10,6 +10,7 @@ from rich.prompt import Prompt, Confirm
 from rich.align import Align
 from pathlib import Path
 from ruamel.yaml import YAML
+from reef.manager.images import BASE_IMAGES, DEFAULT_OS
 
 # Initialize Rich Console
 console = Console()
@@ -34,9 +35,8 @@ def run_command(command, cwd=BASE_DIR, quiet=False):
         if VERBOSE_MODE:
             quiet = False
 
-        env = os.environ.copy()
-        env['ANSIBLE_CONFIG'] = str(ANSIBLE_DIR / "ansible.cfg")
-        env['ANSIBLE_ROLES_PATH'] = str(ANSIBLE_DIR / "roles")
+        from reef.manager.core import ansible_env
+        env = ansible_env()
 
         if quiet:
             with console.status(f"[bold blue]Running:[/bold blue] {command} ..."):
@@ -76,18 +76,30 @@ def run_command(command, cwd=BASE_DIR, quiet=False):
         
 from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn, TimeElapsedColumn
 
-def run_ansible_with_progress(command, cwd=BASE_DIR, total_tasks=100):
+def run_ansible_with_progress(command, cwd=BASE_DIR, total_results=None):
     """
     Run ansible-playbook with a progress bar.
-    Parses output to advance progress on "TASK [...]" lines.
+    Advances on each host result of the reef_events callback plugin, out of
+    total_results (see expected_playbook_results), with an ETA from past runs.
+    In verbose mode the ansible output is printed instead of the bar; the run is
+    recorded in the history either way.
     """
-    if VERBOSE_MODE:
-        return run_command(command, cwd=cwd, quiet=False)
-
+    import shlex
+    from reef.manager.tuning import playbook_args
+    # Forks, strategy and serial from the configuration (see reef.manager.tuning)
+    command = f"{command} {shlex.join(playbook_args())}"
+
+    import threading
+    from collections import deque
+    from reef.manager.ansible_events import PlaybookProgress, events_env, iter_events
+    from reef.manager.core import ansible_env
+    from reef.manager.run_history import compare_runs, previous_run, record_run, seconds_per_result
+    from reef.manager.task_count import eta_seconds, format_eta
+
+    process = None
+    read_fd, write_fd = os.pipe()
     try:
-        env = os.environ.copy()
-        env['ANSIBLE_CONFIG'] = str(ANSIBLE_DIR / "ansible.cfg")
-        env['ANSIBLE_ROLES_PATH'] = str(ANSIBLE_DIR / "roles")
+        env = ansible_env()
         
         process = subprocess.Popen(
             command,
@@ -97,46 +109,77 @@ def run_ansible_with_progress(command, cwd=BASE_DIR, total_tasks=100):
             stderr=subprocess.STDOUT,
             text=True,
             executable='/bin/bash',
-            env=env
+            env=events_env(env, write_fd),
+            pass_fds=(write_fd,)
         )
+        # Only ansible holds the write end now: the event stream ends with it
+        os.close(write_fd)
+        write_fd = None
+
+        # Keep the tail of the output for the error report, read alongside the events
+        tail = deque(maxlen=20)
+
+        def read_output():
+            for line in process.stdout:
+                tail.append(line.rstrip())
+                if VERBOSE_MODE:
+                    console.print(line.rstrip(), markup=False, highlight=False)
+
+        if VERBOSE_MODE:
+            console.print(f"[bold blue]Running:[/bold blue] {command}")
+        reader = threading.Thread(target=read_output, daemon=True)
+        reader.start()
         
-        task_pattern = re.compile(r'TASK \[(.*)\]')
-        
+        playbook = PlaybookProgress()
         with Progress(
             SpinnerColumn("dots", style="green"),
             TextColumn("[progress.description]{task.description}"),
             BarColumn(complete_style="green"),
             TextColumn("{task.percentage:>3.0f}%"),
             TimeElapsedColumn(),
+            TextColumn("[dim]{task.fields[eta]}[/dim]"),
             console=console,
-            transient=True
+            transient=True,
+            disable=VERBOSE_MODE
         ) as progress:
             # Initial setup with fixed width buffer
-            task_id = progress.add_task(f"[cyan]Task: {'Working...':<30}", total=total_tasks)
+            task_id = progress.add_task(f"[cyan]Task: {'Working...':<30}", total=total_results, eta="")
+            pace = None
             
-            while True:
-                line = process.stdout.readline()
-                if not line and process.poll() is not None:
-                    break
-                
-                if line:
-                    match = task_pattern.search(line)
-                    if match:
-                        task_name = match.group(1).strip()
-                        max_len = 30
-                        # Truncate if too long
-                        if len(task_name) > max_len:
-                            task_name = task_name[:max_len-3] + "..."
-                        
-                        # Update with padded string for fixed width
-                        progress.update(task_id, advance=1, description=f"[cyan]Task: {task_name:<{max_len}}")
-                        
-        if process.poll() != 0:
+            events, read_fd = iter_events(read_fd), None
+            for event in events:
+                playbook.feed(event)
+                if event['event'] == 'playbook_start':
+                    pace = seconds_per_result(playbook.playbook)
+                elif event['event'] == 'result':
+                    # More results than counted (dynamic includes): keep the bar just short of the end
+                    total = max(total_results or 0, playbook.results_done + 1)
+                    eta = format_eta(eta_seconds(playbook.results_done, total, pace))
+                    progress.update(task_id, completed=playbook.results_done, total=total, eta=eta)
+                elif event['event'] == 'task_start':
+                    task_name = playbook.current_task or ""
+                    max_len = 30
+                    # Truncate if too long
+                    if len(task_name) > max_len:
+                        task_name = task_name[:max_len-3] + "..."
+                    
+                    # Update with padded string for fixed width
+                    progress.update(task_id, description=f"[cyan]Task: {task_name:<{max_len}}")
+
+        process.wait()
+        reader.join(timeout=5)
+        run = record_run(playbook, process.returncode, command)
+        for row in compare_runs(run, previous_run(run))[:5] if run else []:
+            console.print(f"[yellow]Slower than last run:[/yellow] {row['kind']} {row['name']} "
+                          f"{row['seconds']}s ({row['ratio']}x, was {row['previous']}s)")
+        if process.returncode != 0:
              console.print(f"[bold red]Ansible failed with exit code {process.returncode}[/bold red]")
-             console.print("[dim]Last 20 lines of output:[/dim]")
-             # We can't easily get the full output here because we consumed it in the loop.
-             # But we can try to rely on the fact that we displayed tasks.
-             # A better approach for error reporting is to capture lines in a deque.
+             if playbook.failed_hosts:
+                 console.print(f"[red]Failed hosts:[/red] {', '.join(playbook.failed_hosts)}")
+             if not VERBOSE_MODE:
+                 console.print("[dim]Last 20 lines of output:[/dim]")
+                 for line in tail:
+                     console.print(line, markup=False, highlight=False)
              return False
         
         console.print("[bold green]Operation complete![/bold green]")
@@ -144,17 +187,33 @@ def run_ansible_with_progress(command, cwd=BASE_DIR, total_tasks=100):
 
     except KeyboardInterrupt:
         console.print("\n[bold yellow]Operation cancelled by user.[/bold yellow]")
-        try:
-            process.terminate()
-            process.wait(timeout=2)
-        except:
-            process.kill()
+        if process:
+            try:
+                process.terminate()
+                process.wait(timeout=2)
+            except:
+                process.kill()
         return False
 
     except Exception as e:
         console.print(f"[bold red]Error running ansible:[/bold red] {e}")
         return False
 
+    finally:
+        for fd in (read_fd, write_fd):
+            if fd is not None:
+                os.close(fd)
+
+def expected_playbook_results(playbook, enabled_roles=None):
+    """Host results a run of `playbook` on hosts.ini should report (cached static count), None if it cannot be counted."""
+    from reef.manager.task_count import expected_results
+    if enabled_roles is None:
+        enabled_roles = load_current_config().get('enabled_roles', [])
+    try:
+        return expected_results(playbook, HOSTS_INI_FILE, enabled_roles) or None
+    except OSError:
+        return None
+
 # Schema Configuration
 SCHEMA_FILE = BASE_DIR / "config.schema.yml"
 
@@ -605,7 +664,7 @@ def validate_roles_interactive():
     # Let's run a dry run.
     if Confirm.ask("Run full playbook dry-run (check mode) to validate?"):
         cmd = f"ansible-playbook {playbook} -i {inventory} --check"
-        run_ansible_with_progress(cmd, total_tasks=20)
+        run_ansible_with_progress(cmd, total_results=expected_playbook_results(playbook))
 
 
 def menu():
@@ -814,7 +873,8 @@ def check(ip, user):
         run_command(f"{script_path}")
 
 @cli.command()
-def deploy():
+@click.option('--sequential', is_flag=True, help='Run the server and agent plays one after the other in a single ansible-playbook.')
+def deploy(sequential=False):
     """
     Execute the Ansible playbook to deploy the security stack.
     
@@ -823,6 +883,9 @@ def deploy():
     - Firewall setup (UFW)
     - Wazuh Manager/Indexer/Dashboard installation
     - Client agent deployment
+
+    The server and the agents' base roles are installed in parallel; agents
+    enroll once the manager is up.
     """
     playbook = ANSIBLE_DIR / "playbooks" / "experimental.yml"
     inventory = HOSTS_INI_FILE
@@ -850,11 +913,100 @@ def deploy():
         update_yaml_config_from_schema(current_config)
 
     if Confirm.ask(f"Ready to deploy? The action is irreversible", default=True):
+        if not sequential:
+            if run_staged_deploy(current_config['enabled_roles']):
+                show_post_deployment_msg()
+            return
         cmd = f"ansible-playbook {playbook} -i {inventory}"
-        # Use progress bar unless verbose. Estimate ~110 tasks based on full playbook.
-        if run_ansible_with_progress(cmd, total_tasks=110):
+        # Use progress bar unless verbose
+        if run_ansible_with_progress(cmd, total_results=expected_playbook_results(playbook, current_config['enabled_roles'])):
             show_post_deployment_msg()
 
+def run_staged_deploy(enabled_roles):
+    """Deploy through the stage scheduler (reef.manager.scheduler), one progress bar per stage."""
+    import asyncio
+    from collections import deque
+    from reef.manager.scheduler import DEPLOY_PLAYBOOK, StagedDeploy
+    from reef.manager.task_count import expected_results
+
+    # Keep the tail of each stage's output for the error report
+    tails = {}
+
+    def log(line):
+        name, _, text = line[1:].partition("] ")
+        tails.setdefault(name, deque(maxlen=20)).append(text.rstrip())
+        if VERBOSE_MODE:
+            console.print(line.rstrip(), markup=False, highlight=False)
+
+    staged = StagedDeploy(enabled_roles, log_callback=log)
+    if not staged.stages:
+        console.print("[yellow]Nothing to deploy: no enabled role matches a host group in hosts.ini.[/yellow]")
+        return False
+
+    with Progress(
+        SpinnerColumn("dots", style="green"),
+        TextColumn("[progress.description]{task.description}"),
+        BarColumn(complete_style="green"),
+        TextColumn("{task.percentage:>3.0f}%"),
+        TimeElapsedColumn(),
+        console=console,
+        transient=True,
+        disable=VERBOSE_MODE
+    ) as progress:
+        bars, totals = {}, {}
+        width = max(len(stage['name']) for stage in staged.stages)
+        for stage in staged.stages:
+            total = totals[stage['name']] = expected_results(DEPLOY_PLAYBOOK, HOSTS_INI_FILE, enabled_roles, stage['hosts'],
+                                                             stage['roles']) or None
+            waiting = f"waiting for {', '.join(stage['after'])}" if stage['after'] else "starting"
+            bars[stage['name']] = progress.add_task(f"[cyan]{stage['name']:<{width}}[/cyan] {waiting:<30}", total=total)
+
+        def on_event(name, event):
+            stage_progress = staged.progress[name]
+            if event['event'] == 'task_start':
+                task_name = (stage_progress.current_task or "")[:30]
+                progress.update(bars[name], description=f"[cyan]{name:<{width}}[/cyan] {task_name:<30}")
+            elif event['event'] == 'result':
+                total = totals[name]
+                progress.update(bars[name], completed=stage_progress.results_done,
+                                total=max(total, stage_progress.results_done + 1) if total else None)
+
+        staged.on_event = on_event
+        try:
+            result = asyncio.run(staged.run())
+        except KeyboardInterrupt:
+            staged.cancel()
+            console.print("\n[bold yellow]Operation cancelled by user.[/bold yellow]")
+            return False
+
+    table = Table(title="Deployment Stages")
+    table.add_column("Stage", style="cyan")
+    table.add_column("Hosts")
+    table.add_column("Roles")
+    table.add_column("Seconds", justify="right")
+    table.add_column("Result")
+    for stage in staged.stages:
+        r = result['stages'].get(stage['name'], {})
+        outcome = "[green]ok[/green]" if r.get('success') else f"[red]{r.get('message', 'failed')}[/red]"
+        table.add_row(stage['name'], stage['hosts'], ", ".join(stage['roles']), str(r.get('seconds', '')), outcome)
+    console.print(table)
+    if not result['success']:
+        console.print(f"[bold red]{result['message']}[/bold red]")
+        for stage in staged.stages:
+            name = stage['name']
+            if name not in result['stages'] or result['stages'][name]['success']:
+                continue
+            console.print(f"\n[bold red]Stage {name} failed:[/bold red] {result['stages'][name]['message']}")
+            failed_hosts = staged.progress[name].failed_hosts if name in staged.progress else []
+            if failed_hosts:
+                console.print(f"[red]Failed hosts:[/red] {', '.join(failed_hosts)}")
+            console.print("[dim]Last 20 lines of output:[/dim]")
+            for line in tails.get(name, []):
+                console.print(line, markup=False, highlight=False)
+        return False
+    console.print(f"[bold green]{result['message']}[/bold green]")
+    return True
+
 def show_post_deployment_msg():
     """Display success message with credentials."""
     yaml = YAML()
@@ -913,8 +1065,282 @@ def cleanup():
         playbook = ANSIBLE_DIR / "playbooks" / "experimental.yml"
         inventory = HOSTS_INI_FILE
         cmd = f"ansible-playbook {playbook} -i {inventory} -e '{{\"enabled_roles\": [\"cleanup\"]}}'"
-        # Use progress bar with accurate estimated tasks for cleanup (approx 44-50)
-        run_ansible_with_progress(cmd, total_tasks=50)
+        run_ansible_with_progress(cmd, total_results=expected_playbook_results(playbook, ['cleanup']))
+
+def show_run_timing(run, limit=10):
+    """Print the slowest tasks and hosts of a run history entry and what got slower since the previous run."""
+    from reef.manager.run_history import compare_runs, previous_run, slowest_hosts, slowest_tasks
+    tasks = Table(title="Slowest Tasks")
+    tasks.add_column("Task", style="cyan")
+    tasks.add_column("Role")
+    tasks.add_column("Hosts", justify="right")
+    tasks.add_column("Seconds", justify="right")
+    for row in slowest_tasks(run, limit):
+        tasks.add_row(row['task'], row['role'] or "[dim]-[/dim]", str(row['hosts']), f"{row['seconds']:.1f}")
+    console.print(tasks)
+
+    hosts = Table(title="Slowest Hosts")
+    hosts.add_column("Host", style="cyan")
+    hosts.add_column("Tasks", justify="right")
+    hosts.add_column("Slowest Task")
+    hosts.add_column("Seconds", justify="right")
+    for row in slowest_hosts(run, limit):
+        hosts.add_row(row['host'], str(row['tasks']), row['slowest_task'], f"{row['seconds']:.1f}")
+    console.print(hosts)
+
+    previous = previous_run(run)
+    if previous is None:
+        console.print("[dim]No previous run of this playbook to compare with.[/dim]")
+        return
+    slower = compare_runs(run, previous)
+    if not slower:
+        console.print("[green]Nothing got notably slower since the previous run.[/green]")
+    for row in slower:
+        console.print(f"[bold red]{row['ratio']}x[/bold red] {row['kind']} {row['name']}: "
+                      f"{row['seconds']}s (was {row['previous']}s)")
+
+
+@cli.command()
+@click.option('--runs', '-n', 'count', default=5, show_default=True, help='Number of past runs to list.')
+@click.option('--limit', default=10, show_default=True, help='Rows in the slowest tasks/hosts tables.')
+def history(count, limit):
+    """Show past playbook runs and where the time of the last one went."""
+    from reef.manager.run_history import load_runs
+    runs = load_runs()
+    if not runs:
+        console.print("[yellow]No playbook run recorded yet. Runs are recorded by 'reef deploy' and the web UI.[/yellow]")
+        return
+    table = Table(title="Playbook Runs")
+    table.add_column("Started")
+    table.add_column("Playbook", style="cyan")
+    table.add_column("Hosts", justify="right")
+    table.add_column("Duration", justify="right")
+    table.add_column("Result")
+    for run in runs[-count:]:
+        started = time.strftime('%Y-%m-%d %H:%M', time.localtime(run['started_at']))
+        minutes = (run['ended_at'] - run['started_at']) / 60
+        result = "[green]ok[/green]" if run['returncode'] == 0 else f"[red]exit {run['returncode']}[/red]"
+        table.add_row(started, run.get('playbook') or "-", str(len({t['host'] for t in run['timings']})),
+                      f"{minutes:.1f} min", result)
+    console.print(table)
+    show_run_timing(runs[-1], limit)
+
+
+@cli.group()
+def vm():
+    """
+    Manage the VMs provisioned on the security server.
+
+    The wanted set of VMs is kept in inventory/vms.yml; every change is applied
+    incrementally, so existing VMs are left untouched.
+    """
+
+
+def _apply_vm_state(passwords=None, deploy=None):
+    """
+    Converge the manager to inventory/vms.yml, streaming Terraform output.
+    Ctrl-C cancels the run cleanly (terraform on the manager is interrupted, not killed).
+
+    deploy: VM names that get their agent roles as soon as they are up, while the
+    others are still provisioning (None: no deployment)
+    """
+    import asyncio
+    import signal
+    from reef.manager.engine import ProvisioningJob
+    from reef.manager.pipeline import AgentPipeline
+
+    def log(msg):
+        console.print(msg.rstrip("\n"), markup=False, highlight=False)
+
+    async def drive():
+        pipeline = AgentPipeline(passwords, vm_names=deploy, log_callback=log) if deploy is not None else None
+
+        def ip_found(vm_name, vm_ip):
+            console.print(f"[green]{vm_name}[/green] is up at [bold]{vm_ip}[/bold]")
+            if pipeline:
+                pipeline.on_ip(vm_name, vm_ip)
+
+        def cancel():
+            job.cancel("Provisioning cancelled by user")
+            if pipeline:
+                pipeline.cancel()
+
+        job = await ProvisioningJob('apply_vm_state', {'passwords': passwords}).start()
+        asyncio.get_running_loop().add_signal_handler(signal.SIGINT, cancel)
+        result = await job.run(log, ip_found)
+        deployed = await pipeline.finish(result.get('ips')) if pipeline else None
+        return result, deployed
+
+    result, deployed = asyncio.run(drive())
+    if result.get('success'):
+        console.print(f"[bold green]{result['message']}[/bold green]")
+    else:
+        console.print(f"[bold red]Provisioning failed:[/bold red] {result.get('message')}")
+    if deployed:
+        style = "bold green" if deployed['success'] else "bold red"
+        console.print(f"[{style}]{deployed['message']}[/{style}]")
+        return result.get('success', False) and deployed['success']
+    return result.get('success', False)
+
+
+@vm.command('list')
+def vm_list():
+    """Show the desired VMs and their inventory IPs."""
+    from reef.manager.vm_state import load_vm_state
+    # The manager's parser: unlike the CLI's, it reads vm_name from hosts.ini
+    from reef.manager.core import get_inventory_hosts as inventory_hosts
+    vms = load_vm_state()
+    if not vms:
+        console.print("[yellow]No VMs in desired state. Use 'reef vm add' to create some.[/yellow]")
+        return
+    ips = {h.get('vm_name'): h['ip'] for h in inventory_hosts() if h.get('vm_name')}
+    table = Table(title="Virtual Machines")
+    table.add_column("Name", style="cyan")
+    table.add_column("OS")
+    table.add_column("Hypervisor")
+    table.add_column("IP")
+    for entry in vms:
+        name = f"{entry['name']} [dim](warm pool)[/dim]" if entry.get('pool') else entry['name']
+        table.add_row(name, entry['os'], entry.get('hypervisor') or "[dim]not placed[/dim]",
+                      ips.get(entry['name']) or entry.get('ip') or "[dim]not provisioned[/dim]")
+    console.print(table)
+
+
+@vm.command('add')
+@click.argument('names', nargs=-1)
+@click.option('--count', '-n', default=1, show_default=True, help='Number of VMs to add when no names are given.')
+@click.option('--prefix', default='vm', show_default=True, help='Name prefix for generated VM names.')
+@click.option('--os', 'os_name', type=click.Choice(list(BASE_IMAGES)), default=DEFAULT_OS, show_default=True)
+@click.option('--password', prompt='VM SSH password', hide_input=True, confirmation_prompt=True, help='SSH password of the VM user.')
+@click.option('--no-apply', is_flag=True, help='Only update the desired state, do not run Terraform.')
+@click.option('--deploy', is_flag=True, help='Install the agent roles on each new VM as soon as it is up.')
+def vm_add(names, count, prefix, os_name, password, no_apply, deploy):
+    """Add VMs (by NAME, or COUNT generated names) and provision them."""
+    from reef.manager.vm_state import add_vms, next_vm_names
+    names = list(names) or next_vm_names(prefix, count)
+    result = add_vms([{'name': n, 'ssh_password': password, 'os': os_name} for n in names])
+    if not result['success']:
+        console.print(f"[bold red]{result['message']}[/bold red]")
+        sys.exit(1)
+    console.print(f"[green]{result['message']}:[/green] {', '.join(result['vms'])}")
+    if not no_apply and not _apply_vm_state({n: password for n in result['vms']}, result['vms'] if deploy else None):
+        sys.exit(1)
+
+
+@vm.command('remove')
+@click.argument('names', nargs=-1, required=True)
+@click.option('--yes', '-y', is_flag=True, help='Do not ask for confirmation.')
+@click.option('--no-apply', is_flag=True, help='Only update the desired state, do not run Terraform.')
+def vm_remove(names, yes, no_apply):
+    """Remove VMs by NAME and destroy them (disks included)."""
+    from reef.manager.vm_state import remove_vms
+    if not yes and not Confirm.ask(f"[bold red]Destroy {', '.join(names)}? Their disks will be deleted.[/bold red]", default=False):
+        return
+    result = remove_vms(list(names))
+    if not result['success']:
+        console.print(f"[bold red]{result['message']}[/bold red]")
+        sys.exit(1)
+    console.print(f"[green]{result['message']}[/green]")
+    if not no_apply and not _apply_vm_state():
+        sys.exit(1)
+
+
+@vm.command('claim')
+@click.argument('names', nargs=-1, required=True)
+@click.option('--os', 'os_name', type=click.Choice(list(BASE_IMAGES)), default=None, help='Only claim pool VMs of this OS.')
+@click.option('--no-refill', is_flag=True, help='Do not refill the warm pool in the background.')
+def vm_claim(names, os_name, no_refill):
+    """Take VMs from the warm pool (see vm_pool_size) and name them NAMES, in seconds."""
+    from reef.manager.pool import claim_vm
+    from reef.manager.engine import start_detached
+    claimed = 0
+    for name in names:
+        result = claim_vm(name, os_name)
+        if not result['success']:
+            console.print(f"[bold red]{name}: {result['message']}[/bold red]")
+            continue
+        claimed += 1
+        vm_info = result['vm']
+        console.print(f"[green]{result['message']}[/green] "
+                      f"ssh {vm_info['user']}@{vm_info['ip']} (via {vm_info['hypervisor']}), password: {vm_info['password']}")
+    if claimed and not no_refill:
+        log_path = BASE_DIR / "cache" / "pool-refill.log"
+        pid = start_detached('apply_vm_state', log_path=log_path)
+        console.print(f"[dim]Refilling the warm pool in the background (pid {pid}, log: {log_path})[/dim]")
+    if claimed < len(names):
+        sys.exit(1)
+
+
+def _vm_lifecycle(operation, names, snapshot=None):
+    from reef.manager.vm_lifecycle import run_lifecycle
+
+    def log(msg):
+        console.print(msg.rstrip("\n"), markup=False, highlight=False)
+
+    with console.status(f"[bold blue]{operation.capitalize()}...[/bold blue]"):
+        result = run_lifecycle(operation, list(names) or None, snapshot, log)
+    if not result['success']:
+        console.print(f"[bold red]{result['message']}[/bold red]")
+        sys.exit(1)
+    console.print(f"[green]{result['message']}[/green]")
+
+
+@vm.command('start')
+@click.argument('names', nargs=-1)
+def vm_start(names):
+    """Start VMs by NAME (all VMs when none are given)."""
+    _vm_lifecycle('start', names)
+
+
+@vm.command('stop')
+@click.argument('names', nargs=-1)
+def vm_stop(names):
+    """Shut VMs down gracefully (all VMs when no NAME is given)."""
+    _vm_lifecycle('stop', names)
+
+
+@vm.command('destroy')
+@click.argument('names', nargs=-1)
+@click.option('--yes', '-y', is_flag=True, help='Do not ask for confirmation.')
+def vm_destroy(names, yes):
+    """Power VMs off at once, like pulling the plug (disks are kept; see 'reef vm remove')."""
+    if not yes and not Confirm.ask(f"[bold red]Power off {', '.join(names) or 'all VMs'}?[/bold red]", default=False):
+        return
+    _vm_lifecycle('destroy', names)
+
+
+@vm.command('snapshot')
+@click.argument('snapshot')
+@click.argument('names', nargs=-1)
+def vm_snapshot(snapshot, names):
+    """Take snapshot SNAPSHOT of VMs by NAME (all VMs when none are given)."""
+    _vm_lifecycle('snapshot', names, snapshot)
+
+
+@vm.command('revert')
+@click.argument('snapshot')
+@click.argument('names', nargs=-1)
+@click.option('--yes', '-y', is_flag=True, help='Do not ask for confirmation.')
+def vm_revert(snapshot, names, yes):
+    """Revert VMs by NAME (all VMs when none are given) to snapshot SNAPSHOT."""
+    if not yes and not Confirm.ask(f"[bold red]Revert {', '.join(names) or 'all VMs'} to '{snapshot}'? Later changes are lost.[/bold red]", default=False):
+        return
+    _vm_lifecycle('revert', names, snapshot)
+
+
+@vm.command('apply')
+@click.option('--force', is_flag=True, help='Run Terraform even if nothing changed since the last successful apply.')
+@click.option('--deploy', is_flag=True, help='Install the agent roles on each VM as soon as it is up.')
+def vm_apply(force, deploy):
+    """Re-apply the desired state after --no-apply changes or a failed run."""
+    from reef.manager.vm_state import load_vm_state
+    if force:
+        from reef.manager.applied import forget_applied
+        forget_applied()
+    # Idle warm-pool VMs stay out of hosts.ini until claimed: nothing to deploy on them
+    if not _apply_vm_state(deploy=[vm['name'] for vm in load_vm_state() if not vm.get('pool')] if deploy else None):
+        sys.exit(1)
+
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,109 @@
+import asyncio
+import json
+import os
+from pathlib import Path
+
+# Directory of the reef_events callback plugin (reef/ansible/callback_plugins)
+CALLBACK_DIR = Path(__file__).parent.parent / "ansible" / "callback_plugins"
+CALLBACK_NAME = "reef_events"
+
+# Result rows of the task table, in the words of ansible's default output
+TABLE_STATUSES = {'ok': 'ok', 'changed': 'changed', 'failed': 'fatal', 'unreachable': 'unreachable'}
+
+
+def events_env(env, fd):
+    """
+    Enable the reef_events callback in `env` (a copy of os.environ), writing to the
+    inherited file descriptor `fd`; the default stdout callback keeps printing the log.
+    """
+    env = dict(env)
+    paths = [str(CALLBACK_DIR)] + [p for p in env.get('ANSIBLE_CALLBACK_PLUGINS', "").split(os.pathsep) if p]
+    env['ANSIBLE_CALLBACK_PLUGINS'] = os.pathsep.join(paths)
+    enabled = [c for c in env.get('ANSIBLE_CALLBACKS_ENABLED', "").split(",") if c.strip()]
+    env['ANSIBLE_CALLBACKS_ENABLED'] = ",".join(enabled + [CALLBACK_NAME])
+    env['REEF_EVENTS_FD'] = str(fd)
+    return env
+
+
+def parse_event(line):
+    """Event dict of one line of the stream, None for anything else."""
+    if isinstance(line, bytes):
+        line = line.decode(errors='replace')
+    try:
+        event = json.loads(line)
+    except ValueError:
+        return None
+    return event if isinstance(event, dict) and 'event' in event else None
+
+
+def iter_events(read_fd):
+    """Events read from the pipe `read_fd` until ansible closes it (blocking; closes the fd)."""
+    with os.fdopen(read_fd, 'rb') as stream:
+        for line in stream:
+            event = parse_event(line)
+            if event:
+                yield event
+
+
+async def stream_events(read_fd, on_event):
+    """Call on_event with every event read from the pipe `read_fd`, without blocking the loop."""
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=2 ** 20)
+    transport, _ = await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), os.fdopen(read_fd, 'rb'))
+    try:
+        async for line in reader:
+            event = parse_event(line)
+            if event:
+                on_event(event)
+    finally:
+        transport.close()
+
+
+class PlaybookProgress:
+    """
+    Run state folded from the event stream: the running task, how many tasks started
+    and host results came in (what progress bars count), one row per host result ({'host', 'task', 'status'}, for the task tables), their
+    timings ({'host', 'task', 'role', 'status', 'start', 'end', 'duration'}, for the
+    run history) and the final per-host stats.
+    """
+
+    def __init__(self):
+        self.playbook = None
+        self.started_at = None
+        self.ended_at = None
+        self.current_task = None
+        self.tasks_started = 0
+        self.results_done = 0
+        self.results = []
+        self.timings = []
+        self.stats = None
+
+    def feed(self, event):
+        kind = event.get('event')
+        if self.started_at is None:
+            self.started_at = event.get('time')
+        self.ended_at = event.get('time') or self.ended_at
+        if kind == 'playbook_start':
+            self.playbook = event.get('playbook')
+        elif kind == 'task_start':
+            self.current_task = event.get('task')
+            self.tasks_started += 1
+        elif kind == 'result':
+            self.results_done += 1
+            status = event.get('status')
+            if status in TABLE_STATUSES:
+                label = 'ignored' if status == 'failed' and event.get('ignored') else TABLE_STATUSES[status]
+                self.results.append({'host': event.get('host'), 'task': event.get('task') or self.current_task,
+                                     'status': label})
+            end, duration = event.get('time'), event.get('duration')
+            if end is not None and duration is not None:
+                self.timings.append({'host': event.get('host'), 'task': event.get('task') or self.current_task,
+                                     'role': event.get('role'), 'status': status,
+                                     'start': round(end - duration, 3), 'end': end, 'duration': duration})
+        elif kind == 'stats':
+            self.stats = event.get('hosts') or {}
+
+    @property
+    def failed_hosts(self):
+        """Hosts with failures or unreachable in the final stats."""
+        return sorted(host for host, s in (self.stats or {}).items() if s.get('failures') or s.get('unreachable'))
@@ -0,0 +1,68 @@
+import hashlib
+import json
+import threading
+import time
+from pathlib import Path
+
+APPLIED_CACHE_FILE = Path(__file__).parent.parent / "cache" / "applied.json"
+
+# Rendered terraform inputs: the module, its templates and the variables
+INPUT_PATTERNS = ("*.tf", "*.cfg", "*.xsl", "*.tfvars.json")
+
+
+def inputs_hash(terraform_dir, manager_ip, manager_user):
+    """Hash of the rendered terraform inputs in `terraform_dir` and the manager they are applied on."""
+    digest = hashlib.sha256(f"{manager_user}@{manager_ip}\n".encode())
+    files = sorted({f for pattern in INPUT_PATTERNS for f in Path(terraform_dir).glob(pattern)})
+    for path in files:
+        digest.update(f"{path.name}\n".encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def load_applied_cache():
+    """Local record of the last successful apply, keyed by manager IP."""
+    if APPLIED_CACHE_FILE.exists():
+        try:
+            return json.loads(APPLIED_CACHE_FILE.read_text())
+        except ValueError:
+            pass
+    return {}
+
+
+# Hypervisors are applied in parallel threads that share the cache file
+_cache_lock = threading.Lock()
+
+
+def _write(cache):
+    APPLIED_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    APPLIED_CACHE_FILE.write_text(json.dumps(cache, indent=2, sort_keys=True))
+
+
+def last_applied(manager_ip, inputs):
+    """
+    VM IPs ({name: ip}) recorded by the last successful apply on `manager_ip` if it
+    was made from the same inputs (see inputs_hash), else None.
+    """
+    entry = load_applied_cache().get(manager_ip)
+    if not entry or entry.get('inputs') != inputs:
+        return None
+    return entry.get('ips')
+
+
+def record_applied(manager_ip, inputs, ips):
+    with _cache_lock:
+        cache = load_applied_cache()
+        cache[manager_ip] = {'inputs': inputs, 'ips': ips, 'applied_at': int(time.time())}
+        _write(cache)
+
+
+def forget_applied(manager_ip=None):
+    """Drop the record of `manager_ip` (all managers when None), so the next apply runs in full."""
+    with _cache_lock:
+        cache = load_applied_cache()
+        if manager_ip is None:
+            cache = {}
+        elif cache.pop(manager_ip, None) is None:
+            return
+        _write(cache)
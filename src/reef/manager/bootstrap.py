@@ -0,0 +1,68 @@
+import json
+from pathlib import Path
+
+BOOTSTRAP_SCRIPT = Path(__file__).parent.parent / "scripts" / "manager-bootstrap.sh"
+REPORT_MARKER = "REEF_BOOTSTRAP_REPORT "
+
+
+def remote_script_command(*args):
+    """
+    Remote command that runs a bash script received on stdin with `args`.
+    The script is spooled to a temp file first so package managers or sudo
+    prompts inside it can't swallow the rest of the script from stdin.
+    """
+    arg_str = " ".join(str(a) for a in args)
+    return (
+        f'tmp=$(mktemp /tmp/reef-script.XXXXXX) && cat > "$tmp" && '
+        f'bash "$tmp" {arg_str}; rc=$?; rm -f "$tmp"; exit $rc'
+    )
+
+
+def bootstrap_command(ssh_user):
+    """Remote command that runs manager-bootstrap.sh (sent on stdin) for `ssh_user`."""
+    return remote_script_command(ssh_user)
+
+
+def parse_report(output):
+    """Extract the JSON report printed by manager-bootstrap.sh. Returns a dict or None."""
+    for line in reversed((output or "").splitlines()):
+        if line.startswith(REPORT_MARKER):
+            try:
+                return json.loads(line[len(REPORT_MARKER):])
+            except ValueError:
+                return None
+    return None
+
+
+def progress_lines(output):
+    """Human readable progress lines (everything except the report)."""
+    return [line for line in (output or "").splitlines() if line and not line.startswith(REPORT_MARKER)]
+
+
+def run_bootstrap(session, log_callback=None):
+    """
+    Upload and run the manager bootstrap in a single SSH round trip.
+
+    Returns: {'success': True/False, 'message': str, 'report': dict}
+    """
+    script = BOOTSTRAP_SCRIPT.read_text()
+    result = session.run(bootstrap_command(session.user), input=script)
+
+    if log_callback:
+        for line in progress_lines(result.stdout):
+            log_callback(f"[TF] {line}\n")
+
+    report = parse_report(result.stdout)
+    if report is None:
+        return {
+            'success': False,
+            'message': f"Manager bootstrap did not return a report (exit {result.returncode}): {result.stderr.strip()}",
+            'report': {}
+        }
+
+    if "libvirt install failed" in report.get('errors', []):
+        return {'success': False, 'message': "Failed to install libvirt on manager", 'report': report}
+    if not report.get('genisoimage'):
+        return {'success': False, 'message': "Failed to install genisoimage (mkisofs)", 'report': report}
+
+    return {'success': True, 'message': "Manager bootstrap completed", 'report': report}
@@ -0,0 +1,163 @@
+VIRSH = "sudo -n virsh -c qemu:///system"
+POOL = "default"
+CAPACITY_MARKER = "REEF_CAPACITY "
+
+# Resources each VM takes (the sizes generate_terraform_vm_config gives terraform). Disks are
+# thin overlays, but their full size is reserved so that filling VMs cannot exhaust the pool
+VM_MEMORY_MB = 2048
+VM_VCPUS = 1
+VM_DISK_GB = 16
+VM_DISK_MB = VM_DISK_GB * 1024
+
+ACCELERATION_MODES = ('auto', 'kvm', 'tcg')
+
+# Smallest sizes the pre-flight shrinks VMs to before refusing
+MIN_MEMORY_MB = 256
+MIN_VCPUS = 1
+MIN_DISK_GB = 8
+
+HOST_RESERVED_MB = 1024   # memory left to the hypervisor itself
+VCPU_OVERCOMMIT = 4       # vCPUs per physical CPU
+
+
+def configured_vm_size():
+    """
+    Size and acceleration of new VMs from the configuration (vm_memory_mb, vm_vcpus,
+    vm_acceleration), with the defaults above. Returns {'memory', 'vcpu', 'acceleration'}.
+    """
+    # Imported here: core imports this module at load time
+    from reef.manager.core import load_current_config
+    cfg = load_current_config()
+    try:
+        memory = max(MIN_MEMORY_MB, int(cfg.get('vm_memory_mb', VM_MEMORY_MB)))
+        vcpu = max(MIN_VCPUS, int(cfg.get('vm_vcpus', VM_VCPUS)))
+    except (TypeError, ValueError):
+        memory, vcpu = VM_MEMORY_MB, VM_VCPUS
+    acceleration = cfg.get('vm_acceleration', 'auto')
+    return {'memory': memory, 'vcpu': vcpu, 'acceleration': acceleration if acceleration in ACCELERATION_MODES else 'auto'}
+
+
+def use_kvm(acceleration, capacity):
+    """Whether new VMs get the accelerated profile. Returns (bool, error message or None)."""
+    kvm = bool(capacity and capacity.get('kvm'))
+    if acceleration == 'kvm' and not kvm:
+        return False, "KVM acceleration required (vm_acceleration: kvm) but the hypervisor cannot run KVM guests"
+    return acceleration != 'tcg' and kvm, None
+
+
+def capacity_command():
+    """
+    Remote command printing one "REEF_CAPACITY ..." line: total and available memory,
+    CPUs, memory and vCPUs of the running domains, free space in the storage pool and
+    whether libvirt can run KVM guests (1/0).
+    """
+    return (
+        "mem=$(awk '/^MemTotal/ {t=int($2/1024)} /^MemAvailable/ {a=int($2/1024)} END {print t, a}' /proc/meminfo); "
+        f"doms=$(for d in $({VIRSH} list --name 2>/dev/null); do {VIRSH} dominfo $d 2>/dev/null; done | "
+        "awk '/^Max memory/ {m+=$3} /^CPU\\(s\\)/ {c+=$2} END {print int(m/1024), c+0}'); "
+        f"pool=$({VIRSH} pool-info {POOL} --bytes 2>/dev/null | awk '/^Available/ {{print int($2/1048576)}}'); "
+        f"kvm=0; [ -e /dev/kvm ] && {VIRSH} domcapabilities --virttype kvm >/dev/null 2>&1 && kvm=1; "
+        f'echo "{CAPACITY_MARKER}$mem $(nproc) $doms ${{pool:-0}} $kvm"'
+    )
+
+
+def parse_capacity(output):
+    """Free resources {'memory_mb', 'vcpus', 'disk_mb', 'kvm'} from capacity_command() output, or None."""
+    for line in (output or "").splitlines():
+        if not line.startswith(CAPACITY_MARKER):
+            continue
+        try:
+            total, available, cpus, dom_memory, dom_vcpus, pool, kvm = (int(v) for v in line[len(CAPACITY_MARKER):].split())
+        except ValueError:
+            return None
+        # Guests only touch their memory over time, so count what running domains were given
+        return {
+            'memory_mb': max(0, min(total - HOST_RESERVED_MB - dom_memory, available - HOST_RESERVED_MB)),
+            'vcpus': max(0, cpus * VCPU_OVERCOMMIT - dom_vcpus),
+            'disk_mb': pool,
+            'kvm': bool(kvm),
+        }
+    return None
+
+
+def probe_capacity(session):
+    """Free resources of the hypervisor behind `session` (see parse_capacity), or None."""
+    return parse_capacity(session.run(capacity_command(), timeout=60).stdout)
+
+
+def plan_placement(vm_names, capacities, memory_mb=VM_MEMORY_MB, vcpus=VM_VCPUS, disk_mb=VM_DISK_MB):
+    """
+    Place `vm_names` on hypervisors, given their free resources ({host: parse_capacity()}).
+    Each VM goes to the host with the most free memory that still fits it, which
+    spreads VMs across the pool.
+
+    Returns: {'success': True/False, 'message': str, 'placement': {vm: host}, 'unplaced': [vm]}
+    """
+    free = {host: dict(cap) for host, cap in capacities.items() if cap}
+    placement = {}
+    unplaced = []
+    for name in vm_names:
+        fits = [host for host, cap in free.items()
+                if cap['memory_mb'] >= memory_mb and cap['vcpus'] >= vcpus and cap['disk_mb'] >= disk_mb]
+        if not fits:
+            unplaced.append(name)
+            continue
+        host = max(fits, key=lambda h: free[h]['memory_mb'])
+        free[host]['memory_mb'] -= memory_mb
+        free[host]['vcpus'] -= vcpus
+        free[host]['disk_mb'] -= disk_mb
+        placement[name] = host
+
+    if unplaced:
+        return {
+            'success': False,
+            'message': f"Not enough free capacity on {len(free)} hypervisor(s) for: {', '.join(unplaced)}",
+            'placement': placement,
+            'unplaced': unplaced,
+        }
+    return {'success': True, 'message': f"Placed {len(placement)} VM(s) on {len(set(placement.values()))} hypervisor(s)",
+            'placement': placement, 'unplaced': []}
+
+
+def size_vms(requested, capacity):
+    """
+    Pre-flight sizing of the VMs about to be created on one hypervisor.
+
+    requested: {name: {'memory', 'vcpu', 'disk_gb'}} sizes asked for
+    capacity: free resources of the hypervisor (parse_capacity)
+
+    While the total does not fit, the largest VM is shrunk (memory halved down to
+    MIN_MEMORY_MB, one vCPU less down to MIN_VCPUS, disk halved down to MIN_DISK_GB).
+
+    Returns: {'success': True/False, 'message': str, 'sizes': {name: {'memory', 'vcpu', 'disk_gb'}}, 'resized': [name]}
+    """
+    sizes = {name: {key: size[key] for key in ('memory', 'vcpu', 'disk_gb')} for name, size in requested.items()}
+    limits = [
+        ('memory', capacity['memory_mb'], 1, lambda v: max(MIN_MEMORY_MB, v // 2), MIN_MEMORY_MB),
+        ('vcpu', capacity['vcpus'], 1, lambda v: max(MIN_VCPUS, v - 1), MIN_VCPUS),
+        ('disk_gb', capacity['disk_mb'], 1024, lambda v: max(MIN_DISK_GB, v // 2), MIN_DISK_GB),
+    ]
+    for key, free, unit, shrink, floor in limits:
+        while sum(size[key] for size in sizes.values()) * unit > free:
+            # Latest VMs first: the first ones keep the size asked for as long as possible
+            largest = max(reversed(list(sizes.values())), key=lambda size: size[key])
+            if largest[key] <= floor:
+                break
+            largest[key] = shrink(largest[key])
+
+    count = len(sizes)
+    need = {key: sum(size[key] for size in sizes.values()) * unit for key, _, unit, _, _ in limits}
+    if need['memory'] > capacity['memory_mb'] or need['vcpu'] > capacity['vcpus'] or need['disk_gb'] > capacity['disk_mb']:
+        return {
+            'success': False,
+            'message': (f"Not enough capacity for {count} new VM(s): {capacity['memory_mb']} MB RAM, "
+                        f"{capacity['vcpus']} vCPU(s) and {capacity['disk_mb']} MB disk free, at least "
+                        f"{need['memory']} MB, {need['vcpu']} vCPU(s) and {need['disk_gb']} MB needed "
+                        f"({MIN_MEMORY_MB} MB / {MIN_VCPUS} vCPU / {MIN_DISK_GB} GB each). "
+                        f"Remove VMs or add a hypervisor."),
+            'sizes': sizes,
+            'resized': [],
+        }
+    resized = [name for name, size in sizes.items()
+               if any(size[key] != requested[name][key] for key in ('memory', 'vcpu', 'disk_gb'))]
+    return {'success': True, 'message': f"{count} new VM(s) fit ({len(resized)} resized)", 'sizes': sizes, 'resized': resized}
@@ -0,0 +1,53 @@
+import hashlib
+import re
+from pathlib import Path
+
+CLOUD_INIT_TEMPLATE = Path(__file__).parent.parent / "terraform" / "cloud_init.cfg"
+VIRSH = "sudo -n virsh -c qemu:///system"
+POOL = "default"
+
+
+def render_user_data(hostname, user_name, user_passwd, template=None):
+    """Render cloud_init.cfg the way terraform's templatefile() does for our ${...} placeholders."""
+    template = template if template is not None else CLOUD_INIT_TEMPLATE.read_text()
+    values = {'hostname': hostname, 'user_name': user_name, 'user_passwd': user_passwd}
+    return re.sub(r'\$\{(\w+)\}', lambda m: str(values.get(m.group(1), m.group(0))), template)
+
+
+def iso_name(vm_name, user_data):
+    """
+    Content-addressed cloud-init disk name: it only changes when the rendered
+    user-data does, so unchanged VMs stay no-ops in the terraform plan.
+    """
+    return f"cloudinit-{vm_name}-{hashlib.sha256(user_data.encode()).hexdigest()[:12]}.iso"
+
+
+def iso_pattern(vm_name):
+    """Shell ERE matching every cloud-init disk name of `vm_name` (content-addressed or not)."""
+    return rf"^cloudinit-{vm_name}(-[0-9a-f]{{12}})?\.iso$"
+
+
+def gc_command(keep=()):
+    """
+    Remote command deleting cloudinit-*.iso volumes of the pool that no defined
+    domain uses and that are not in `keep`. Prints each deleted volume name.
+    """
+    keep_str = " ".join(keep)
+    return (
+        f"used=$(for d in $({VIRSH} list --all --name); do "
+        f"{VIRSH} domblklist $d --details 2>/dev/null | awk '$2 == \"cdrom\" || $2 == \"disk\" {{print $4}}'; "
+        f"done | xargs -r -n1 basename); "
+        f"for v in $({VIRSH} vol-list {POOL} 2>/dev/null | awk '$1 ~ /^cloudinit-.*\\.iso$/ {{print $1}}'); do "
+        f"printf '%s\\n' $used {keep_str} | grep -qxF \"$v\" && continue; "
+        f"{VIRSH} vol-delete --pool {POOL} \"$v\" >/dev/null 2>&1 && echo \"$v\"; "
+        f"done; true"
+    )
+
+
+def collect_orphaned_isos(session, keep=(), log_callback=None):
+    """Garbage-collect unreferenced cloud-init ISOs from the manager's pool. Returns the deleted names."""
+    result = session.run(gc_command(keep))
+    removed = result.stdout.split()
+    if removed and log_callback:
+        log_callback(f"[TF] Removed {len(removed)} orphaned cloud-init ISO(s): {', '.join(removed)}\n")
+    return removed
@@ -0,0 +1,290 @@
+import asyncio
+import json
+import os
+import re
+import signal
+import sys
+import threading
+import time
+from pathlib import Path
+
+# Log lines opening a provisioning step (the step's timeout starts over when it is re-entered)
+STEP_MARKERS = [
+    ("[TF] Bootstrapping manager", 'bootstrap'),
+    ("[TF] Preparing remote directory", 'prepare'),
+    ("[TF] Copying Terraform files", 'upload'),
+    ("[TF] Running: terraform init", 'init'),
+    ("[TF] Running: terraform plan", 'plan'),
+    ("[TF] Retrying: terraform plan", 'plan'),
+    ("[TF] Running: terraform apply", 'apply'),
+    ("[TF] Guest agent not ready", 'apply'),
+    ("[TF] Lease timeout;", 'apply'),
+    ("[TF] Waiting for DHCP leases", 'ip_discovery'),
+]
+
+# Seconds each step may take before the job is cancelled ('start' covers the readiness
+# probe, 'upload' the copy of the terraform files and of any missing base image)
+DEFAULT_STEP_TIMEOUTS = {
+    'start': 300,
+    'bootstrap': 1200,
+    'prepare': 120,
+    'upload': 3600,
+    'init': 900,
+    'plan': 900,
+    'apply': 3600,
+    'ip_discovery': 300,
+}
+
+ACTIONS = ('apply_vm_state',)
+
+# "[<hypervisor>] " prefix of log lines when several hypervisors are applied in parallel
+HOST_PREFIX_RE = re.compile(r'^\[[^\]]+\] (?=\[TF\])')
+
+SRC_DIR = Path(__file__).resolve().parent.parent.parent
+
+
+class ProvisioningCancelled(BaseException):
+    """
+    Raised from the worker's log callback once the job is cancelled. A BaseException,
+    so the `except Exception` error handling of the pipeline lets it through.
+    """
+
+
+def step_of(line):
+    """Name of the step `line` opens, or None."""
+    line = HOST_PREFIX_RE.sub('', line)
+    for prefix, step in STEP_MARKERS:
+        if line.startswith(prefix):
+            return step
+    return None
+
+
+class ProvisioningJob:
+    """
+    One provisioning run, executed by the blocking pipeline of reef.manager.core in a
+    worker process started with asyncio.create_subprocess_exec. The worker reports back
+    as NDJSON events on its stdout, so the event loop only reads pipes: any number of
+    jobs can run in one server process without holding a thread each.
+
+    action: 'apply_vm_state' (params: passwords)
+    step_timeouts: overrides of DEFAULT_STEP_TIMEOUTS
+    cancel_grace: seconds a cancelled worker gets to stop terraform cleanly before it is killed
+    """
+
+    def __init__(self, action, params=None, step_timeouts=None, cancel_grace=120):
+        self.action = action
+        self.params = params or {}
+        self.step_timeouts = {**DEFAULT_STEP_TIMEOUTS, **(step_timeouts or {})}
+        self.cancel_grace = cancel_grace
+        self.argv = [sys.executable, "-m", "reef.manager.engine"]
+        self.process = None
+        self.step = None
+        self.step_started = None
+        self.result = None
+        self.cancel_reason = None
+        self._queue = asyncio.Queue()
+        self._supervisor = None
+
+    async def start(self):
+        env = os.environ.copy()
+        env['PYTHONPATH'] = os.pathsep.join(p for p in (str(SRC_DIR), env.get('PYTHONPATH')) if p)
+        self.process = await asyncio.create_subprocess_exec(
+            *self.argv,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            env=env,
+            start_new_session=True,  # terminal signals go to the caller, which cancels cleanly
+            limit=16 * 1024 * 1024,  # the result event carries the whole terraform output
+        )
+        # The request (with credentials) goes over stdin, never on the command line
+        self.process.stdin.write(json.dumps({'action': self.action, 'params': self.params}).encode())
+        await self.process.stdin.drain()
+        self.process.stdin.close()
+        self._enter_step('start')
+        self._supervisor = asyncio.create_task(self._supervise())
+        return self
+
+    def _enter_step(self, step):
+        self.step = step
+        self.step_started = time.monotonic()
+
+    async def _read_events(self):
+        async for raw in self.process.stdout:
+            try:
+                event = json.loads(raw)
+            except ValueError:
+                continue
+            if event.get('event') == 'log':
+                step = step_of(event.get('line', ''))
+                if step:
+                    self._enter_step(step)
+                    await self._queue.put({'event': 'step', 'step': step})
+            elif event.get('event') == 'result':
+                self.result = event.get('result')
+            await self._queue.put(event)
+
+    async def _read_stderr(self):
+        # Console output and tracebacks of the worker
+        async for raw in self.process.stderr:
+            await self._queue.put({'event': 'log', 'line': raw.decode(errors='replace')})
+
+    async def _watch_steps(self, interval=1.0):
+        while self.process.returncode is None:
+            await asyncio.sleep(interval)
+            limit = self.step_timeouts.get(self.step)
+            if limit and time.monotonic() - self.step_started > limit:
+                self.cancel(f"Step '{self.step}' timed out after {limit}s")
+                return
+
+    async def _supervise(self):
+        watchdog = asyncio.create_task(self._watch_steps())
+        try:
+            await asyncio.gather(self._read_events(), self._read_stderr())
+            returncode = await self.process.wait()
+        finally:
+            watchdog.cancel()
+        if self.result is None:
+            self.result = {'success': False, 'message': self.cancel_reason or f"Provisioning worker exited with code {returncode}"}
+        elif self.cancel_reason and not self.result.get('success'):
+            self.result['message'] = self.cancel_reason
+        await self._queue.put(None)
+
+    def cancel(self, reason="Provisioning cancelled"):
+        """
+        Ask the worker to stop: it interrupts terraform on the manager (which saves its
+        state and releases the lock) and gives up at the next step. Killed after cancel_grace.
+        """
+        if self.process is None or self.process.returncode is not None or self.cancel_reason:
+            return
+        self.cancel_reason = reason
+        self.process.send_signal(signal.SIGTERM)
+        asyncio.get_running_loop().call_later(self.cancel_grace, self._kill)
+
+    def _kill(self):
+        if self.process.returncode is None:
+            self.process.kill()
+
+    async def events(self):
+        """Async stream of the job's events: {'event': 'log'|'step'|'ip'|'result', ...}."""
+        while True:
+            event = await self._queue.get()
+            if event is None:
+                return
+            yield event
+
+    async def run(self, log_callback=None, on_ip=None):
+        """
+        Start the job (if needed) and drive it to completion, calling log_callback(line)
+        and on_ip(vm_name, ip) as events arrive. Cancelling the awaiting task cancels the job.
+
+        Returns: the provisioning result ({'success': True/False, 'message': str, ...})
+        """
+        if self.process is None:
+            await self.start()
+        try:
+            async for event in self.events():
+                if event['event'] == 'log' and log_callback:
+                    log_callback(event['line'])
+                elif event['event'] == 'ip' and on_ip:
+                    on_ip(event['vm'], event['ip'])
+            await self._supervisor
+        except asyncio.CancelledError:
+            self.cancel()
+            raise
+        return self.result
+
+
+async def run_provisioning(action, log_callback=None, on_ip=None, step_timeouts=None, **params):
+    """Run a provisioning job to completion (see ProvisioningJob)."""
+    return await ProvisioningJob(action, params, step_timeouts).run(log_callback, on_ip)
+
+
+def start_detached(action, params=None, log_path=None):
+    """
+    Start a provisioning worker that outlives the caller (e.g. a CLI refilling the warm
+    pool in the background). Its NDJSON events go to log_path (or are discarded).
+    Returns the worker's PID.
+    """
+    import subprocess
+    env = os.environ.copy()
+    env['PYTHONPATH'] = os.pathsep.join(p for p in (str(SRC_DIR), env.get('PYTHONPATH')) if p)
+    if log_path:
+        Path(log_path).parent.mkdir(parents=True, exist_ok=True)
+    with open(log_path or os.devnull, 'a') as out:
+        process = subprocess.Popen([sys.executable, "-m", "reef.manager.engine"], stdin=subprocess.PIPE,
+                                   stdout=out, stderr=out, env=env, start_new_session=True, text=True)
+    process.stdin.write(json.dumps({'action': action, 'params': params or {}}))
+    process.stdin.close()
+    return process.pid
+
+
+# ---------------------------------------------------------------------------
+# Worker process side
+# ---------------------------------------------------------------------------
+
+def _interrupt_remote_terraform():
+    """SIGINT the terraform running on each hypervisor (if any) over connections of their own."""
+    from reef.manager.core import get_hypervisors
+    from reef.manager.ssh import SSHSession
+    from reef.manager.terraform import interrupt_command, REMOTE_TF_DIR
+    for hypervisor in get_hypervisors():
+        with SSHSession(hypervisor['ip'], hypervisor['user'], password=hypervisor['password'], key=hypervisor['key']) as session:
+            session.run(interrupt_command(REMOTE_TF_DIR), timeout=30)
+
+
+def _run_action(action, params, log, on_ip):
+    from reef.manager import core
+    if action == 'apply_vm_state':
+        return core.apply_vm_state(log, on_ip, params.get('passwords'))
+    return {'success': False, 'message': f"Unknown provisioning action '{action}' (choose from {', '.join(ACTIONS)})"}
+
+
+def worker_main():
+    # Events go to the original stdout; anything else printed (rich console) goes to stderr
+    events = os.fdopen(os.dup(1), 'w', buffering=1)
+    os.dup2(2, 1)
+    request = json.loads(sys.stdin.read() or "{}")
+    params = request.get('params', {})
+    cancelled = []
+    emit_lock = threading.Lock()
+
+    def emit(event, **data):
+        try:
+            with emit_lock:
+                events.write(json.dumps({'event': event, **data}, default=str) + "\n")
+        except OSError:
+            pass  # caller went away; keep going so a cancelled terraform still winds down
+
+    def interrupt():
+        emit('log', line="[TF] Cancelling: interrupting terraform on the hypervisor(s)...\n")
+        try:
+            _interrupt_remote_terraform()
+        except Exception as e:
+            emit('log', line=f"[TF] Warning: could not interrupt terraform: {e}\n")
+
+    def on_sigterm(signum, frame):
+        # Only flag the cancel here: the SSH calls run beside the apply, not inside it
+        if not cancelled:
+            thread = threading.Thread(target=interrupt, daemon=True)
+            cancelled.append(thread)
+            thread.start()
+
+    def log(line):
+        # Stop at the next step; a running terraform was interrupted and winds down by itself
+        if cancelled and step_of(line):
+            raise ProvisioningCancelled("Provisioning cancelled")
+        emit('log', line=line)
+
+    signal.signal(signal.SIGTERM, on_sigterm)
+    try:
+        result = _run_action(request.get('action'), params, log, lambda vm, ip: emit('ip', vm=vm, ip=ip))
+    except ProvisioningCancelled as e:
+        result = {'success': False, 'message': str(e)}
+    for thread in cancelled:
+        thread.join()
+    emit('result', result=result)
+
+
+if __name__ == "__main__":
+    worker_main()
@@ -0,0 +1,174 @@
+import hashlib
+import json
+import threading
+import time
+import urllib.request
+from pathlib import Path
+
+VIRSH = "sudo -n virsh -c qemu:///system"
+POOL = "default"
+POOL_DIR = "/var/lib/libvirt/images"
+IMAGE_MARKER = "REEF_IMAGE "
+
+IMAGE_CACHE_DIR = Path(__file__).parent.parent / "cache" / "images"
+IMAGE_INDEX_FILE = IMAGE_CACHE_DIR / "index.json"
+
+# Cloud images used as the backing volume of every VM disk, by OS choice
+BASE_IMAGES = {
+    'ubuntu-22.04': "https://cloud-images.ubuntu.com/jammy/current/jammy-server-cloudimg-amd64.img",
+    'debian-11': "https://cloud.debian.org/images/cloud/bullseye/latest/debian-11-genericcloud-amd64.qcow2",
+}
+DEFAULT_OS = 'ubuntu-22.04'
+
+# Hypervisors are provisioned in parallel threads that share the controller cache
+_cache_lock = threading.RLock()
+
+
+def volume_name(os_name, sha256):
+    """Content-addressed name of a base image volume in the manager's pool."""
+    return f"reef-base-{os_name}-{sha256[:16]}.qcow2"
+
+
+def load_image_index():
+    """Controller-side index of base images: {os: {'sha256', 'url', 'volume', 'updated'}}."""
+    if IMAGE_INDEX_FILE.exists():
+        try:
+            return json.loads(IMAGE_INDEX_FILE.read_text())
+        except ValueError:
+            pass
+    return {}
+
+
+def _record(os_name, sha256, url):
+    with _cache_lock:
+        index = load_image_index()
+        index[os_name] = {'sha256': sha256, 'url': url, 'volume': volume_name(os_name, sha256), 'updated': int(time.time())}
+        IMAGE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        IMAGE_INDEX_FILE.write_text(json.dumps(index, indent=2, sort_keys=True))
+
+
+def _sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def remote_volumes(session, os_name):
+    """Base image volumes for `os_name` already in the manager's pool, newest first."""
+    result = session.run(f"sudo -n find {POOL_DIR} -maxdepth 1 -name 'reef-base-{os_name}-*.qcow2' -printf '%T@ %f\\n' "
+                         f"2>/dev/null | sort -rn | cut -d' ' -f2")
+    return [line for line in result.stdout.split() if line]
+
+
+def _install_command(source, os_name):
+    """
+    Remote command that checksums `source` (a file on the manager), moves it into the
+    pool under its content-addressed name and refreshes the pool.
+    """
+    return (
+        f'sha=$(sha256sum "{source}" | cut -c1-64) && name="reef-base-{os_name}-${{sha:0:16}}.qcow2" && '
+        f'sudo mv -f "{source}" "{POOL_DIR}/$name" && {VIRSH} pool-refresh {POOL} >/dev/null && '
+        f'echo "{IMAGE_MARKER}$sha $name"'
+    )
+
+
+def _parse_install(output):
+    for line in (output or "").splitlines():
+        if line.startswith(IMAGE_MARKER):
+            sha, name = line[len(IMAGE_MARKER):].split()
+            return sha, name
+    return None
+
+
+def download_on_manager_command(url, os_name):
+    """Remote command downloading the image straight from the internet on the manager."""
+    return (
+        f'tmp=$(mktemp /var/tmp/reef-image.XXXXXX) && '
+        f'curl -fsSL --connect-timeout 10 -o "$tmp" "{url}" && {_install_command("$tmp", os_name)} '
+        f'|| {{ rm -f "$tmp"; exit 1; }}'
+    )
+
+
+def controller_image(os_name, url, log_callback=None):
+    """
+    Path of the image in the controller-side cache, downloading it once if needed.
+    Returns (path, sha256) or (None, None) when neither cached nor downloadable.
+    """
+    with _cache_lock:
+        return _controller_image(os_name, url, log_callback)
+
+
+def _controller_image(os_name, url, log_callback=None):
+    entry = load_image_index().get(os_name)
+    if entry and entry.get('url') == url:
+        cached = IMAGE_CACHE_DIR / f"{os_name}-{entry['sha256']}.img"
+        if cached.exists():
+            return cached, entry['sha256']
+
+    IMAGE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    partial = IMAGE_CACHE_DIR / f"{os_name}.download"
+    if log_callback:
+        log_callback(f"[TF] Downloading {os_name} base image to the local cache...\n")
+    try:
+        urllib.request.urlretrieve(url, partial)
+    except Exception as e:
+        partial.unlink(missing_ok=True)
+        if log_callback:
+            log_callback(f"[TF] Warning: could not download {url}: {e}\n")
+        return None, None
+    sha256 = _sha256_file(partial)
+    cached = IMAGE_CACHE_DIR / f"{os_name}-{sha256}.img"
+    partial.replace(cached)
+    _record(os_name, sha256, url)
+    return cached, sha256
+
+
+def ensure_base_image(session, os_name=DEFAULT_OS, log_callback=None):
+    """
+    Make sure a base image for `os_name` exists in the manager's storage pool, without
+    downloading it again when it is already there. Order of preference:
+
+      1. the volume recorded in the local index (or the newest reef-base volume) on the manager
+      2. a download on the manager itself
+      3. the controller-side cache (downloaded there once), copied over the SSH session
+
+    Returns: {'success': True/False, 'message': str, 'volume': str}
+    """
+    url = BASE_IMAGES.get(os_name)
+    if not url:
+        return {'success': False, 'message': f"No base image known for OS '{os_name}'", 'volume': None}
+
+    existing = remote_volumes(session, os_name)
+    entry = load_image_index().get(os_name)
+    if entry and entry.get('url') == url and entry['volume'] in existing:
+        return {'success': True, 'message': f"Base image {entry['volume']} already on manager", 'volume': entry['volume']}
+    if existing:
+        return {'success': True, 'message': f"Reusing base image {existing[0]} on manager", 'volume': existing[0]}
+
+    if log_callback:
+        log_callback(f"[TF] No {os_name} base image on manager, downloading it there...\n")
+    installed = _parse_install(session.run(download_on_manager_command(url, os_name)).stdout)
+    if installed:
+        sha256, name = installed
+        _record(os_name, sha256, url)
+        return {'success': True, 'message': f"Downloaded base image {name} on manager", 'volume': name}
+
+    # Manager is offline: ship the image from the controller cache
+    if log_callback:
+        log_callback("[TF] Manager could not download the image, shipping it from the local cache...\n")
+    local_path, sha256 = controller_image(os_name, url, log_callback)
+    if not local_path:
+        return {'success': False, 'message': f"Base image for {os_name} unavailable (manager and controller offline, nothing cached)", 'volume': None}
+
+    remote_tmp = f"/var/tmp/reef-image-{sha256[:16]}.img"
+    result = session.copy(local_path, remote_tmp)
+    if result.returncode != 0:
+        return {'success': False, 'message': f"Failed to copy base image to manager: {result.stderr}", 'volume': None}
+    installed = _parse_install(session.run(_install_command(remote_tmp, os_name)).stdout)
+    if not installed or installed[0] != sha256:
+        if installed:
+            session.run(f"sudo rm -f {POOL_DIR}/{installed[1]} && {VIRSH} pool-refresh {POOL} >/dev/null")
+        return {'success': False, 'message': "Base image checksum mismatch after copy", 'volume': None}
+    return {'success': True, 'message': f"Shipped base image {installed[1]} from local cache", 'volume': installed[1]}
@@ -0,0 +1,97 @@
+import re
+import time
+
+VIRSH = "sudo -n virsh -c qemu:///system"
+IP_MARKER = "REEF_IP "
+PENDING_MARKER = "REEF_IP_PENDING"
+
+# `vm_ips = { "<name>" = "<ip>" ... }` map output of terraform/main.tf
+TERRAFORM_IPS_RE = re.compile(r'^vm_ips\s*=\s*\{(.*?)^\}', re.MULTILINE | re.DOTALL)
+TERRAFORM_IP_ENTRY_RE = re.compile(r'"([^"]+)"\s*=\s*"([^"]+)"')
+
+
+def watch_leases_command(domains, network="default", timeout=120):
+    """
+    Remote bash loop following the DHCP leases of `network` for the MACs of `domains`.
+
+    Prints "REEF_IP <domain> <ip>" as soon as a domain's lease appears (falling back
+    to `virsh domifaddr --source lease` for domains on other networks) and exits once
+    every domain has an address, or with 124 and a "REEF_IP_PENDING ..." line when
+    `timeout` seconds pass first.
+    """
+    return (
+        f"pending='{' '.join(domains)}'; deadline=$(( $(date +%s) + {int(timeout)} )); d=0.2; "
+        f"while [ -n \"$pending\" ]; do "
+        f"leases=$({VIRSH} net-dhcp-leases {network} 2>/dev/null); left=''; "
+        f"for dom in $pending; do ip=''; "
+        f"for mac in $({VIRSH} domiflist $dom 2>/dev/null | awk '$5 ~ /:/ {{print $5}}'); do "
+        f"ip=$(echo \"$leases\" | awk -v m=$mac 'tolower($3) == tolower(m) && $4 == \"ipv4\" {{split($5, a, \"/\"); print a[1]}}' | tail -n1); "
+        f"[ -n \"$ip\" ] && break; done; "
+        f"[ -z \"$ip\" ] && ip=$({VIRSH} domifaddr $dom --source lease 2>/dev/null | awk '$3 == \"ipv4\" {{split($4, a, \"/\"); print a[1]; exit}}'); "
+        f"if [ -n \"$ip\" ]; then echo \"{IP_MARKER}$dom $ip\"; else left=\"$left $dom\"; fi; "
+        f"done; pending=\"${{left# }}\"; [ -z \"$pending\" ] && break; "
+        f"[ $(date +%s) -ge $deadline ] && {{ echo \"{PENDING_MARKER} $pending\"; exit 124; }}; "
+        f"sleep $d; d=$(awk -v d=$d 'BEGIN {{ d *= 2; if (d > 2) d = 2; print d }}'); "
+        f"done"
+    )
+
+
+def parse_ip_line(line):
+    """Return (domain, ip) for a "REEF_IP <domain> <ip>" line, else None."""
+    if not line.startswith(IP_MARKER):
+        return None
+    parts = line[len(IP_MARKER):].split()
+    if len(parts) != 2:
+        return None
+    return parts[0], parts[1]
+
+
+def terraform_ips(output):
+    """{name: ip} from the terraform `vm_ips` output blocks in `output` (VMs without an IP are left out)."""
+    ips = {}
+    for block in TERRAFORM_IPS_RE.findall(output or ""):
+        ips.update(TERRAFORM_IP_ENTRY_RE.findall(block))
+    return ips
+
+
+def terraform_ip_output(ips):
+    """Render discovered IPs like terraform's `vm_ips` output, so terraform_ips() picks them up."""
+    entries = "".join(f'  "{name}" = "{ip}"\n' for name, ip in ips.items())
+    return f"vm_ips = {{\n{entries}}}"
+
+
+def discover_ips(session, domains, network="default", timeout=120, on_ip=None, log_callback=None):
+    """
+    Follow the manager's DHCP leases until every domain in `domains` has an IP.
+    on_ip(domain, ip) is called as soon as each address shows up.
+
+    Returns: {'success': True/False, 'message': str, 'ips': {domain: ip}, 'pending': [domain], 'seconds': float}
+    """
+    ips = {}
+    start = time.monotonic()
+
+    def on_line(line):
+        found = parse_ip_line(line)
+        if found:
+            name, ip = found
+            ips[name] = ip
+            if log_callback:
+                log_callback(f"[TF] {name}: {ip}\n")
+            if on_ip:
+                on_ip(name, ip)
+        return False
+
+    if domains:
+        session.stream(watch_leases_command(domains, network, timeout), on_line)
+
+    seconds = round(time.monotonic() - start, 1)
+    pending = [d for d in domains if d not in ips]
+    if pending:
+        return {
+            'success': False,
+            'message': f"No DHCP lease after {timeout}s for: {', '.join(pending)}",
+            'ips': ips,
+            'pending': pending,
+            'seconds': seconds,
+        }
+    return {'success': True, 'message': f"Discovered {len(ips)} IP address(es) in {seconds}s", 'ips': ips, 'pending': [], 'seconds': seconds}
@@ -0,0 +1,64 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+DEFAULT_ROUNDS = 656000
+
+
+def _sha512_crypt(password, rounds):
+    from passlib.hash import sha512_crypt
+    return sha512_crypt.using(rounds=rounds).hash(password)
+
+
+def _sha512_verify(password, password_hash):
+    from passlib.hash import sha512_crypt
+    try:
+        return sha512_crypt.verify(password, password_hash)
+    except (TypeError, ValueError):
+        return False  # missing or malformed hash
+
+
+def configured_rounds():
+    """Hash rounds from vm_password_hash_rounds in the configuration (schema default otherwise)."""
+    # Imported here: core imports this module's callers at load time
+    from reef.manager.core import load_current_config
+    try:
+        return int(load_current_config().get('vm_password_hash_rounds', DEFAULT_ROUNDS))
+    except (TypeError, ValueError):
+        return DEFAULT_ROUNDS
+
+
+class PasswordHasher:
+    """
+    sha512_crypt hashing for one provisioning session.
+
+    Distinct passwords are hashed in parallel in a process pool (the work is pure
+    CPU, so threads would serialize on the GIL), and identical passwords are hashed
+    once and the result reused for every VM that shares them.
+    """
+
+    def __init__(self, rounds=None, max_workers=None):
+        self.rounds = rounds or configured_rounds()
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._cache = {}
+        self._verified = {}
+
+    def hash_many(self, passwords):
+        """Hashes for `passwords`, in the same order."""
+        pending = [p for p in dict.fromkeys(passwords) if p not in self._cache]
+        if len(pending) > 1 and self.max_workers > 1:
+            with ProcessPoolExecutor(max_workers=min(self.max_workers, len(pending))) as pool:
+                hashes = list(pool.map(_sha512_crypt, pending, [self.rounds] * len(pending)))
+        else:
+            hashes = [_sha512_crypt(p, self.rounds) for p in pending]
+        self._cache.update(zip(pending, hashes))
+        return [self._cache[p] for p in passwords]
+
+    def hash(self, password):
+        return self.hash_many([password])[0]
+
+    def verify(self, password, password_hash):
+        """True when password_hash is a hash of password (checked once per session)."""
+        key = (password, password_hash)
+        if key not in self._verified:
+            self._verified[key] = _sha512_verify(password, password_hash)
+        return self._verified[key]
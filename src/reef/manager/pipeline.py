@@ -0,0 +1,131 @@
+import asyncio
+import os
+import shlex
+import signal
+import time
+from reef.manager.core import ANSIBLE_DIR, BASE_DIR, HOSTS_INI_FILE, ansible_env, sync_vm_inventory
+from reef.manager.tuning import playbook_args
+from reef.manager.vm_state import load_vm_state
+
+AGENT_PLAYBOOK = ANSIBLE_DIR / "playbooks" / "experimental.yml"
+
+
+def wait_for_ssh_command(host, timeout=300):
+    """Ad-hoc ansible call returning once `host` (from hosts.ini) answers over SSH, through its proxy if any."""
+    return ["ansible", host, "-i", str(HOSTS_INI_FILE), "-m", "ansible.builtin.wait_for_connection",
+            "-a", f"timeout={int(timeout)}"]
+
+
+def agent_playbook_command(host, playbook=AGENT_PLAYBOOK):
+    """ansible-playbook limited to `host`: only the agent-side play of the playbook matches it."""
+    return ["ansible-playbook", str(playbook), "-i", str(HOSTS_INI_FILE), *playbook_args(), "--limit", host]
+
+
+class AgentPipeline:
+    """
+    Pipelined "provision then deploy": plug on_ip into a provisioning job and each VM
+    gets its agent roles as soon as it has an IP and answers over SSH, while the other
+    VMs are still being created. A batch then takes about as long as its slowest VM
+    instead of provisioning + inventory + playbook for all of them in sequence.
+
+    passwords: {vm_name: plaintext} of new VMs (for hosts.ini, see sync_vm_inventory)
+    vm_names: VMs to deploy (default: every VM the job reports an IP for, idle pool VMs aside)
+    log_callback: called with each output line, prefixed with "[<vm>] "
+    ssh_timeout: seconds a VM may take to answer over SSH after getting its IP
+    """
+
+    def __init__(self, passwords=None, vm_names=None, log_callback=None, ssh_timeout=300, playbook=AGENT_PLAYBOOK):
+        self.passwords = passwords or {}
+        self.vm_names = set(vm_names) if vm_names is not None else None
+        self.log_callback = log_callback
+        self.ssh_timeout = ssh_timeout
+        self.playbook = playbook
+        self.results = {}
+        self.cancelled = False
+        self._tasks = {}
+        self._processes = set()
+        self._inventory_lock = asyncio.Lock()
+
+    def _log(self, vm_name, line):
+        if self.log_callback:
+            self.log_callback(f"[{vm_name}] {line.rstrip()}\n")
+
+    def on_ip(self, vm_name, ip):
+        """on_ip callback of the provisioning job; must be called from the event loop."""
+        if self.vm_names is not None and vm_name not in self.vm_names:
+            return
+        if self.vm_names is None and vm_name in self._pool_names():
+            return
+        if vm_name not in self._tasks and not self.cancelled:
+            self._tasks[vm_name] = asyncio.create_task(self._deploy(vm_name, ip))
+
+    @staticmethod
+    def _pool_names():
+        # Idle warm-pool VMs are kept out of hosts.ini until claimed (see reef.manager.pool)
+        return {vm['name'] for vm in load_vm_state() if vm.get('pool')}
+
+    async def _run(self, vm_name, argv):
+        process = await asyncio.create_subprocess_exec(
+            *argv,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            cwd=str(BASE_DIR),
+            env=ansible_env(),
+            start_new_session=True,  # cancel() stops the whole process group
+        )
+        self._processes.add(process)
+        try:
+            async for raw in process.stdout:
+                self._log(vm_name, raw.decode(errors='replace'))
+            return await process.wait()
+        finally:
+            self._processes.discard(process)
+
+    async def _deploy(self, vm_name, ip):
+        start = time.monotonic()
+        # hosts.ini is rewritten whole: one VM at a time
+        async with self._inventory_lock:
+            await asyncio.to_thread(sync_vm_inventory, {vm_name: ip}, self.passwords)
+
+        self._log(vm_name, f"[DEPLOY] Waiting for SSH on {ip}...")
+        returncode = await self._run(vm_name, wait_for_ssh_command(ip, self.ssh_timeout))
+        if returncode == 0 and not self.cancelled:
+            self._log(vm_name, f"[DEPLOY] Running: {shlex.join(agent_playbook_command(ip, self.playbook))}")
+            returncode = await self._run(vm_name, agent_playbook_command(ip, self.playbook))
+
+        seconds = round(time.monotonic() - start, 1)
+        ok = returncode == 0 and not self.cancelled
+        self.results[vm_name] = {'success': ok, 'ip': ip, 'returncode': returncode, 'seconds': seconds}
+        self._log(vm_name, f"[DEPLOY] {'Deployed' if ok else 'Failed'} in {seconds}s")
+
+    async def finish(self, ips=None):
+        """
+        Wait for the deployments started so far. With the provisioning result's ips,
+        hosts.ini is synced once more so that no VM is lost to the job's own inventory
+        update racing ours.
+
+        Returns: {'success': True/False, 'message': str, 'hosts': {vm_name: {'success', 'ip', 'returncode', 'seconds'}}}
+        """
+        if self._tasks:
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        if ips:
+            async with self._inventory_lock:
+                await asyncio.to_thread(sync_vm_inventory, ips, self.passwords)
+        failed = sorted(name for name, r in self.results.items() if not r['success'])
+        crashed = sorted(name for name in self._tasks if name not in self.results)
+        if failed or crashed:
+            return {'success': False, 'message': f"Agent deployment failed on: {', '.join(failed + crashed)}",
+                    'hosts': self.results}
+        slowest = max((r['seconds'] for r in self.results.values()), default=0)
+        return {'success': True, 'message': f"Deployed agents on {len(self.results)} VM(s) (slowest {slowest}s)",
+                'hosts': self.results}
+
+    def cancel(self):
+        """Stop the running deployments and start no new ones."""
+        self.cancelled = True
+        for process in list(self._processes):
+            if process.returncode is None:
+                try:
+                    os.killpg(process.pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    pass
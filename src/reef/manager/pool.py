@@ -0,0 +1,126 @@
+from reef.manager.images import BASE_IMAGES, DEFAULT_OS
+from reef.manager.passwords import PasswordHasher
+from reef.manager.vm_state import VM_NAME_RE, load_vm_state, save_vm_state, next_vm_names
+
+# Warm-pool VMs are ordinary desired-state VMs flagged 'pool': they are provisioned,
+# booted and kept idle (out of the ansible inventory) until claimed
+POOL_PREFIX = "pool"
+DEFAULT_POOL_PASSWORD = "ubuntu"
+
+
+def pool_settings():
+    """
+    (vm_pool_size, vm_pool_password, vm_pool_os) from the configuration; size 0
+    disables the pool.
+    """
+    # Imported here: core imports this module at load time
+    from reef.manager.core import load_current_config
+    cfg = load_current_config()
+    try:
+        size = max(0, int(cfg.get('vm_pool_size', 0)))
+    except (TypeError, ValueError):
+        size = 0
+    os_name = cfg.get('vm_pool_os')
+    return size, cfg.get('vm_pool_password') or DEFAULT_POOL_PASSWORD, os_name if os_name in BASE_IMAGES else DEFAULT_OS
+
+
+def idle_pool_vms(vms, os_name=None):
+    """Pool VMs that are up (their IP is known) and can be claimed, optionally of one OS."""
+    return [vm for vm in vms if vm.get('pool') and vm.get('ip') and (os_name is None or vm['os'] == os_name)]
+
+
+def is_current(vm, password, os_name, hasher):
+    """True when a pool VM was built with the pool's current password and OS."""
+    return vm['os'] == os_name and hasher.verify(password, vm.get('ssh_password_hash'))
+
+
+def resize_pool(vms, hypervisor_ips, size, password=DEFAULT_POOL_PASSWORD, os_name=DEFAULT_OS, hasher=None):
+    """
+    Bring the pool to `size` VMs per hypervisor, in place (the caller saves): new pool
+    VMs are placed directly on the hypervisor they refill, extra ones are dropped
+    (and destroyed by the apply). Pool VMs built with another password or OS than the
+    current ones are dropped and rebuilt.
+
+    Returns: (added entries, removed entries)
+    """
+    hasher = hasher or PasswordHasher()
+    removed = [vm for vm in vms if vm.get('pool') and not is_current(vm, password, os_name, hasher)]
+    missing = {}
+    for ip in hypervisor_ips:
+        pooled = [vm for vm in vms if vm.get('pool') and vm.get('hypervisor') == ip and vm not in removed]
+        missing[ip] = size - len(pooled)
+        removed += pooled[size:]
+    for vm in removed:
+        vms.remove(vm)
+
+    count = sum(max(0, n) for n in missing.values())
+    if not count:
+        return [], removed
+    # Claimed VMs keep their pool domain and dropped ones are destroyed by the same apply:
+    # never hand those names out again
+    taken = [vm['name'] for vm in vms + removed] + [vm['domain'] for vm in vms if vm.get('domain')]
+    names = iter(next_vm_names(POOL_PREFIX, count, taken))
+    password_hash = hasher.hash_many([password])[0]
+    added = []
+    for ip, n in missing.items():
+        for _ in range(max(0, n)):
+            added.append({'name': next(names), 'os': os_name, 'ssh_password_hash': password_hash,
+                          'hypervisor': ip, 'pool': True})
+    vms.extend(added)
+    return added, removed
+
+
+def record_pool_ips(ips):
+    """Remember the IPs of pool VMs ({name: ip}) so they can be claimed; re-reads the state, which claims may have changed."""
+    vms = load_vm_state()
+    changed = False
+    for vm in vms:
+        if vm.get('pool') and ips.get(vm['name']) and vm.get('ip') != ips[vm['name']]:
+            vm['ip'] = ips[vm['name']]
+            changed = True
+    if changed:
+        save_vm_state(vms)
+
+
+def claim_vm(name, os_name=None, hasher=None):
+    """
+    Hand an idle pool VM out as `name`: it is renamed in the desired state (its libvirt
+    domain, hostname, user and password stay those of the pool VM, so terraform has
+    nothing to rebuild, only to move in state on the next apply) and enters hosts.ini.
+    The pool is refilled by the next apply (see resize_pool).
+
+    Only VMs built with the current vm_pool_password are handed out: the password
+    written to hosts.ini must be the one the VM was created with.
+
+    Returns: {'success': True/False, 'message': str, 'vm': {'name', 'ip', 'user', 'password', 'hypervisor', 'domain'}}
+    """
+    from reef.manager.core import sync_vm_inventory
+    if not VM_NAME_RE.match(name):
+        return {'success': False, 'message': f"Invalid VM name '{name}' (lowercase letters, digits and dashes, starting with a letter)"}
+    vms = load_vm_state()
+    if any(name in (vm['name'], vm.get('domain')) for vm in vms):
+        return {'success': False, 'message': f"VM '{name}' already exists"}
+    _, password, pool_os = pool_settings()
+    hasher = hasher or PasswordHasher()
+    idle = idle_pool_vms(vms, os_name)
+    if not idle:
+        message = "No idle VM in the warm pool" + (f" for {os_name}" if os_name else "")
+        if os_name and os_name != pool_os:
+            message += f" (its VMs run {pool_os}, see vm_pool_os)"
+        return {'success': False, 'message': message}
+    usable = [vm for vm in idle if hasher.verify(password, vm.get('ssh_password_hash'))]
+    if not usable:
+        return {'success': False, 'message': "The idle pool VMs were built with a previous vm_pool_password; "
+                                             "the next apply rebuilds them"}
+
+    vm = usable[0]
+    pool_name = vm['name']
+    vm.update({'name': name, 'domain': vm.get('domain') or pool_name, 'user': vm.get('user') or pool_name})
+    ip = vm.pop('ip')
+    vm.pop('pool')
+    save_vm_state(vms)
+
+    sync_vm_inventory({name: ip}, {name: password})
+    return {'success': True, 'message': f"Claimed {pool_name} as {name} ({ip})",
+            'vm': {'name': name, 'ip': ip, 'user': vm['user'], 'password': password,
+                   'hypervisor': vm.get('hypervisor'), 'domain': vm['domain']}}
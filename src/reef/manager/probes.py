@@ -0,0 +1,70 @@
+import time
+
+VIRSH = "sudo -n virsh -c qemu:///system"
+
+
+def wait_for(check, timeout=30, initial=0.2, factor=2.0, max_interval=5.0, name=None, timings=None):
+    """
+    Poll check() with exponential backoff until it returns a truthy value or the
+    deadline passes. The time spent is recorded in timings[name] when given.
+
+    Returns the last value returned by check().
+    """
+    start = time.monotonic()
+    deadline = start + timeout
+    interval = initial
+    while True:
+        value = check()
+        now = time.monotonic()
+        if value or now >= deadline:
+            break
+        time.sleep(min(interval, deadline - now))
+        interval = min(interval * factor, max_interval)
+    if timings is not None and name:
+        timings[name] = {'ok': bool(value), 'seconds': round(time.monotonic() - start, 1)}
+    return value
+
+
+def remote_wait_command(condition, timeout=30, initial=0.1, max_interval=2):
+    """
+    Remote bash loop polling a shell condition with exponential backoff.
+    Exits 0 as soon as the condition holds, 124 once `timeout` seconds have passed.
+    """
+    return (
+        f"start=$(date +%s%3N); d={initial}; "
+        f"until ( {condition} ) >/dev/null 2>&1; do "
+        f"[ $(( $(date +%s%3N) - start )) -ge {int(timeout * 1000)} ] && exit 124; "
+        f"sleep $d; d=$(awk -v d=$d 'BEGIN {{ d *= 2; if (d > {max_interval}) d = {max_interval}; print d }}'); "
+        f"done"
+    )
+
+
+def remote_wait(session, name, condition, timeout=30, timings=None, log_callback=None):
+    """
+    Wait on the remote host until `condition` holds, in a single SSH call.
+
+    Returns: True when the condition was met before the deadline.
+    """
+    start = time.monotonic()
+    result = session.run(remote_wait_command(condition, timeout), timeout=timeout + 30)
+    ok = result.returncode == 0
+    elapsed = round(time.monotonic() - start, 1)
+    if timings is not None:
+        timings[name] = {'ok': ok, 'seconds': elapsed}
+    if log_callback:
+        state = "ready" if ok else "timed out"
+        log_callback(f"[TF] Probe {name} {state} after {elapsed}s\n")
+    return ok
+
+
+# Remote readiness condition (shell snippet for remote_wait). The bootstrap script
+# probes libvirt and the storage pool itself, IP discovery watches the DHCP leases.
+
+def network_active(network):
+    return f"{VIRSH} net-info {network} | grep -q 'Active:.*yes'"
+
+
+def format_timings(timings):
+    """One line summary of probe timings, slowest first."""
+    items = sorted(timings.items(), key=lambda kv: kv[1]['seconds'], reverse=True)
+    return ", ".join(f"{name} {t['seconds']}s{'' if t['ok'] else ' (timeout)'}" for name, t in items)
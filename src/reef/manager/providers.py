@@ -0,0 +1,145 @@
+import json
+import threading
+import time
+import urllib.request
+from pathlib import Path
+from reef.manager.terraform import REMOTE_REEF_DIR, REMOTE_CLI_CONFIG
+
+PROVIDER_HOST = "registry.terraform.io"
+PROVIDER_NAMESPACE = "dmacvicar"
+PROVIDER_TYPE = "libvirt"
+PROVIDER_VERSION = "0.7.6"
+PROVIDER_SOURCE = f"{PROVIDER_HOST}/{PROVIDER_NAMESPACE}/{PROVIDER_TYPE}"
+
+# Filesystem mirror on the manager (packed layout: HOST/NAMESPACE/TYPE/<zip>), filled once
+REMOTE_MIRROR_DIR = f"{REMOTE_REEF_DIR}/providers"
+REMOTE_PLUGIN_CACHE_DIR = f"{REMOTE_REEF_DIR}/plugin-cache"
+
+# Controller-side copy of the provider packages, shipped to managers without internet
+PROVIDER_CACHE_DIR = Path(__file__).parent.parent / "cache" / "providers"
+REGISTRY_DOWNLOAD_URL = "https://registry.terraform.io/v1/providers/{namespace}/{type}/{version}/download/{os}/{arch}"
+
+
+def provider_zip_name(platform):
+    return f"terraform-provider-{PROVIDER_TYPE}_{PROVIDER_VERSION}_{platform}.zip"
+
+
+def mirror_status_command():
+    """Remote command printing the manager's terraform platform and whether the mirror has the provider."""
+    return (
+        'case $(uname -m) in aarch64|arm64) p=linux_arm64;; *) p=linux_amd64;; esac; echo "$p"; '
+        f'test -f {REMOTE_MIRROR_DIR}/{PROVIDER_SOURCE}/terraform-provider-{PROVIDER_TYPE}_{PROVIDER_VERSION}_$p.zip '
+        '&& echo present || echo missing'
+    )
+
+
+def cli_config_command():
+    """
+    Remote command writing the terraform CLI config used for every run: the libvirt
+    provider comes from the local filesystem mirror only, everything else directly,
+    and unpacked plugins are shared through a plugin cache.
+    """
+    return (
+        f'mkdir -p {REMOTE_MIRROR_DIR} {REMOTE_PLUGIN_CACHE_DIR} && '
+        f'printf \'%s\\n\' '
+        f'"plugin_cache_dir = \\"$HOME/{REMOTE_PLUGIN_CACHE_DIR}\\"" '
+        f'"provider_installation {{" '
+        f'"  filesystem_mirror {{" '
+        f'"    path    = \\"$HOME/{REMOTE_MIRROR_DIR}\\"" '
+        f'"    include = [\\"{PROVIDER_SOURCE}\\"]" '
+        f'"  }}" '
+        f'"  direct {{" '
+        f'"    exclude = [\\"{PROVIDER_SOURCE}\\"]" '
+        f'"  }}" '
+        f'"}}" > {REMOTE_CLI_CONFIG}'
+    )
+
+
+def mirror_on_manager_command(platform):
+    """Remote command filling the mirror with `terraform providers mirror` (needs internet on the manager)."""
+    return (
+        f'scratch=$(mktemp -d) && cd "$scratch" && '
+        f'printf \'terraform {{\\n  required_providers {{\\n    libvirt = {{\\n      source  = "{PROVIDER_NAMESPACE}/{PROVIDER_TYPE}"\\n'
+        f'      version = "{PROVIDER_VERSION}"\\n    }}\\n  }}\\n}}\\n\' > main.tf && '
+        f'timeout 300 terraform providers mirror -platform={platform} "$HOME/{REMOTE_MIRROR_DIR}"; '
+        f'rc=$?; cd; rm -rf "$scratch"; exit $rc'
+    )
+
+
+# Hypervisors are provisioned in parallel threads that share the controller cache
+_cache_lock = threading.Lock()
+
+
+def controller_provider_zip(platform, log_callback=None):
+    """Provider package in the controller cache, downloaded from the registry once. Returns a Path or None."""
+    with _cache_lock:
+        return _controller_provider_zip(platform, log_callback)
+
+
+def _controller_provider_zip(platform, log_callback=None):
+    cached = PROVIDER_CACHE_DIR / PROVIDER_SOURCE / provider_zip_name(platform)
+    if cached.exists():
+        return cached
+    os_name, arch = platform.split("_", 1)
+    url = REGISTRY_DOWNLOAD_URL.format(namespace=PROVIDER_NAMESPACE, type=PROVIDER_TYPE,
+                                       version=PROVIDER_VERSION, os=os_name, arch=arch)
+    if log_callback:
+        log_callback(f"[TF] Downloading {PROVIDER_SOURCE} {PROVIDER_VERSION} ({platform}) to the local cache...\n")
+    try:
+        with urllib.request.urlopen(url, timeout=30) as resp:
+            download_url = json.loads(resp.read())['download_url']
+        cached.parent.mkdir(parents=True, exist_ok=True)
+        partial = cached.with_suffix(".download")
+        urllib.request.urlretrieve(download_url, partial)
+        partial.replace(cached)
+    except Exception as e:
+        if log_callback:
+            log_callback(f"[TF] Warning: could not download provider: {e}\n")
+        return None
+    return cached
+
+
+def ensure_provider_mirror(session, log_callback=None, timings=None):
+    """
+    Make the libvirt provider installable on the manager without touching the network:
+    write the CLI config and, on first use only, fill the filesystem mirror, either
+    by downloading on the manager or by pushing the controller's cached package.
+    Time spent downloading is recorded as timings['provider_download'].
+
+    Returns: {'success': True/False, 'message': str}
+    """
+    status = session.run(mirror_status_command()).stdout.split()
+    platform = status[0] if status else "linux_amd64"
+    present = len(status) > 1 and status[1] == "present"
+
+    result = session.run(cli_config_command())
+    if result.returncode != 0:
+        return {'success': False, 'message': f"Failed to write terraform CLI config: {result.stderr}"}
+    if present:
+        return {'success': True, 'message': f"Provider {PROVIDER_SOURCE} {PROVIDER_VERSION} already mirrored on manager"}
+
+    start = time.monotonic()
+    if log_callback:
+        log_callback(f"[TF] Mirroring provider {PROVIDER_SOURCE} {PROVIDER_VERSION} on manager (first run)...\n")
+    result = session.run(mirror_on_manager_command(platform))
+    if result.returncode == 0:
+        message = f"Provider {PROVIDER_VERSION} mirrored on manager"
+    else:
+        if log_callback:
+            log_callback("[TF] Manager could not download the provider, pushing it from the local cache...\n")
+        local_zip = controller_provider_zip(platform, log_callback)
+        copied = None
+        if local_zip:
+            remote_dir = f"{REMOTE_MIRROR_DIR}/{PROVIDER_SOURCE}"
+            session.run(f"mkdir -p {remote_dir}")
+            copied = session.copy(local_zip, f"{remote_dir}/")
+        if not copied or copied.returncode != 0:
+            if timings is not None:
+                timings['provider_download'] = {'ok': False, 'seconds': round(time.monotonic() - start, 1)}
+            return {'success': False, 'message': f"Provider {PROVIDER_SOURCE} {PROVIDER_VERSION} unavailable (manager and controller offline, nothing cached)"}
+        message = f"Provider {PROVIDER_VERSION} pushed from local cache"
+
+    seconds = round(time.monotonic() - start, 1)
+    if timings is not None:
+        timings['provider_download'] = {'ok': True, 'seconds': seconds}
+    return {'success': True, 'message': f"{message} in {seconds}s"}
@@ -0,0 +1,84 @@
+import hashlib
+import json
+import threading
+from pathlib import Path
+from reef.manager.bootstrap import BOOTSTRAP_SCRIPT, remote_script_command
+
+FINGERPRINT_SCRIPT = Path(__file__).parent.parent / "scripts" / "manager-fingerprint.sh"
+READINESS_CACHE_FILE = Path(__file__).parent.parent / "cache" / "manager-readiness.json"
+
+
+def bootstrap_id():
+    """Short hash of the bootstrap script, so editing it invalidates existing stamps."""
+    return hashlib.sha256(BOOTSTRAP_SCRIPT.read_bytes()).hexdigest()[:16]
+
+
+def read_fingerprint(session, write_stamp=False):
+    """
+    Collect the manager's readiness fingerprint (package versions, libvirt network
+    XML hash, pool state) and its stored stamp in one SSH call.
+    With write_stamp=True the current fingerprint is recorded as the new stamp.
+
+    Returns: {'fingerprint': dict, 'stamp': dict|None} or None if the probe failed.
+    """
+    args = [session.user, bootstrap_id()]
+    if write_stamp:
+        args.append("--write-stamp")
+    result = session.run(remote_script_command(*args), input=FINGERPRINT_SCRIPT.read_text())
+    if result.returncode != 0:
+        return None
+    try:
+        return json.loads(result.stdout.strip().splitlines()[-1])
+    except (ValueError, IndexError):
+        return None
+
+
+def load_readiness_cache():
+    """Local cache of the last known readiness stamps, keyed by manager IP."""
+    if READINESS_CACHE_FILE.exists():
+        try:
+            return json.loads(READINESS_CACHE_FILE.read_text())
+        except ValueError:
+            pass
+    return {}
+
+
+# Hypervisors are provisioned in parallel threads that share the cache file
+_cache_lock = threading.Lock()
+
+
+def save_readiness(manager_ip, fingerprint):
+    with _cache_lock:
+        cache = load_readiness_cache()
+        cache[manager_ip] = fingerprint
+        READINESS_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        READINESS_CACHE_FILE.write_text(json.dumps(cache, indent=2, sort_keys=True))
+
+
+def forget_readiness(manager_ip):
+    with _cache_lock:
+        cache = load_readiness_cache()
+        if cache.pop(manager_ip, None) is not None:
+            READINESS_CACHE_FILE.write_text(json.dumps(cache, indent=2, sort_keys=True))
+
+
+def is_ready(manager_ip, probe):
+    """
+    True when the manager can skip setup: its live fingerprint matches both the stamp
+    stored on the manager and our local cache entry, and the fingerprint describes a
+    usable host (terraform + mkisofs installed, network active, pool running).
+    """
+    if not probe or not probe.get('stamp'):
+        return False
+    fingerprint = probe['fingerprint']
+    if fingerprint.get('bootstrap') != bootstrap_id():
+        return False
+    if fingerprint != probe['stamp'] or fingerprint != load_readiness_cache().get(manager_ip):
+        return False
+    return bool(
+        fingerprint.get('terraform')
+        and fingerprint.get('genisoimage')
+        and fingerprint.get('network', {}).get('active')
+        and fingerprint.get('pool', {}).get('state') == 'running'
+        and fingerprint.get('user_in_libvirt_group')
+    )
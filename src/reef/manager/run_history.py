@@ -0,0 +1,129 @@
+import json
+import threading
+import time
+from pathlib import Path
+
+RUN_HISTORY_FILE = Path(__file__).parent.parent / "cache" / "run_history.json"
+MAX_RUNS = 20
+
+# A task or role is reported as slower than the previous run from this ratio on, when
+# it took at least REGRESSION_MIN_SECONDS (short tasks are too noisy)
+REGRESSION_FACTOR = 2.0
+REGRESSION_MIN_SECONDS = 10
+
+_history_lock = threading.Lock()
+
+
+def load_runs():
+    """Recorded playbook runs, oldest first."""
+    if RUN_HISTORY_FILE.exists():
+        try:
+            return json.loads(RUN_HISTORY_FILE.read_text())
+        except ValueError:
+            pass
+    return []
+
+
+def record_run(progress, returncode, command=None):
+    """
+    Add a run to the history from its PlaybookProgress (see reef.manager.ansible_events),
+    keeping the last MAX_RUNS. Runs without any timed result (ansible did not start,
+    verbose mode) are not recorded.
+
+    Returns: the run {'id', 'playbook', 'command', 'started_at', 'ended_at', 'returncode', 'timings'}, or None
+    """
+    if not progress.timings:
+        return None
+    run = {
+        'id': int(time.time() * 1000),
+        'playbook': progress.playbook,
+        'command': command,
+        'started_at': progress.started_at,
+        'ended_at': progress.ended_at,
+        'returncode': returncode,
+        'timings': progress.timings,
+    }
+    with _history_lock:
+        runs = load_runs()[-(MAX_RUNS - 1):] + [run]
+        RUN_HISTORY_FILE.parent.mkdir(parents=True, exist_ok=True)
+        RUN_HISTORY_FILE.write_text(json.dumps(runs))
+    return run
+
+
+def previous_run(run, runs=None):
+    """The run of the same playbook recorded before `run`, or None."""
+    earlier = [r for r in (runs if runs is not None else load_runs())
+               if r['id'] < run['id'] and r.get('playbook') == run.get('playbook')]
+    return earlier[-1] if earlier else None
+
+
+def _span(rows):
+    """Wall time of rows run side by side on several hosts."""
+    return round(max(r['end'] for r in rows) - min(r['start'] for r in rows), 1)
+
+
+def task_seconds(run):
+    """{(role, task): wall seconds across hosts} of a run."""
+    groups = {}
+    for row in run['timings']:
+        groups.setdefault((row.get('role'), row['task']), []).append(row)
+    return {key: _span(rows) for key, rows in groups.items()}
+
+
+def role_seconds(run):
+    """{role: seconds} of a run, summed over its tasks (tasks outside roles under None)."""
+    totals = {}
+    for (role, _), seconds in task_seconds(run).items():
+        totals[role] = round(totals.get(role, 0) + seconds, 1)
+    return totals
+
+
+def slowest_tasks(run, limit=10):
+    """[{'role', 'task', 'seconds', 'hosts'}] of the longest tasks of a run."""
+    hosts = {}
+    for row in run['timings']:
+        hosts.setdefault((row.get('role'), row['task']), set()).add(row['host'])
+    rows = [{'role': role, 'task': task, 'seconds': seconds, 'hosts': len(hosts[(role, task)])}
+            for (role, task), seconds in task_seconds(run).items()]
+    return sorted(rows, key=lambda r: r['seconds'], reverse=True)[:limit]
+
+
+def slowest_hosts(run, limit=10):
+    """[{'host', 'seconds', 'tasks', 'slowest_task'}] of the hosts that spent the most time in tasks."""
+    hosts = {}
+    for row in run['timings']:
+        hosts.setdefault(row['host'], []).append(row)
+    rows = [{'host': host, 'seconds': round(sum(r['duration'] for r in timings), 1), 'tasks': len(timings),
+             'slowest_task': max(timings, key=lambda r: r['duration'])['task']}
+            for host, timings in hosts.items()]
+    return sorted(rows, key=lambda r: r['seconds'], reverse=True)[:limit]
+
+
+def compare_runs(run, previous, factor=REGRESSION_FACTOR, min_seconds=REGRESSION_MIN_SECONDS):
+    """
+    Roles and tasks that took at least `factor` times longer than in `previous`.
+
+    Returns: [{'kind': 'role'|'task', 'name', 'seconds', 'previous', 'ratio'}], largest ratio first
+    """
+    if not previous:
+        return []
+    slower = []
+    for kind, now, before in (('role', role_seconds(run), role_seconds(previous)),
+                              ('task', task_seconds(run), task_seconds(previous))):
+        for key, seconds in now.items():
+            was = before.get(key)
+            if not was or seconds < min_seconds or seconds < was * factor:
+                continue
+            name = (f"{key[0]}: {key[1]}" if key[0] else key[1]) if kind == 'task' else (key or "(playbook)")
+            slower.append({'kind': kind, 'name': name, 'seconds': seconds, 'previous': was,
+                           'ratio': round(seconds / was, 1)})
+    return sorted(slower, key=lambda r: r['ratio'], reverse=True)
+
+
+def seconds_per_result(playbook, runs=None, last=3):
+    """Average wall seconds per host result over the last successful runs of `playbook`, None without history."""
+    done = [r for r in (runs if runs is not None else load_runs())
+            if r.get('playbook') == playbook and r['returncode'] == 0 and r['timings']][-last:]
+    if not done:
+        return None
+    return sum(r['ended_at'] - r['started_at'] for r in done) / sum(len(r['timings']) for r in done)
@@ -0,0 +1,270 @@
+import asyncio
+import json
+import os
+import signal
+import socket
+import time
+from reef.manager.ansible_events import PlaybookProgress, events_env, stream_events
+from reef.manager.core import ANSIBLE_DIR, BASE_DIR, HOSTS_INI_FILE, ansible_env, load_current_config
+from reef.manager.probes import wait_for
+from reef.manager.run_history import record_run
+from reef.manager.task_count import INCLUDE_ROLE, inventory_groups, load_yaml
+from reef.manager.tuning import playbook_args
+
+DEPLOY_PLAYBOOK = ANSIBLE_DIR / "playbooks" / "experimental.yml"
+DEPENDENCIES_FILE = ANSIBLE_DIR / "tasks" / "check_dependencies.yml"
+
+# Readiness checked before the roles waiting for a role start (see StagedDeploy._barrier)
+BARRIERS = {'wazuh-server': 'wazuh_manager'}
+
+# Agent enrollment (authd) and event ports of the Wazuh manager
+WAZUH_MANAGER_PORTS = (1514, 1515)
+
+
+def role_dependencies(path=DEPENDENCIES_FILE):
+    """The role_dependencies set by tasks/check_dependencies.yml: {role: {'requires', 'suggests', 'waits_for'}}."""
+    for task in load_yaml(path):
+        dependencies = (task.get('set_fact') or {}).get('role_dependencies') if isinstance(task, dict) else None
+        if isinstance(dependencies, dict):
+            return dependencies
+    return {}
+
+
+def play_roles(playbook=DEPLOY_PLAYBOOK):
+    """[(hosts, roles)] of the plays of `playbook`: the loop of their include_role, in install order."""
+    plays = []
+    for play in load_yaml(playbook):
+        if not isinstance(play, dict):
+            continue
+        for task in play.get('tasks') or []:
+            role = next((task[k] for k in INCLUDE_ROLE if k in task), None) if isinstance(task, dict) else None
+            if isinstance(role, dict) and not role.get('tasks_from') and isinstance(task.get('loop'), list):
+                plays.append((play.get('hosts'), [str(r) for r in task['loop']]))
+                break
+    return plays
+
+
+def deploy_stages(playbook=DEPLOY_PLAYBOOK, dependencies=None):
+    """
+    Stages of a full deploy, from the plays of `playbook` and the 'waits_for' of
+    role_dependencies: each play's roles are one stage, split before a role that waits
+    for a role of another host group. The split-off stage comes 'after' the stage
+    holding that role, behind its barrier (BARRIERS) if any, so the server and the
+    agents' base roles install side by side and enrollment waits for the manager.
+    """
+    dependencies = role_dependencies() if dependencies is None else dependencies
+    plays = play_roles(playbook)
+    stages, waits = [], {}
+    for hosts, roles in plays:
+        others = {role for other, other_roles in plays if other != hosts for role in other_roles}
+        stage = None
+        for role in roles:
+            awaited = [r for r in (dependencies.get(role) or {}).get('waits_for') or [] if r in others]
+            if stage is None or awaited:
+                name = hosts if stage is None else f"{hosts}:{role}"
+                stage = {'name': name, 'hosts': hosts, 'roles': [], 'after': [stage['name']] if stage else []}
+                stages.append(stage)
+                waits[name] = awaited
+            stage['roles'].append(role)
+    for stage in stages:
+        for role in waits[stage['name']]:
+            holder = next(s for s in stages if s['hosts'] != stage['hosts'] and role in s['roles'])
+            stage['after'].append(holder['name'])
+            if role in BARRIERS:
+                stage['barrier'] = BARRIERS[role]
+    return stages
+
+
+def plan_stages(enabled_roles, hosts_by_group=None, stages=None):
+    """
+    The stages (deploy_stages() by default) with something to do: each keeps its
+    enabled roles only, stages without roles (or without hosts, when hosts_by_group is
+    given) are dropped along with the dependencies on them.
+    """
+    if stages is None:
+        stages = deploy_stages()
+    planned = []
+    for stage in stages:
+        roles = [r for r in stage['roles'] if r in enabled_roles]
+        if not roles or (hosts_by_group is not None and not hosts_by_group.get(stage['hosts'])):
+            continue
+        planned.append({**stage, 'roles': roles})
+    names = {s['name'] for s in planned}
+    return [{**s, 'after': [a for a in s['after'] if a in names]} for s in planned]
+
+
+def stage_command(stage, enabled_roles, playbook=DEPLOY_PLAYBOOK, inventory=HOSTS_INI_FILE, extra_args=()):
+    """
+    ansible-playbook limited to the stage's host group and roles (reef_stage_roles).
+    enabled_roles stays the deploy's own, so the plays decide as in a sequential run
+    (e.g. no per-role clean.yml when 'cleanup' is enabled).
+    """
+    return ["ansible-playbook", str(playbook), "-i", str(inventory), "-l", stage['hosts'],
+            "-e", json.dumps({'enabled_roles': list(enabled_roles), 'reef_stage_roles': stage['roles']}), *extra_args]
+
+
+def tcp_open(host, port, timeout=2):
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
+def wazuh_manager_ready(ip):
+    """True once the manager accepts agent connections and enrollments."""
+    return all(tcp_open(ip, port) for port in WAZUH_MANAGER_PORTS)
+
+
+def _manager_ip(inventory):
+    ip = load_current_config().get('wazuh_manager_ip')
+    if ip:
+        return ip
+    servers = sorted(inventory_groups(inventory).get('security_server', ()))
+    return servers[0] if servers else None
+
+
+class StagedDeploy:
+    """
+    Full-stack deploy as concurrent ansible-playbook runs (see deploy_stages): a deploy
+    takes about max(server, agents) + enrollment instead of the sum of all plays.
+
+    enabled_roles: roles of the deploy (enabled_roles of the configuration)
+    log_callback: called with each output line, prefixed with "[<stage>] "
+    on_event: called with (stage name, event) for each reef_events event
+    barrier_timeout: seconds a barrier may stay closed after its stage's dependencies are done
+    """
+
+    def __init__(self, enabled_roles, playbook=DEPLOY_PLAYBOOK, inventory=HOSTS_INI_FILE, log_callback=None,
+                 on_event=None, barrier_timeout=900, stages=None):
+        groups = inventory_groups(inventory)
+        self.enabled_roles = list(enabled_roles)
+        self.stages = plan_stages(enabled_roles, groups, deploy_stages(playbook) if stages is None else stages)
+        self.playbook = playbook
+        self.inventory = inventory
+        self.log_callback = log_callback
+        self.on_event = on_event
+        self.barrier_timeout = barrier_timeout
+        self.extra_args = playbook_args()
+        self.progress = {}
+        self.results = {}
+        self.cancelled = False
+        self._processes = set()
+
+    def _log(self, stage, line):
+        if self.log_callback:
+            self.log_callback(f"[{stage}] {line.rstrip()}\n")
+
+    def _barrier(self, name):
+        if name == 'wazuh_manager':
+            ip = _manager_ip(self.inventory)
+            if not ip:
+                return False
+            return wait_for(lambda: self.cancelled or wazuh_manager_ready(ip), timeout=self.barrier_timeout,
+                            initial=2, max_interval=15) and not self.cancelled
+        return True
+
+    async def _run_stage(self, stage):
+        name = stage['name']
+        progress = self.progress[name] = PlaybookProgress()
+        argv = stage_command(stage, self.enabled_roles, self.playbook, self.inventory, self.extra_args)
+        self._log(name, f"Running: {' '.join(argv)}")
+
+        def on_event(event):
+            progress.feed(event)
+            if self.on_event:
+                self.on_event(name, event)
+
+        read_fd, write_fd = os.pipe()
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *argv,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+                cwd=str(BASE_DIR),
+                env=events_env(ansible_env(), write_fd),
+                pass_fds=(write_fd,),
+                start_new_session=True,  # cancel() stops the whole process group
+            )
+        except OSError:
+            os.close(read_fd)
+            raise
+        finally:
+            os.close(write_fd)
+        self._processes.add(process)
+        try:
+            events = asyncio.create_task(stream_events(read_fd, on_event))
+            async for raw in process.stdout:
+                self._log(name, raw.decode(errors='replace'))
+            returncode = await process.wait()
+            await events
+        except asyncio.CancelledError:
+            # Event loop shutting down (Ctrl+C): do not leave ansible running
+            self.cancel()
+            raise
+        finally:
+            self._processes.discard(process)
+        # Stages are compared with the same stage of earlier deploys in the run history
+        progress.playbook = f"{progress.playbook or self.playbook.name}:{name}"
+        await asyncio.to_thread(record_run, progress, returncode, " ".join(argv))
+        return returncode
+
+    async def _stage(self, stage, tasks):
+        name = stage['name']
+        start = time.monotonic()
+        for dependency in stage['after']:
+            await tasks[dependency]
+        failed = [d for d in stage['after'] if not self.results[d]['success']]
+        if failed or self.cancelled:
+            reason = f"skipped: {', '.join(failed)} failed" if failed else "cancelled"
+            self.results[name] = {'success': False, 'returncode': None, 'seconds': 0, 'message': reason}
+            self._log(name, reason)
+            return
+
+        if stage.get('barrier'):
+            self._log(name, f"Waiting for {stage['barrier']}...")
+            if not await asyncio.to_thread(self._barrier, stage['barrier']):
+                self.results[name] = {'success': False, 'returncode': None, 'seconds': round(time.monotonic() - start, 1),
+                                      'message': f"{stage['barrier']} not ready after {self.barrier_timeout}s"}
+                self._log(name, self.results[name]['message'])
+                return
+
+        returncode = await self._run_stage(stage)
+        ok = returncode == 0 and not self.cancelled
+        self.results[name] = {'success': ok, 'returncode': returncode, 'seconds': round(time.monotonic() - start, 1),
+                              'message': "done" if ok else f"ansible-playbook exited with {returncode}"}
+        self._log(name, f"{'Done' if ok else 'Failed'} in {self.results[name]['seconds']}s")
+
+    async def run(self):
+        """
+        Run the stages, each as soon as it can start.
+
+        Returns: {'success': True/False, 'message': str, 'stages': {name: {'success', 'returncode', 'seconds', 'message'}}}
+        """
+        if not self.stages:
+            return {'success': False, 'message': "Nothing to deploy: no enabled role matches a host group", 'stages': {}}
+        start = time.monotonic()
+        tasks = {}
+        for stage in self.stages:
+            tasks[stage['name']] = asyncio.ensure_future(self._stage(stage, tasks))
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        for name, task in tasks.items():
+            if name not in self.results:
+                error = task.exception() if task.done() and not task.cancelled() else None
+                self.results[name] = {'success': False, 'returncode': None, 'seconds': 0, 'message': f"error: {error}"}
+
+        seconds = round(time.monotonic() - start, 1)
+        failed = [name for name, r in self.results.items() if not r['success']]
+        if failed:
+            return {'success': False, 'message': f"Deploy failed at stage(s): {', '.join(failed)}", 'stages': self.results}
+        return {'success': True, 'message': f"Deployed {len(self.results)} stage(s) in {seconds}s", 'stages': self.results}
+
+    def cancel(self):
+        """Stop the running stages and start no new ones."""
+        self.cancelled = True
+        for process in list(self._processes):
+            if process.returncode is None:
+                try:
+                    os.killpg(process.pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    pass
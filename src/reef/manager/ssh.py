@@ -0,0 +1,163 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+
+class SSHSession:
+    """
+    Multiplexed SSH connection to a single remote host.
+
+    Every ssh/scp call goes through one OpenSSH ControlMaster socket, so the TCP
+    handshake and password/key authentication are paid once per session instead
+    of once per command. Use it as a context manager (or call close()) so the
+    master connection is torn down when the run is over.
+    """
+
+    def __init__(self, host, user, password=None, key=None, persist=600, connect_timeout=15):
+        self.host = host
+        self.user = user
+        self.password = password
+        self.key = key
+        self.persist = persist
+        self.connect_timeout = connect_timeout
+
+        # Short private directory: unix socket paths are limited to ~104 chars
+        self.control_dir = tempfile.mkdtemp(prefix="reef-ssh-")
+        self.control_path = os.path.join(self.control_dir, "master")
+
+        self.metrics = {
+            'connections': 0,
+            'commands': 0,
+            'transfers': 0,
+            'failures': 0,
+            'seconds': 0.0,
+        }
+
+    @property
+    def target(self):
+        return f"{self.user}@{self.host}"
+
+    def _common_options(self):
+        opts = [
+            "-o", "StrictHostKeyChecking=no",
+            "-o", "UserKnownHostsFile=/dev/null",
+            "-o", "LogLevel=ERROR",
+            "-o", f"ConnectTimeout={self.connect_timeout}",
+            "-o", "ControlMaster=auto",
+            "-o", f"ControlPath={self.control_path}",
+            "-o", f"ControlPersist={self.persist}",
+        ]
+        if self.key:
+            opts = ["-i", os.path.expanduser(self.key)] + opts
+        return opts
+
+    def _wrap(self, argv):
+        """Prefix argv with sshpass when using password auth (password is passed via env, not argv)."""
+        if self.password:
+            return ["sshpass", "-e"] + argv
+        return argv
+
+    def _env(self):
+        env = os.environ.copy()
+        if self.password:
+            env['SSHPASS'] = self.password
+        return env
+
+    def ssh_argv(self, command):
+        return self._wrap(["ssh"] + self._common_options() + [self.target, command])
+
+    def scp_argv(self, sources, remote_path, recursive=False):
+        argv = ["scp"] + self._common_options()
+        if recursive:
+            argv.append("-r")
+        argv += [str(s) for s in sources]
+        argv.append(f"{self.target}:{remote_path}")
+        return self._wrap(argv)
+
+    def _execute(self, argv, timeout=None, input=None):
+        if not os.path.exists(self.control_path):
+            self.metrics['connections'] += 1
+        start = time.monotonic()
+        try:
+            result = subprocess.run(argv, capture_output=True, text=True, env=self._env(), timeout=timeout, input=input)
+        except subprocess.TimeoutExpired as e:
+            result = subprocess.CompletedProcess(argv, 124, stdout=e.stdout or "", stderr=f"Timed out after {timeout}s")
+            if isinstance(result.stdout, bytes):
+                result.stdout = result.stdout.decode(errors='replace')
+        self.metrics['seconds'] += time.monotonic() - start
+        if result.returncode != 0:
+            self.metrics['failures'] += 1
+        return result
+
+    def run(self, command, timeout=None, input=None):
+        """
+        Run a shell command on the remote host. Returns a CompletedProcess (text mode).
+        `input` is fed to the remote command's stdin (e.g. a script for `bash -s`).
+        """
+        self.metrics['commands'] += 1
+        return self._execute(self.ssh_argv(command), timeout=timeout, input=input)
+
+    def stream(self, command, on_line=None):
+        """
+        Run a shell command on the remote host and hand each output line (stdout and
+        stderr interleaved) to on_line as soon as it arrives. If on_line returns True
+        the local ssh client is stopped and the call returns early.
+
+        Returns a CompletedProcess whose stdout holds everything that was read.
+        """
+        self.metrics['commands'] += 1
+        argv = self.ssh_argv(command)
+        if not os.path.exists(self.control_path):
+            self.metrics['connections'] += 1
+        start = time.monotonic()
+        lines = []
+        proc = subprocess.Popen(argv, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL,
+                                text=True, bufsize=1, env=self._env())
+        try:
+            for line in proc.stdout:
+                lines.append(line)
+                if on_line and on_line(line.rstrip("\n")):
+                    proc.terminate()
+                    break
+        finally:
+            proc.stdout.close()
+            try:
+                returncode = proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                returncode = proc.wait()
+        self.metrics['seconds'] += time.monotonic() - start
+        if returncode != 0:
+            self.metrics['failures'] += 1
+        return subprocess.CompletedProcess(argv, returncode, stdout="".join(lines), stderr="")
+
+    def copy(self, sources, remote_path, recursive=False, timeout=None):
+        """Copy local files to the remote host over the shared connection."""
+        if isinstance(sources, (str, os.PathLike)):
+            sources = [sources]
+        self.metrics['transfers'] += 1
+        return self._execute(self.scp_argv(sources, remote_path, recursive=recursive), timeout=timeout)
+
+    def summary(self):
+        m = self.metrics
+        return (f"{m['connections']} connection(s), {m['commands']} command(s), "
+                f"{m['transfers']} transfer(s), {m['failures']} failure(s), {m['seconds']:.1f}s on the wire")
+
+    def close(self):
+        """Stop the ControlMaster and remove its socket directory."""
+        if os.path.exists(self.control_path):
+            argv = ["ssh", "-o", f"ControlPath={self.control_path}", "-O", "exit", self.target]
+            try:
+                subprocess.run(argv, capture_output=True, text=True, timeout=10)
+            except Exception:
+                pass
+        shutil.rmtree(self.control_dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
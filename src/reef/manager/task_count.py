@@ -0,0 +1,196 @@
+import hashlib
+import json
+import re
+import threading
+from pathlib import Path
+from ruamel.yaml import YAML, YAMLError
+
+TASK_COUNT_CACHE_FILE = Path(__file__).parent.parent / "cache" / "task_counts.json"
+MAX_CACHED = 50
+
+INCLUDE_TASKS = ('include_tasks', 'import_tasks', 'ansible.builtin.include_tasks', 'ansible.builtin.import_tasks')
+INCLUDE_ROLE = ('include_role', 'import_role', 'ansible.builtin.include_role', 'ansible.builtin.import_role')
+
+# The only conditions reef's playbooks put on includes: "<item> [not] in enabled_roles",
+# and "<item> in (reef_stage_roles | default(enabled_roles))" for the roles of a staged run
+ROLE_CONDITION_RE = re.compile(r"^\s*(['\"]?)([\w{}\s-]+?)\1\s+(not\s+)?in\s+"
+                               r"(enabled_roles|\(\s*reef_stage_roles\s*\|\s*default\(\s*enabled_roles\s*\)\s*\))\s*$")
+
+_cache_lock = threading.Lock()
+
+
+def load_yaml(path):
+    try:
+        return YAML(typ='safe').load(Path(path).read_text()) or []
+    except (OSError, YAMLError):
+        return []
+
+
+def inventory_groups(inventory):
+    """{group: set of hosts} from an INI inventory, ':children' groups resolved; 'all' included."""
+    groups, children, section = {}, {}, None
+    for raw in Path(inventory).read_text().splitlines() if Path(inventory).exists() else []:
+        line = raw.split('#', 1)[0].strip()
+        if not line:
+            continue
+        if line.startswith('[') and line.endswith(']'):
+            section = line[1:-1]
+            if section.endswith(':children'):
+                children.setdefault(section[:-len(':children')], [])
+            elif not section.endswith(':vars'):
+                groups.setdefault(section, set())
+            continue
+        if section is None or section.endswith(':vars'):
+            continue
+        if section.endswith(':children'):
+            children[section[:-len(':children')]].append(line.split()[0])
+        else:
+            groups[section].add(line.split()[0])
+
+    def resolve(group, seen=()):
+        hosts = set(groups.get(group, ()))
+        for child in children.get(group, ()):
+            if child not in seen:
+                hosts |= resolve(child, seen + (group,))
+        return hosts
+
+    resolved = {group: resolve(group) for group in set(groups) | set(children)}
+    resolved['all'] = set().union(*resolved.values()) if resolved else set()
+    return resolved
+
+
+def play_hosts(pattern, groups, limit=None):
+    """Hosts a play's `hosts:` pattern (names joined by ':' or ',') matches, within `limit` if any."""
+    def match(expr):
+        hosts = set()
+        for name in re.split(r'[:,]', str(expr)):
+            name = name.strip()
+            if name:
+                hosts |= groups.get(name, {name} if name in groups['all'] else set())
+        return hosts
+    hosts = match(pattern)
+    return hosts & match(limit) if limit else hosts
+
+
+def _condition_holds(condition, item, enabled_roles, stage_roles=None):
+    """False only for the enabled_roles (or stage roles) conditions that do not hold; anything else may run."""
+    m = ROLE_CONDITION_RE.match(str(condition))
+    if not m:
+        return True
+    value = m.group(2).strip()
+    if not m.group(1):  # a variable: only the loop item is known
+        if item is None:
+            return True
+        value = item
+    roles = enabled_roles if m.group(4) == 'enabled_roles' or stage_roles is None else stage_roles
+    return (value in roles) != bool(m.group(3))
+
+
+def count_tasks(tasks, base_dir, roles_dir, enabled_roles, depth=0, stage_roles=None):
+    """
+    Results one host reports for a list of tasks: includes are expanded (loops over
+    role names and enabled_roles conditions included), blocks counted with their
+    'always' section. Statically unknown includes count as nothing.
+    stage_roles: reef_stage_roles of a staged run (None: all enabled roles)
+    """
+    if depth > 10 or not isinstance(tasks, list):
+        return 0
+    total = 0
+    for task in tasks:
+        if not isinstance(task, dict):
+            continue
+        if isinstance(task.get('block'), list):
+            total += sum(count_tasks(task.get(k) or [], base_dir, roles_dir, enabled_roles, depth + 1, stage_roles)
+                         for k in ('block', 'always'))
+            continue
+        items = task.get('loop') if isinstance(task.get('loop'), list) else [None]
+        conditions = task.get('when') if isinstance(task.get('when'), list) else [task.get('when')]
+        items = [i for i in items if all(_condition_holds(c, i, enabled_roles, stage_roles) for c in conditions if c)]
+
+        include = next((task[k] for k in INCLUDE_TASKS if k in task), None)
+        role = next((task[k] for k in INCLUDE_ROLE if k in task), None)
+        if include is not None:
+            path = base_dir / str(include.get('file') if isinstance(include, dict) else include)
+            total += len(items) * count_tasks(load_yaml(path), path.parent, roles_dir, enabled_roles, depth + 1, stage_roles)
+        elif isinstance(role, dict):
+            for item in items:
+                name = str(role.get('name', ""))
+                if '{{' in name:
+                    name = item or ""
+                path = roles_dir / name / "tasks" / str(role.get('tasks_from') or "main.yml")
+                total += count_tasks(load_yaml(path), path.parent, roles_dir, enabled_roles, depth + 1, stage_roles)
+        else:
+            # Loops report one result per host, whatever the item count
+            total += 1
+    return total
+
+
+def count_playbook_results(playbook, inventory, enabled_roles, limit=None, stage_roles=None):
+    """Host results (task x host) a run of `playbook` should report, by static analysis."""
+    playbook = Path(playbook)
+    roles_dir = playbook.parent.parent / "roles"
+    groups = inventory_groups(inventory)
+    total = 0
+    for play in load_yaml(playbook):
+        if not isinstance(play, dict):
+            continue
+        if 'import_playbook' in play:
+            total += count_playbook_results(playbook.parent / play['import_playbook'], inventory, enabled_roles, limit,
+                                            stage_roles)
+            continue
+        hosts = play_hosts(play.get('hosts', ""), groups, limit)
+        per_host = 1 if play.get('gather_facts', True) else 0
+        for role in play.get('roles') or []:
+            name = role.get('role') or role.get('name') if isinstance(role, dict) else role
+            per_host += count_tasks(load_yaml(roles_dir / str(name) / "tasks" / "main.yml"),
+                                    roles_dir / str(name) / "tasks", roles_dir, enabled_roles, stage_roles=stage_roles)
+        for section in ('pre_tasks', 'tasks', 'post_tasks'):
+            per_host += count_tasks(play.get(section) or [], playbook.parent, roles_dir, enabled_roles, stage_roles=stage_roles)
+        total += per_host * len(hosts)
+    return total
+
+
+def playbook_key(playbook, inventory, enabled_roles, limit=None, stage_roles=None):
+    """Hash of everything the count depends on: playbooks, roles, tasks, inventory, enabled_roles, limit and stage roles."""
+    ansible_dir = Path(playbook).parent.parent
+    stage = sorted(stage_roles) if stage_roles is not None else None
+    digest = hashlib.sha256(json.dumps([str(playbook), sorted(enabled_roles), limit, stage]).encode())
+    files = sorted(p for d in ("playbooks", "roles", "tasks") for p in (ansible_dir / d).rglob("*.yml"))
+    for path in files + [Path(inventory)]:
+        if path.exists():
+            digest.update(f"{path}\n".encode())
+            digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def expected_results(playbook, inventory, enabled_roles, limit=None, stage_roles=None):
+    """count_playbook_results(), cached by playbook_key() so unchanged playbooks are not re-read."""
+    key = playbook_key(playbook, inventory, enabled_roles, limit, stage_roles)
+    with _cache_lock:
+        cache = {}
+        if TASK_COUNT_CACHE_FILE.exists():
+            try:
+                cache = json.loads(TASK_COUNT_CACHE_FILE.read_text())
+            except ValueError:
+                pass
+        if key not in cache:
+            cache[key] = count_playbook_results(playbook, inventory, enabled_roles, limit, stage_roles)
+            cache = dict(list(cache.items())[-MAX_CACHED:])
+            TASK_COUNT_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+            TASK_COUNT_CACHE_FILE.write_text(json.dumps(cache, indent=2))
+        return cache[key]
+
+
+def eta_seconds(done, total, seconds_per_result):
+    """Seconds left for the remaining results at the pace of past runs, None without history."""
+    if not seconds_per_result or not total:
+        return None
+    return max(0, total - done) * seconds_per_result
+
+
+def format_eta(seconds):
+    if seconds is None:
+        return ""
+    if seconds < 60:
+        return f"~{int(seconds)}s left"
+    return f"~{round(seconds / 60)} min left"
@@ -0,0 +1,125 @@
+import json
+import re
+
+# Stable per-manager locations, relative to the SSH user's home on the manager
+REMOTE_REEF_DIR = ".reef"
+REMOTE_TF_DIR = f"{REMOTE_REEF_DIR}/terraform"
+REMOTE_CLI_CONFIG = f"{REMOTE_REEF_DIR}/terraformrc"
+
+PID_FILE = ".reef-terraform.pid"
+
+# Known terraform/libvirt failure signatures, checked against every output line.
+# Order matters: the first matching signature wins.
+FAILURE_SIGNATURES = [
+    ('memory', re.compile(r"Cannot allocate memory|cannot set up guest memory")),
+    ('guest_agent', re.compile(r"Guest agent is not responding|guest agent is not connected", re.IGNORECASE)),
+    ('lease_timeout', re.compile(r"context deadline exceeded|timeout waiting for lease|couldn't retrieve IP address of domain", re.IGNORECASE)),
+    ('state_lock', re.compile(r"Error acquiring the state lock")),
+]
+
+
+class FailureClassifier:
+    """
+    Incremental classifier for terraform output. Feed it lines as they are
+    streamed; `kind` holds the first known failure signature seen (or None).
+    """
+
+    def __init__(self, signatures=None):
+        self.signatures = signatures or FAILURE_SIGNATURES
+        self.kind = None
+        self.line = None
+        self.lines = []
+
+    def feed(self, line):
+        self.lines.append(line)
+        if self.kind is None:
+            for kind, pattern in self.signatures:
+                if pattern.search(line):
+                    self.kind = kind
+                    self.line = line
+                    break
+        return self.kind
+
+    @property
+    def lock_id(self):
+        """Lock ID reported with a state lock error, if any."""
+        m = re.search(r"ID:\s*([0-9a-f\-]+)", "\n".join(self.lines), re.IGNORECASE)
+        return m.group(1) if m else None
+
+
+def terraform_command(remote_tf_dir, args):
+    """Remote command running terraform in remote_tf_dir, recording its PID so it can be interrupted."""
+    return (f"cd {remote_tf_dir} && export TF_CLI_CONFIG_FILE=\"$HOME/{REMOTE_CLI_CONFIG}\" && "
+            f"echo $$ > {PID_FILE} && exec terraform {args}")
+
+
+def interrupt_command(remote_tf_dir):
+    """
+    Remote command sending SIGINT to the running terraform. Terraform then cancels
+    in-flight operations, writes its state and releases the lock before exiting.
+    """
+    return f"cd {remote_tf_dir} && pid=$(cat {PID_FILE} 2>/dev/null) && kill -INT $pid 2>/dev/null; true"
+
+
+def stream_terraform(session, remote_tf_dir, args, log_callback=None, cancel_on=()):
+    """
+    Run `terraform <args>` on the manager, streaming every line to log_callback.
+    As soon as a failure signature listed in cancel_on shows up, terraform is
+    interrupted instead of being left to run into its own timeouts; the rest of
+    its output (graceful shutdown) is still drained so the state is saved.
+
+    Returns: (CompletedProcess, FailureClassifier)
+    """
+    classifier = FailureClassifier()
+    cancelled = []
+
+    def on_line(line):
+        if log_callback:
+            log_callback(f"[TF] {line}\n")
+        kind = classifier.feed(line)
+        if kind in cancel_on and not cancelled:
+            cancelled.append(kind)
+            if log_callback:
+                log_callback(f"[TF] Detected '{kind}' failure, cancelling terraform early...\n")
+            session.run(interrupt_command(remote_tf_dir))
+        return False
+
+    result = session.stream(terraform_command(remote_tf_dir, args), on_line)
+    if cancelled and result.returncode == 0:
+        result.returncode = 1
+    return result, classifier
+
+
+def state_vm_profiles(show_json):
+    """
+    Size and profile of the VMs in terraform state, from `terraform show -json`:
+    {domain: {'key', 'memory', 'vcpu', 'accelerated', 'disk_gb'}}, 'key' being the
+    for_each key (the domain name for the per-VM resources of older versions).
+    """
+    try:
+        data = json.loads(show_json or "{}")
+    except ValueError:
+        return {}
+    resources = (data.get('values') or {}).get('root_module', {}).get('resources', [])
+    profiles = {}
+    disks = {}
+    for resource in resources:
+        values = resource.get('values') or {}
+        if resource.get('type') == 'libvirt_domain' and values.get('name'):
+            profiles[values['name']] = {'key': resource.get('index', values['name']), 'memory': values.get('memory'),
+                                        'vcpu': values.get('vcpu'), 'accelerated': values.get('type') == 'kvm'}
+        elif resource.get('type') == 'libvirt_volume' and str(values.get('name', '')).endswith('.qcow2'):
+            disks[values['name'][:-len('.qcow2')]] = values.get('size')
+    for name, profile in profiles.items():
+        if disks.get(name):
+            profile['disk_gb'] = disks[name] // 1073741824
+    return profiles
+
+
+def error_summary(output, max_lines=8):
+    """Short failure description from terraform output: the first `Error:` block, or the last lines."""
+    lines = [l for l in (output or "").splitlines() if l.strip()]
+    for i, line in enumerate(lines):
+        if "Error:" in line:
+            return "\n".join(lines[i:i + max_lines])
+    return "\n".join(lines[-max_lines:])
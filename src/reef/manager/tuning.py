@@ -0,0 +1,74 @@
+import json
+import os
+from reef.manager.core import HOSTS_INI_FILE, load_current_config
+from reef.manager.task_count import inventory_groups
+
+STRATEGIES = ("auto", "linear", "free")
+
+# Resident size of one ansible worker process, with headroom
+FORK_MEMORY_MB = 100
+FORKS_PER_CPU = 10  # workers mostly wait on SSH
+MAX_FORKS = 200
+# Above this many hosts no host waits for the slowest one at every task (free strategy)
+FREE_STRATEGY_FROM = 10
+# Above this many hosts plays roll out in batches of `forks` hosts
+SERIAL_FROM = 100
+
+
+def controller_resources():
+    """(CPU count, available memory in MB or None) of the machine running ansible."""
+    available = None
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    available = int(line.split()[1]) // 1024
+                    break
+    except OSError:
+        try:
+            available = os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE') // 2 ** 20
+        except (ValueError, OSError, AttributeError):
+            pass
+    return os.cpu_count() or 1, available
+
+
+def auto_forks(hosts, cpus, available_mb=None):
+    """As many forks as hosts, within what the controller's CPUs and memory can run."""
+    limits = [MAX_FORKS, hosts, cpus * FORKS_PER_CPU]
+    if available_mb:
+        limits.append(available_mb // FORK_MEMORY_MB)
+    return max(1, min(limits))
+
+
+def ansible_settings(config=None, hosts=None, resources=None):
+    """
+    Forks, strategy and serial batch size of playbook runs: the deploy_forks,
+    deploy_strategy and deploy_serial settings, computed from the inventory size
+    and the controller when left to 0 / "auto".
+
+    Returns: {'forks': int, 'strategy': 'linear'|'free', 'serial': int (0: all hosts at once), 'hosts': int}
+    """
+    config = load_current_config() if config is None else config
+    if hosts is None:
+        hosts = len(inventory_groups(HOSTS_INI_FILE)['all']) if HOSTS_INI_FILE.exists() else 0
+        hosts = hosts or int(config.get('endpoint_count', 1) or 1) + 1
+    cpus, available_mb = resources or controller_resources()
+
+    forks = int(config.get('deploy_forks') or 0) or auto_forks(hosts, cpus, available_mb)
+    strategy = config.get('deploy_strategy') or "auto"
+    if strategy not in STRATEGIES[1:]:
+        strategy = "free" if hosts > FREE_STRATEGY_FROM else "linear"
+    serial = int(config.get('deploy_serial') or 0)
+    if serial == 0 and hosts > SERIAL_FROM:
+        serial = forks
+    return {'forks': forks, 'strategy': strategy, 'serial': serial, 'hosts': hosts}
+
+
+def playbook_args(settings=None):
+    """
+    ansible-playbook arguments applying the settings: --forks, and the strategy and
+    serial the playbooks read from reef_strategy / reef_serial.
+    """
+    settings = settings or ansible_settings()
+    return ["--forks", str(settings['forks']),
+            "-e", json.dumps({'reef_strategy': settings['strategy'], 'reef_serial': settings['serial']})]
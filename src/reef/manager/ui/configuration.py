@@ -1,8 +1,13 @@
 from nicegui import ui
-from reef.manager.core import SchemaManager, update_yaml_config_from_schema, update_ini_inventory, load_current_config, BASE_DIR, GROUP_VARS_FILE, HOSTS_INI_FILE, generate_terraform_vm_config, run_terraform_apply, get_manager_credentials_from_inventory, get_inventory_hosts
+from reef.manager.core import SchemaManager, update_yaml_config_from_schema, update_ini_inventory, load_current_config, BASE_DIR, GROUP_VARS_FILE, HOSTS_INI_FILE, get_inventory_hosts
+from reef.manager.vm_state import load_vm_state, add_vms, remove_vms, next_vm_names
+from reef.manager.images import BASE_IMAGES, DEFAULT_OS
+from reef.manager.engine import ProvisioningJob
+from reef.manager.pipeline import AgentPipeline
+from reef.manager.pool import claim_vm, idle_pool_vms
+from reef.manager.tuning import ansible_settings
 from reef.manager.ui_utils import page_header, card_style, app_state
 import asyncio
-import re
 
 def show_configuration():
     page_header("Settings", "Configure your security environment")
@@ -68,6 +73,12 @@ def show_configuration():
                             is_password = 'password' in var_name or 'secret' in var_name
                             form_inputs[var_name] = ui.input(desc, value=str(default_val) if default_val else "", password=is_password).classes('w-full text-slate-300')
 
+                if cat_name == "Deployment Performance":
+                    tuned = ansible_settings(current_config)
+                    serial = tuned['serial'] or "all hosts"
+                    ui.label(f"Applied for {tuned['hosts']} hosts on this machine: {tuned['forks']} forks, "
+                             f"{tuned['strategy']} strategy, batches of {serial}").classes('text-xs text-slate-500 mt-2')
+
         ui.button("Save Settings", on_click=save_config).classes('bg-indigo-600 w-full')
     
     # --- Infrastructure Provisioning Section ---
@@ -75,16 +86,75 @@ def show_configuration():
     
     with ui.column().classes(card_style() + ' w-full'):
         ui.label("Infrastructure Provisioning").classes('text-xl font-bold text-slate-200 mb-2')
-        ui.markdown("Create new Virtual Machines to add to your inventory.").classes('text-slate-400 mb-6')
+        ui.markdown("Create or remove Virtual Machines on the security server. Changes are applied incrementally: existing VMs are left untouched.").classes('text-slate-400 mb-6')
         
         with ui.grid(columns=3).classes('w-full gap-4'):
              vm_count_sel = ui.select([1, 2, 3, 4, 5], value=1, label='Number of VMs').classes('w-full text-slate-300')
-             vm_os_sel = ui.select(['ubuntu-22.04', 'debian-11'], value='ubuntu-22.04', label='Operating System').classes('w-full text-slate-300')
+             vm_os_sel = ui.select(list(BASE_IMAGES), value=DEFAULT_OS, label='Operating System').classes('w-full text-slate-300')
              vm_pw_in = ui.input(label='VM SSH Password', password=True).classes('w-full text-slate-300')
         
         vm_prefix_in = ui.input(label='VM Name Prefix', value='vm', placeholder='e.g., node').classes('w-full text-slate-300')
+        deploy_chk = ui.checkbox("Install the agent roles on each new VM as soon as it is up").classes('text-slate-300')
+        idle_count = len(idle_pool_vms(load_vm_state()))
+        pool_chk = ui.checkbox(f"Take VMs from the warm pool first ({idle_count} idle, keep their pool password)",
+                               value=idle_count > 0).classes('text-slate-300')
+
+        # Current desired state, with a remove action per VM
+        desired_vms = load_vm_state()
+        vm_ips = {h.get('vm_name'): h['ip'] for h in get_inventory_hosts() if h.get('vm_name')}
+        remove_selection = {}
+        if desired_vms:
+            ui.label("Provisioned VMs").classes('text-sm font-bold text-slate-300 mt-4')
+            with ui.column().classes('w-full gap-1'):
+                for vm in desired_vms:
+                    with ui.row().classes('items-center bg-slate-800/50 p-2 rounded gap-4 w-full'):
+                        remove_selection[vm['name']] = ui.checkbox().props('dense')
+                        ui.label(vm['name']).classes('font-mono text-slate-200 text-xs w-32')
+                        ui.label(vm['os']).classes('text-slate-400 text-xs w-32')
+                        ui.label(vm.get('hypervisor') or 'not placed').classes('font-mono text-slate-400 text-xs w-32')
+                        ui.label(vm_ips.get(vm['name'], 'not provisioned')).classes('font-mono text-slate-400 text-xs')
         
         prov_log = ui.log().classes('w-full h-40 bg-slate-900 font-mono text-xs p-4 rounded-xl border border-white/5 hidden')
+
+        async def converge(passwords=None, deploy=False):
+            """
+            Apply the desired state and report the outcome in the provisioning log.
+            With deploy, the new VMs (those in passwords) get their agent roles as they come up.
+            """
+            def log_wrapper(msg):
+                prov_log.push(msg.strip())
+
+            pipeline = AgentPipeline(passwords, vm_names=list(passwords or {}), log_callback=log_wrapper) if deploy else None
+
+            def ip_found(vm_name, vm_ip):
+                prov_log.push(f"[PROVISION] {vm_name} is up at {vm_ip}")
+                if pipeline:
+                    pipeline.on_ip(vm_name, vm_ip)
+
+            job = ProvisioningJob('apply_vm_state', {'passwords': passwords})
+            app_state.current_job = job
+            app_state.current_pipeline = pipeline
+            app_state.running_process = "Provisioning VMs..."
+            try:
+                tf_result = await job.run(log_wrapper, ip_found)
+                if pipeline:
+                    app_state.current_job = None
+                    app_state.running_process = "Deploying agents..."
+                    deployed = await pipeline.finish(tf_result.get('ips'))
+                    prov_log.push(f"[DEPLOY] {deployed['message']}")
+                    if not deployed['success']:
+                        ui.notify("Agent deployment failed on some VMs.", type='negative')
+            finally:
+                app_state.current_job = None
+                app_state.current_pipeline = None
+                app_state.running_process = None
+            if tf_result.get('success'):
+                prov_log.push(f"[PROVISION] {tf_result.get('message')}. hosts.ini updated ({len(tf_result.get('ips', {}))} VM(s)).")
+                ui.notify("VMs provisioned and inventory updated!", type='positive')
+                ui.timer(2.0, lambda: ui.run_javascript('window.location.reload()'), once=True)
+            else:
+                prov_log.push(f"[ERROR] Provisioning failed: {tf_result.get('message')}")
+                ui.notify("Provisioning failed.", type='negative')
         
         async def run_provision():
             prov_log.classes(remove='hidden')
@@ -92,116 +162,63 @@ def show_configuration():
             
             try:
                 count = int(vm_count_sel.value)
-                os_choice = vm_os_sel.value
                 password = vm_pw_in.value or 'ubuntu'
-                prefix = vm_prefix_in.value or 'vm'
-                
-                prov_log.push(f"[PROVISION] Preparing to create {count} VMs ({os_choice})...")
-                
-                # Build Specs
-                vm_specs = []
-                for i in range(count):
-                    name = f"{prefix}-{i+1}"
-                    vm_specs.append({
-                        'name': name,
-                        'ssh_password': password,
-                        'os': os_choice
-                    })
-                
-                # Get Manager Creds
-                manager_ip, manager_ssh_user, manager_ssh_password, manager_ssh_key = await asyncio.to_thread(get_manager_credentials_from_inventory)
-                
-                if not manager_ip:
-                     prov_log.push("[ERROR] Manager IP not found in hosts.ini. Please configure manually first.")
-                     return
+                names = next_vm_names(vm_prefix_in.value or 'vm', count)
 
-                # Generate Terraform
-                gen_result = await asyncio.to_thread(generate_terraform_vm_config, vm_specs, manager_ip, manager_ssh_user, manager_ssh_password, manager_ssh_key)
+                # Warm pool: claimed VMs are usable right away, the apply below refills the pool
+                if pool_chk.value:
+                    claimed = []
+                    for name in list(names):
+                        result = await asyncio.to_thread(claim_vm, name, vm_os_sel.value)
+                        if not result['success']:
+                            prov_log.push(f"[POOL] {result['message']}")
+                            break
+                        claimed.append(name)
+                        names.remove(name)
+                        prov_log.push(f"[POOL] {result['message']}: user {result['vm']['user']}, pool password")
+                    if claimed:
+                        ui.notify(f"{len(claimed)} VM(s) ready from the warm pool", type='positive')
+                    if not names:
+                        prov_log.push("[POOL] Refilling the warm pool...")
+                        await converge()
+                        return
                 
-                if not gen_result.get('success'):
-                    prov_log.push(f"[ERROR] Terraform Config Gen Failed: {gen_result.get('message')}")
+                # Password hashing is CPU bound: keep it off the event loop
+                added = await asyncio.to_thread(add_vms, [{'name': n, 'ssh_password': password, 'os': vm_os_sel.value} for n in names])
+                if not added['success']:
+                    prov_log.push(f"[ERROR] {added['message']}")
                     return
-                
-                prov_log.push("[PROVISION] Terraform configuration generated. Applying...")
-                
-                # Apply Terraform
-                def log_wrapper(msg):
-                    prov_log.push(msg.strip())
-                
-                tf_result = await asyncio.to_thread(
-                    run_terraform_apply,
-                    gen_result.get('terraform_dir'),
-                    log_wrapper,
-                    gen_result.get('manager_ssh_password'),
-                    gen_result.get('manager_ip'),
-                    gen_result.get('manager_ssh_user'),
-                    manager_ssh_key
-                )
-                
-                if tf_result.get('success'):
-                    prov_log.push("[PROVISION] Infrastructure provisioning successful.")
-                    
-                    # Update Inventory
-                    tf_output = tf_result.get('output', '')
-                    ip_matches = re.findall(r'(\S+)_ip\s*=\s*"([^"]+)"', tf_output)
-                    
-                    if ip_matches:
-                        prov_log.push(f"[INVENTORY] Found {len(ip_matches)} new IPs. Updating hosts.ini...")
-                        
-                        current_hosts = await asyncio.to_thread(get_inventory_hosts)
-                        
-                        # Prepare data for update
-                        curr_mgr_ip, curr_mgr_user, curr_mgr_pw, curr_mgr_key = await asyncio.to_thread(get_manager_credentials_from_inventory)
-                        new_agents_data = [h for h in current_hosts if h['ip'] != curr_mgr_ip]
-                        
-                        for vm_key, vm_ip in ip_matches:
-                            clean_name = vm_key.replace('_ip', '')
-                            user_name = re.sub(r'[^a-z0-9-]', '', clean_name.lower()) or 'ubuntu'
-                            
-                            # Construct ProxyCommand for nested VM access
-                            proxy_cmd = ""
-                            if manager_ssh_key:
-                                 proxy_cmd = f'-o ProxyCommand="ssh -W %h:%p -i {manager_ssh_key} -o StrictHostKeyChecking=no {manager_ssh_user}@{manager_ip}"'
-                            elif manager_ssh_password:
-                                 proxy_cmd = f'-o ProxyCommand="sshpass -p \'{manager_ssh_password}\' ssh -W %h:%p -o StrictHostKeyChecking=no {manager_ssh_user}@{manager_ip}"'
+                prov_log.push(f"[PROVISION] Adding {', '.join(added['vms'])} ({vm_os_sel.value})...")
+                await converge({n: password for n in added['vms']}, deploy=deploy_chk.value)
 
-                            entry = {
-                                'ip': vm_ip,
-                                'user': user_name,
-                                'password': 'ubuntu',
-                                'key': '',
-                                'type': 'vm',
-                                'hypervisor': manager_ip,
-                                'vm_name': clean_name,
-                                'ansible_ssh_common_args': proxy_cmd
-                            }
-                             # Update existing or append
-                            existing = next((a for a in new_agents_data if a['ip'] == vm_ip), None)
-                            if existing:
-                                existing.update(entry)
-                            else:
-                                new_agents_data.append(entry)
-                        
-                        success = await asyncio.to_thread(update_ini_inventory, curr_mgr_ip, curr_mgr_user, curr_mgr_pw, curr_mgr_key, new_agents_data)
-                        
-                        if success:
-                             prov_log.push("[INVENTORY] hosts.ini updated.")
-                             ui.notify("VMs created and inventory updated!", type='positive')
-                             ui.timer(2.0, lambda: ui.run_javascript('window.location.reload()'), once=True)
-                        else:
-                             prov_log.push("[ERROR] Failed to update hosts.ini")
-                    else:
-                        prov_log.push("[WARNING] No IPs found in Terraform output.")
-                
-                else:
-                    prov_log.push(f"[ERROR] Terraform Apply Failed: {tf_result.get('message')}")
-                    ui.notify("Provisioning failed.", type='negative')
+            except Exception as e:
+                prov_log.push(f"[CRITICAL] {e}")
+                ui.notify(f"Error: {e}", type='negative')
+
+        async def run_remove():
+            names = [name for name, box in remove_selection.items() if box.value]
+            if not names:
+                ui.notify("Select the VMs to remove first.", type='warning')
+                return
+            prov_log.classes(remove='hidden')
+            prov_log.clear()
+
+            try:
+                removed = remove_vms(names)
+                if not removed['success']:
+                    prov_log.push(f"[ERROR] {removed['message']}")
+                    return
+                prov_log.push(f"[PROVISION] Removing {', '.join(names)}...")
+                await converge()
 
             except Exception as e:
                 prov_log.push(f"[CRITICAL] {e}")
                 ui.notify(f"Error: {e}", type='negative')
         
-        ui.button("Provision VMs", on_click=run_provision).classes('bg-indigo-600')
+        with ui.row().classes('gap-4'):
+            ui.button("Provision VMs", on_click=run_provision).classes('bg-indigo-600')
+            if desired_vms:
+                ui.button("Remove Selected", on_click=run_remove).classes('bg-red-700')
 
     # --- Agents Inventory Section ---
     ui.separator().classes('my-8 bg-slate-700')
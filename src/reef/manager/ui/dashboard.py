@@ -1,7 +1,9 @@
 from nicegui import ui
 from reef.manager.core import GROUP_VARS_FILE, HOSTS_INI_FILE, load_current_config, get_manager_credentials_from_inventory
-from reef.manager.ui_utils import page_header, card_style, status_badge
+from reef.manager.ui_utils import page_header, card_style, status_badge, run_timing_view
 from reef.manager.pdf_report import fetch_wazuh_alert_summary, generate_report_pdf
+from reef.manager.vm_lifecycle import run_lifecycle
+from reef.manager.run_history import load_runs
 import datetime
 
 def show_dashboard():
@@ -284,6 +286,17 @@ def show_dashboard():
             
             ui.button('Download Audit Report (PDF)', on_click=download_report).props('icon=picture_as_pdf').classes('w-full bg-indigo-600 text-white hover:bg-indigo-700 transition-colors')
 
+        # Last Deployment Timing Card
+        runs = load_runs()
+        if runs:
+            last_run = runs[-1]
+            with ui.column().classes(card_style()):
+                ui.label('Last Deployment Timing').classes('text-slate-400 font-bold mb-4 border-b border-white/10 pb-2 w-full')
+                started = datetime.datetime.fromtimestamp(last_run['started_at']).strftime('%Y-%m-%d %H:%M')
+                minutes = round((last_run['ended_at'] - last_run['started_at']) / 60, 1)
+                ui.label(f"{last_run.get('playbook') or 'playbook'} on {started}: {minutes} min").classes('text-slate-300 text-sm mb-2')
+                run_timing_view(last_run)
+
         # Instance Status Card
         from reef.manager.core import get_inventory_hosts
         all_hosts = get_inventory_hosts()
@@ -300,15 +313,20 @@ def show_dashboard():
             with ui.column().classes(card_style()):
                 ui.label('Virtual Machines').classes('text-slate-400 font-bold mb-4 border-b border-white/10 pb-2 w-full')
                 
-                with ui.grid(columns=4).classes('w-full gap-2 items-center'):
+                vm_selection = {}
+                power_labels = {}
+                with ui.grid(columns=6).classes('w-full gap-2 items-center'):
+                    ui.label('')
                     ui.label('Name').classes('text-slate-500 font-bold text-xs')
                     ui.label('IP Address').classes('text-slate-500 font-bold text-xs')
                     ui.label('Hypervisor').classes('text-slate-500 font-bold text-xs')
+                    ui.label('Power').classes('text-slate-500 font-bold text-xs')
                     ui.label('State').classes('text-slate-500 font-bold text-xs')
                     
                     for vm in vms:
                         # Name
                         vm_name = vm.get('vm_name', 'Unknown')
+                        vm_selection[vm_name] = ui.checkbox().props('dense')
                         ui.label(vm_name).classes('text-slate-300 text-sm font-bold')
                         
                         # IP
@@ -316,12 +334,47 @@ def show_dashboard():
                         
                         # Hypervisor
                         ui.label(vm.get('hypervisor', 'Unknown')).classes('font-mono text-slate-500 text-sm')
+
+                        # libvirt state, filled by refresh_vm_states
+                        power_labels[vm_name] = ui.label('...').classes('text-slate-500 text-xs')
                         
                         # Status Icon
                         status_icon = ui.icon('circle', size='xs').classes('text-slate-500')
                         ping_checks.append((vm['ip'], status_icon))
                         ui.timer(0.1, lambda i=vm['ip'], s=status_icon: check_ping(i, s), once=True)
 
+                def show_vm_states(results):
+                    for name, r in results.items():
+                        if name in power_labels:
+                            power_labels[name].text = r['state']
+
+                async def refresh_vm_states():
+                    result = await asyncio.to_thread(run_lifecycle, 'state')
+                    show_vm_states(result['vms'])
+
+                async def vm_action(operation):
+                    names = [name for name, box in vm_selection.items() if box.value]
+                    if not names:
+                        ui.notify("Select the VMs first.", type='warning')
+                        return
+                    if operation in ('snapshot', 'revert') and not snapshot_in.value:
+                        ui.notify("Enter a snapshot name.", type='warning')
+                        return
+                    # All selected VMs of a hypervisor go through one SSH call
+                    result = await asyncio.to_thread(run_lifecycle, operation, names, snapshot_in.value)
+                    show_vm_states(result['vms'])
+                    ui.notify(result['message'], type='positive' if result['success'] else 'negative')
+
+                with ui.row().classes('w-full items-center gap-2 mt-4'):
+                    ui.button('Start', on_click=lambda: vm_action('start')).props('dense').classes('bg-emerald-700 text-xs')
+                    ui.button('Stop', on_click=lambda: vm_action('stop')).props('dense').classes('bg-slate-700 text-xs')
+                    ui.button('Power Off', on_click=lambda: vm_action('destroy')).props('dense').classes('bg-red-900 text-xs')
+                    snapshot_in = ui.input(placeholder='snapshot name').props('dense').classes('w-32 text-slate-300 text-xs')
+                    ui.button('Snapshot', on_click=lambda: vm_action('snapshot')).props('dense').classes('bg-indigo-700 text-xs')
+                    ui.button('Revert', on_click=lambda: vm_action('revert')).props('dense').classes('bg-amber-700 text-xs')
+                    ui.button(on_click=refresh_vm_states).props('icon=refresh flat dense round size=sm').classes('text-slate-500 hover:text-white')
+                ui.timer(0.1, refresh_vm_states, once=True)
+
         # -- Physical Hosts Card --
         with ui.column().classes(card_style()):
             ui.label('Physical Nodes').classes('text-slate-400 font-bold mb-4 border-b border-white/10 pb-2 w-full')
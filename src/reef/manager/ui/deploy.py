@@ -1,9 +1,12 @@
 from nicegui import ui
 import os
 import asyncio
+import shlex
 from pathlib import Path
-from reef.manager.core import ANSIBLE_DIR, HOSTS_INI_FILE, load_current_config, update_yaml_config_from_schema, generate_terraform_vm_config, run_terraform_apply, get_manager_credentials_from_inventory, get_inventory_hosts, update_ini_inventory
-from reef.manager.ui_utils import page_header, card_style, async_run_command, async_run_ansible_playbook, app_state
+from reef.manager.core import ANSIBLE_DIR, HOSTS_INI_FILE, load_current_config, update_yaml_config_from_schema, get_inventory_hosts
+from reef.manager.task_count import expected_results
+from reef.manager.tuning import playbook_args
+from reef.manager.ui_utils import page_header, card_style, async_run_command, async_run_ansible_playbook, async_run_staged_deploy, app_state, run_timing_view
 
 # Setup persistent logging
 import logging
@@ -171,6 +174,9 @@ def show_deploy(on_navigate_to_config=None):
                     agent_options = [h['ip'] for h in hosts] if hosts else []
                     agent_select = ui.select(agent_options, label="Select Computer").classes('w-full text-slate-300')
                     agent_select.bind_visibility_from(target_scope, 'value', value='Specific Computer')
+                    parallel_checkbox = ui.checkbox("Install the server and the computers in parallel", value=True).classes('text-slate-300')
+                    parallel_checkbox.tooltip("Agents enroll once the security server is up")
+                    parallel_checkbox.bind_visibility_from(target_scope, 'value', value='All Computers')
 
                 async def run_deployment():
                     # Auto-save current selection before deploying
@@ -181,132 +187,6 @@ def show_deploy(on_navigate_to_config=None):
                     credentials_container.clear()
                     results_container.clear()
 
-                    # If requested, create VMs first using Terraform
-                    created_vms = []
-                    # Check if widget exists and has value (it might not be rendered if not on specific tab/state, but assuming typical flow)
-                    if 'create_vm_checkbox' in locals() and create_vm_checkbox.value and vm_entries:
-                        ui.notify('Generating Terraform configuration for VMs...', type='info')
-                        deploy_log_push("[VM] Preparing Terraform configuration...\n")
-                        
-                        # Build VM specs from UI entries
-                        vm_specs = []
-                        for idx, entry in enumerate(vm_entries, start=1):
-                            name = entry['name'].value or f"vm-{idx}"
-                            ssh_pw = entry.get('ssh_password').value if entry.get('ssh_password') else 'ubuntu'
-                            os_choice = entry.get('type').value if entry.get('type') else 'ubuntu-22.04'
-                            
-                            vm_specs.append({
-                                'name': name,
-                                'ssh_password': ssh_pw,
-                                'os': os_choice
-                            })
-                            deploy_log_push(f"[VM#{idx}] Spec: name={name}, os={os_choice}\n")
-                        
-                        # Get Manager credentials from hosts.ini
-                        manager_ip, manager_ssh_user, manager_ssh_password, manager_ssh_key = await asyncio.to_thread(get_manager_credentials_from_inventory)
-                        
-                        if not manager_ip or (not manager_ssh_password and not manager_ssh_key):
-                            deploy_log_push("[ERROR] Manager credentials not found in hosts.ini. Please run 'UPDATE INVENTORY (HOSTS.INI)' in Configuration tab first.\n")
-                            return
-                        
-                        gen_result = await asyncio.to_thread(generate_terraform_vm_config, vm_specs, manager_ip, manager_ssh_user, manager_ssh_password, manager_ssh_key)
-                        if gen_result.get('success'):
-                            deploy_log_push(f"[VM] {gen_result.get('message')}\n")
-                            
-                            # Run Terraform apply on manager (via SSH)
-                            deploy_log_push("[TF] Starting Terraform apply on manager...\n")
-                            tf_result = await asyncio.to_thread(
-                                run_terraform_apply,
-                                gen_result.get('terraform_dir'),
-                                deploy_log_push,  # Use wrapper for file/stdout logging
-                                gen_result.get('manager_ssh_password'),  # SSH password (from gen_result or original)
-                                gen_result.get('manager_ip'),  # Manager IP
-                                gen_result.get('manager_ssh_user'),  # Manager SSH user
-                                manager_ssh_key # SSH key (passed directly)
-                            )
-                            
-                            if tf_result.get('success'):
-                                deploy_log_push(f"[TF] {tf_result.get('message')}\n")
-                            
-                            # Parse and display VM IPs
-                            tf_output = tf_result.get('output', '')
-                            import re
-                            # Strip ANSI codes first to prevent hosts.ini corruption
-                            ansi_escape = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
-                            tf_output_clean = ansi_escape.sub('', tf_output)
-                            
-                            ip_matches = re.findall(r'(\S+)_ip\s*=\s*"([^"]+)"', tf_output_clean)
-                            
-                            if ip_matches:
-                                deploy_log_push("\n[VM ACCESS DETAILS]\n")
-                                deploy_log_push(f"{'VM Name':<20} {'IP Address':<18} {'User':<12} {'Password'}\n")
-                                deploy_log_push("-" * 65 + "\n")
-                                
-                                # Prepare data for inventory update
-                                vm_passwords = {spec['name']: spec['ssh_password'] for spec in vm_specs}
-                                new_inventory_hosts = []
-
-                                proxy_cmd = ""
-                                if manager_ssh_key:
-                                     proxy_cmd = f'-o ProxyCommand="ssh -W %h:%p -i {manager_ssh_key} -o StrictHostKeyChecking=no {manager_ssh_user}@{manager_ip}"'
-                                elif manager_ssh_password:
-                                     # Explicitly use sshpass in the proxy command for the jump host
-                                     escaped_pwd = manager_ssh_password.replace('"', '\\"')
-                                     proxy_cmd = f'-o ProxyCommand="sshpass -p \'{escaped_pwd}\' ssh -W %h:%p -o StrictHostKeyChecking=no {manager_ssh_user}@{manager_ip}"'
-
-                                for vm_key, vm_ip in ip_matches:
-                                     # vm_key is like "vm-1_ip"
-                                     clean_name = vm_key.replace('_ip', '')
-                                     # Derived user logic (replicated from core.py to report correctly)
-                                     user_name = re.sub(r'[^a-z0-9-]', '', clean_name.lower()) or 'ubuntu'
-                                     pwd = vm_passwords.get(clean_name, 'ubuntu')
-                                     
-                                     deploy_log_push(f"{clean_name:<20} {vm_ip:<18} {user_name:<12} ubuntu\n")
-                                     
-                                     new_inventory_hosts.append({
-                                        'ip': vm_ip,
-                                        'user': user_name,
-                                        'password': pwd,
-                                        'key': manager_ssh_key, # Use manager key for now if injected
-                                        'ansible_ssh_common_args': proxy_cmd,
-                                        'type': 'vm',
-                                        'hypervisor': manager_ip,
-                                        'vm_name': clean_name
-                                     })
-
-                                deploy_log_push("-" * 65 + "\n")
-                                deploy_log_push("SSH Command (copy-paste):\n")
-                                # Show the exact command that worked for the user now
-                                example_name = ip_matches[0][0].replace('_ip', '')
-                                example_user = re.sub(r'[^a-z0-9-]', '', example_name.lower()) or 'ubuntu'
-                                example_ip = ip_matches[0][1]
-                                cmd_str = f'ssh -o ProxyCommand="ssh -W %h:%p -i {manager_ssh_key or "~/.ssh/id_rsa"} {manager_ssh_user}@{manager_ip}" {example_user}@{example_ip}'
-                                deploy_log_push(f"{cmd_str}\n\n")
-
-                                # Update inventory automatically
-                                if new_inventory_hosts:
-                                    ui.notify('Updating inventory with new VM IPs...', type='info')
-                                    deploy_log_push("[INVENTORY] Updating hosts.ini with new VM details...\n")
-                                    
-                                    await asyncio.to_thread(
-                                        update_ini_inventory,
-                                        manager_ip,
-                                        manager_ssh_user,
-                                        manager_ssh_password,
-                                        manager_ssh_key,
-                                        new_inventory_hosts
-                                    )
-                                    deploy_log_push("[INVENTORY] Updated.\n")
-
-                                created_vms = gen_result.get('vms', [])
-                                ui.notify('VMs created successfully!', type='positive')
-                            else:
-                                deploy_log_push(f"[TF] ERROR: {tf_result.get('message')}\n")
-                                ui.notify(f"VM creation failed: {tf_result.get('message')}", type='negative')
-                        else:
-                            deploy_log_push(f"[VM] ERROR: {gen_result.get('message')}\n")
-                            ui.notify(f"Failed to generate Terraform config: {gen_result.get('message')}", type='negative')
-
                     playbook = ANSIBLE_DIR / "playbooks" / "experimental.yml"
                     inventory = HOSTS_INI_FILE
                     
@@ -324,8 +204,21 @@ def show_deploy(on_navigate_to_config=None):
                             return
 
                     cmd = f"ansible-playbook {playbook} -i {inventory} {limit_arg}"
+
+                    enabled_roles = load_current_config().get('enabled_roles', [])
+                    total_results = await asyncio.to_thread(expected_results, playbook, inventory, enabled_roles, limit_arg.removeprefix("-l ") or None)
+                    deploy_progress.set_value(0)
+                    deploy_progress.set_visibility(bool(total_results))
+                    deploy_eta.set_text("")
                     
-                    ret_code, full_output, task_results = await async_run_ansible_playbook(cmd, deploy_log)
+                    if scope == 'All Computers' and parallel_checkbox.value:
+                        ret_code, full_output, task_results = await async_run_staged_deploy(
+                            enabled_roles, deploy_log, progress_bar=deploy_progress)
+                    else:
+                        ret_code, full_output, task_results = await async_run_ansible_playbook(
+                            cmd, deploy_log, total_results=total_results, progress_bar=deploy_progress, eta_label=deploy_eta)
+                    if ret_code == 0:
+                        deploy_progress.set_value(1)
                     
                     # Render Results Table
                     if task_results:
@@ -347,6 +240,11 @@ def show_deploy(on_navigate_to_config=None):
                                 </q-td>
                             ''')
 
+                    if app_state.last_run:
+                        with results_container:
+                            ui.label("Where the Time Went").classes('text-lg font-bold text-slate-200 mt-4 mb-2')
+                            run_timing_view(app_state.last_run)
+
                     if ret_code == 0:
                          check_credentials(full_output)
 
@@ -360,6 +258,9 @@ def show_deploy(on_navigate_to_config=None):
                         btn_stop_deploy.bind_enabled_from(app_state, 'running_process', backward=lambda x: x is not None)
 
                     credentials_container = ui.column().classes('w-full mt-4 hidden')
+                    deploy_progress = ui.linear_progress(value=0, show_value=False).classes('w-full mt-4')
+                    deploy_progress.set_visibility(False)
+                    deploy_eta = ui.label('').classes('text-xs text-slate-400')
                     global deploy_log
                     deploy_log = ui.log().classes('w-full h-64 bg-slate-900 font-mono text-xs p-4 rounded-xl border border-white/10 mt-4')
 
@@ -421,6 +322,7 @@ def show_deploy(on_navigate_to_config=None):
                     inventory = HOSTS_INI_FILE
                     
                     cmd = f"ansible-playbook {playbook} -i {inventory} -e '{{\"enabled_roles\": [\"cleanup\"]}}'"
+                    cmd = f"{cmd} {shlex.join(await asyncio.to_thread(playbook_args))}"
                     await async_run_command(cmd, cleanup_log)
 
                 with ui.row().classes('w-full gap-4'):
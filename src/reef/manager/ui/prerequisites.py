@@ -1,5 +1,4 @@
 from nicegui import ui
-import os
 from datetime import datetime
 from reef.manager.core import ANSIBLE_DIR, HOSTS_INI_FILE, BASE_DIR
 from reef.manager.ui_utils import page_header, card_style, async_run_command, async_run_ansible_playbook
@@ -33,9 +32,6 @@ def show_prerequisites():
         playbook = ANSIBLE_DIR / "playbooks" / "prerequisites.yml"
         verbosity_flag = "-vv" if verbose.value else ""
         
-        env = os.environ.copy()
-        env["ANSIBLE_CONFIG"] = str(ANSIBLE_DIR / "ansible.cfg")
-        
         # Log to file setup
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         log_file = BASE_DIR / "logs" / f"prerequisites_{timestamp}.log"
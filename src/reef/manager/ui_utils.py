@@ -3,13 +3,24 @@ import asyncio
 import subprocess
 import os
 import signal
-from reef.manager.core import BASE_DIR, ANSIBLE_DIR
+from reef.manager.core import BASE_DIR, HOSTS_INI_FILE, ansible_env
 
 class AppState:
     running_process: str = None
     current_process: asyncio.subprocess.Process = None
+    current_job = None  # reef.manager.engine.ProvisioningJob being run
+    current_pipeline = None  # reef.manager.pipeline.AgentPipeline deploying alongside it, or a scheduler.StagedDeploy
+    last_run = None  # run history entry of the last playbook (see reef.manager.run_history)
 
     def cancel_process(self):
+        if self.current_pipeline:
+            self.current_pipeline.cancel()
+            self.running_process = "Stopping..."
+        if self.current_job:
+            # Let the job stop terraform cleanly instead of killing its process group
+            self.current_job.cancel("Provisioning stopped by user")
+            self.running_process = "Stopping..."
+            return
         if self.current_process:
             try:
                 # Send SIGTERM to the process group to kill shell and children
@@ -46,12 +57,6 @@ def page_header(title: str, subtitle: str = None):
 def card_style():
     return 'p-6 rounded-2xl bg-slate-800 border border-white/5 shadow-lg'
 
-def _get_ansible_env():
-    env = os.environ.copy()
-    env['ANSIBLE_CONFIG'] = str(BASE_DIR / "ansible.cfg")
-    env['ANSIBLE_ROLES_PATH'] = str(ANSIBLE_DIR / "roles")
-    return env
-
 async def async_run_command(command: str, log_element: ui.log, on_complete=None):
     """
     Asynchronously run a shell command and stream output to a UI log element.
@@ -69,7 +74,7 @@ async def async_run_command(command: str, log_element: ui.log, on_complete=None)
             stderr=asyncio.subprocess.STDOUT,
             executable='/bin/bash',
             cwd=str(BASE_DIR),
-            env=_get_ansible_env(),
+            env=ansible_env(),
             preexec_fn=os.setsid # Allow killing whole process group
         )
         app_state.current_process = process
@@ -103,13 +108,21 @@ async def async_run_command(command: str, log_element: ui.log, on_complete=None)
         app_state.running_process = None
         app_state.current_process = None
 
-async def async_run_ansible_playbook(command: str, log_element: ui.log):
+async def async_run_ansible_playbook(command: str, log_element: ui.log, total_results: int = None,
+                                     progress_bar: ui.linear_progress = None, eta_label: ui.label = None):
     """
-    Runs an ansible playbook, streams output to log, and returns parsed task results.
+    Runs an ansible playbook, streams output to log, and returns task results from the
+    reef_events callback (see reef.manager.ansible_events).
+    With total_results (see reef.manager.task_count), progress_bar and eta_label follow
+    the host results, the ETA coming from past runs.
     Returns: (returncode, full_output_string, task_results_list)
     """
-    import re
-    import signal
+    from reef.manager.ansible_events import PlaybookProgress, events_env, stream_events
+    from reef.manager.run_history import record_run, seconds_per_result
+    from reef.manager.task_count import eta_seconds, format_eta
+    from reef.manager.tuning import playbook_args
+    import shlex
+    command = f"{command} {shlex.join(await asyncio.to_thread(playbook_args))}"
     app_state.running_process = "Running Playbook..."
     try:
         log_element.clear()
@@ -118,7 +131,9 @@ async def async_run_ansible_playbook(command: str, log_element: ui.log):
         pass
     
     captured_lines = []
-    task_results = []
+    progress = PlaybookProgress()
+    process = None
+    read_fd, write_fd = os.pipe()
     
     try:
         process = await asyncio.create_subprocess_shell(
@@ -127,18 +142,39 @@ async def async_run_ansible_playbook(command: str, log_element: ui.log):
             stderr=asyncio.subprocess.STDOUT,
             executable='/bin/bash',
             cwd=str(BASE_DIR),
-            env=_get_ansible_env(),
+            env=events_env(ansible_env(), write_fd),
+            pass_fds=(write_fd,),
             preexec_fn=os.setsid # Allow killing whole process group
         )
         app_state.current_process = process
+        # Only ansible holds the write end now: the event stream ends with it
+        os.close(write_fd)
+        write_fd = None
+        pace = None
+
+        def on_event(event):
+            nonlocal pace
+            progress.feed(event)
+            if event['event'] == 'playbook_start':
+                pace = seconds_per_result(progress.playbook)
+            elif event['event'] == 'result' and total_results:
+                total = max(total_results, progress.results_done + 1)
+                try:
+                    if progress_bar:
+                        progress_bar.set_value(round(progress.results_done / total, 3))
+                    if eta_label:
+                        eta_label.set_text(f"{progress.current_task or ''}  {format_eta(eta_seconds(progress.results_done, total, pace))}")
+                except:
+                    pass
 
-        current_task = "Starting"
+        events = asyncio.create_task(stream_events(read_fd, on_event))
+        read_fd = None
 
         while True:
             line = await process.stdout.readline()
             if not line:
                 break
-            text = line.decode().strip()
+            text = line.decode(errors='replace').rstrip()
             
             try:
                 log_element.push(text)
@@ -147,28 +183,9 @@ async def async_run_ansible_playbook(command: str, log_element: ui.log):
                 
             captured_lines.append(text)
 
-            # Parsing Logic
-            if text.startswith("TASK ["):
-                m_task = re.search(r"TASK \[(.*?)\]", text)
-                if m_task:
-                    current_task = m_task.group(1)
-            
-            elif text.startswith("ok: [") or text.startswith("changed: [") or text.startswith("failed: [") or text.startswith("fatal: ["):
-                    parts = text.split("]")
-                    if len(parts) >= 1:
-                        meta = parts[0] # ok: [host
-                        if ": [" in meta:
-                            status_part, host_part = meta.split(": [")
-                            host = host_part.strip()
-                            status = status_part.strip()
-                            
-                            task_results.append({
-                                'host': host,
-                                'task': current_task,
-                                'status': status
-                            })
-
         await process.wait()
+        await events
+        app_state.last_run = await asyncio.to_thread(record_run, progress, process.returncode, command)
         
         try:
             if process.returncode == 0:
@@ -183,6 +200,9 @@ async def async_run_ansible_playbook(command: str, log_element: ui.log):
     finally:
         app_state.running_process = None
         app_state.current_process = None
+        for fd in (read_fd, write_fd):
+            if fd is not None:
+                os.close(fd)
         
         # Ensure we kill the process group in case child processes (like ansible-playbook workers) persist
         if process and process.returncode is None:
@@ -191,7 +211,79 @@ async def async_run_ansible_playbook(command: str, log_element: ui.log):
              except:
                  pass
 
-    return process.returncode, "\n".join(captured_lines), task_results
+    return process.returncode, "\n".join(captured_lines), progress.results
+
+async def async_run_staged_deploy(enabled_roles, log_element: ui.log, progress_bar: ui.linear_progress = None):
+    """
+    Full-stack deploy through the stage scheduler (reef.manager.scheduler): server and
+    agent stages run as parallel playbooks, their output interleaved in the log.
+    Returns: (returncode, full_output_string, task_results_list), like async_run_ansible_playbook
+    """
+    from reef.manager.scheduler import DEPLOY_PLAYBOOK, StagedDeploy
+    from reef.manager.task_count import expected_results
+    captured_lines = []
+
+    def log(line):
+        captured_lines.append(line.rstrip())
+        try:
+            log_element.push(line.rstrip())
+        except:
+            pass
+
+    staged = StagedDeploy(enabled_roles, log_callback=log)
+    totals = {stage['name']: await asyncio.to_thread(expected_results, DEPLOY_PLAYBOOK, HOSTS_INI_FILE, enabled_roles,
+                                                     stage['hosts'], stage['roles'])
+              for stage in staged.stages}
+
+    def on_event(name, event):
+        if event['event'] == 'result' and progress_bar and all(totals.values()):
+            done = sum(p.results_done for p in staged.progress.values())
+            progress_bar.set_value(round(min(done / sum(totals.values()), 0.99), 3))
+
+    staged.on_event = on_event
+    app_state.last_run = None  # each stage has its own entry in the run history
+    app_state.running_process = "Running Playbook..."
+    app_state.current_pipeline = staged
+    try:
+        log(f"Stages: {', '.join(s['name'] + ' (' + s['hosts'] + ')' for s in staged.stages)}")
+        result = await staged.run()
+        log(result['message'])
+        try:
+            if result['success']:
+                ui.notify('Playbook completed successfully', type='positive')
+            elif staged.cancelled:
+                ui.notify('Playbook stopped by user', type='warning')
+            else:
+                ui.notify(result['message'], type='negative')
+        except:
+            pass
+    finally:
+        app_state.running_process = None
+        app_state.current_pipeline = None
+
+    task_results = [row for p in staged.progress.values() for row in p.results]
+    return (0 if result['success'] else 1), "\n".join(captured_lines), task_results
+
+def run_timing_view(run):
+    """Slowest tasks and hosts of a run history entry, and what got slower since the previous run."""
+    from reef.manager.run_history import compare_runs, previous_run, slowest_hosts, slowest_tasks
+    slower = compare_runs(run, previous_run(run))
+    for row in slower[:5]:
+        with ui.row().classes('items-center gap-2'):
+            ui.icon('trending_up', size='xs').classes('text-red-400')
+            ui.label(f"{row['kind'].title()} {row['name']}: {row['seconds']}s, {row['ratio']}x the previous run ({row['previous']}s)").classes('text-red-400 text-sm')
+
+    with ui.row().classes('w-full gap-4 no-wrap'):
+        ui.table(columns=[
+            {'name': 'task', 'label': 'Slowest Tasks', 'field': 'task', 'align': 'left'},
+            {'name': 'role', 'label': 'Role', 'field': 'role', 'align': 'left'},
+            {'name': 'seconds', 'label': 'Seconds', 'field': 'seconds', 'align': 'right'},
+        ], rows=slowest_tasks(run), row_key='task').props('dense flat').classes('w-1/2')
+        ui.table(columns=[
+            {'name': 'host', 'label': 'Slowest Computers', 'field': 'host', 'align': 'left'},
+            {'name': 'slowest_task', 'label': 'Slowest Task', 'field': 'slowest_task', 'align': 'left'},
+            {'name': 'seconds', 'label': 'Seconds', 'field': 'seconds', 'align': 'right'},
+        ], rows=slowest_hosts(run), row_key='host').props('dense flat').classes('w-1/2')
 
 def status_badge(active: bool, text_active="Active", text_inactive="Inactive"):
     color = "green-400" if active else "amber-400"
@@ -0,0 +1,131 @@
+import re
+import shlex
+from concurrent.futures import ThreadPoolExecutor
+from reef.manager.ssh import SSHSession
+from reef.manager.capacity import VIRSH
+from reef.manager.core import get_hypervisors
+from reef.manager.vm_state import load_vm_state
+
+RESULT_MARKER = "REEF_VM "
+
+# virsh command of each operation ({domain}, {snapshot} filled in). 'destroy' is a hard
+# power-off: disks stay, removing a VM for good goes through the desired state (reef vm remove)
+OPERATIONS = {
+    'start': "start {domain}",
+    'stop': "shutdown {domain}",
+    'destroy': "destroy {domain}",
+    'snapshot': "snapshot-create-as {domain} {snapshot} --atomic",
+    'revert': "snapshot-revert {domain} {snapshot} --running",
+    'state': None,  # only report the state
+}
+
+SNAPSHOT_RE = re.compile(r'^[A-Za-z0-9][A-Za-z0-9._-]{0,63}$')
+
+
+def lifecycle_script(operation, domains, snapshot=None):
+    """
+    Bash script applying `operation` to every domain on one hypervisor, run in a single
+    SSH call: virsh talks to the local libvirtd, so a batch costs one handshake whatever
+    its size. Prints one "REEF_VM <domain> <ok|failed> <state> <message>" line per domain.
+    """
+    lines = []
+    for domain in domains:
+        quoted = shlex.quote(domain)
+        command = OPERATIONS[operation]
+        if command:
+            command = command.format(domain=quoted, snapshot=shlex.quote(snapshot or ""))
+            lines.append(f"msg=$({VIRSH} {command} 2>&1 | tr '\\n' ' '); rc=$?")
+        else:
+            lines.append("msg=''; rc=0")
+        lines.append(f"state=$({VIRSH} domstate {quoted} 2>/dev/null | head -n1 | tr ' ' '-')")
+        lines.append(f'[ $rc -eq 0 ] && res=ok || res=failed; echo "{RESULT_MARKER}{domain} $res ${{state:-missing}} $msg"')
+    return "set -o pipefail\n" + "\n".join(lines) + "\n"
+
+
+def parse_lifecycle_output(output):
+    """{domain: {'success', 'state', 'message'}} from the output of lifecycle_script()."""
+    results = {}
+    for line in (output or "").splitlines():
+        if not line.startswith(RESULT_MARKER):
+            continue
+        parts = line[len(RESULT_MARKER):].split(" ", 3)
+        if len(parts) < 3:
+            continue
+        domain, status, state = parts[:3]
+        results[domain] = {'success': status == 'ok', 'state': state.replace('-', ' '),
+                           'message': parts[3].strip() if len(parts) > 3 else ""}
+    return results
+
+
+def _vms_by_hypervisor(names=None):
+    """([(hypervisor, {libvirt domain: vm name})], error) for the desired VMs (all of them when names is None)."""
+    hypervisors = get_hypervisors()
+    if not hypervisors:
+        return None, "Manager credentials not found in hosts.ini. Configure the inventory first."
+    by_ip = {h['ip']: h for h in hypervisors}
+    vms = load_vm_state()
+    known = {vm['name'] for vm in vms}
+    unknown = [n for n in (names or []) if n not in known]
+    if unknown:
+        return None, f"Unknown VM(s): {', '.join(unknown)}"
+    groups = {}
+    for vm in vms:
+        if names is not None and vm['name'] not in names:
+            continue
+        host = by_ip.get(vm.get('hypervisor') or hypervisors[0]['ip'])
+        if host is None:
+            return None, f"VM '{vm['name']}' is placed on hypervisor {vm['hypervisor']}, which is not in hosts.ini"
+        # Claimed warm-pool VMs run under their pool domain name
+        groups.setdefault(host['ip'], (host, {}))[1][vm.get('domain') or vm['name']] = vm['name']
+    return list(groups.values()), None
+
+
+def run_lifecycle(operation, names=None, snapshot=None, log_callback=None):
+    """
+    Apply a lifecycle operation (see OPERATIONS) to VMs of the desired state, one SSH
+    call per hypervisor, hypervisors in parallel.
+
+    names: VM names (default: all desired VMs)
+    snapshot: snapshot name, for 'snapshot' and 'revert'
+
+    Returns: {'success': True/False, 'message': str, 'vms': {name: {'success', 'state', 'message'}}}
+    """
+    if operation not in OPERATIONS:
+        return {'success': False, 'message': f"Unknown operation '{operation}' (choose from {', '.join(OPERATIONS)})", 'vms': {}}
+    if operation in ('snapshot', 'revert') and not SNAPSHOT_RE.match(snapshot or ""):
+        return {'success': False, 'message': f"Invalid snapshot name '{snapshot or ''}' (letters, digits, '.', '_' and '-')", 'vms': {}}
+    groups, error = _vms_by_hypervisor(names)
+    if error:
+        return {'success': False, 'message': error, 'vms': {}}
+    if not groups:
+        return {'success': True, 'message': "No VMs", 'vms': {}}
+
+    def run(group):
+        hypervisor, domains = group
+        with SSHSession(hypervisor['ip'], hypervisor['user'], password=hypervisor['password'], key=hypervisor['key']) as session:
+            result = session.run("bash -s", input=lifecycle_script(operation, list(domains), snapshot), timeout=300)
+        parsed = parse_lifecycle_output(result.stdout)
+        by_name = {}
+        for domain, name in domains.items():
+            by_name[name] = parsed.get(domain) or {'success': False, 'state': 'unknown',
+                                                   'message': (result.stderr or "no answer from the hypervisor").strip()}
+            if log_callback:
+                outcome = "ok" if by_name[name]['success'] else f"failed: {by_name[name]['message']}"
+                log_callback(f"[VM] {operation} {name} on {hypervisor['ip']}: {outcome} ({by_name[name]['state']})\n")
+        return by_name
+
+    with ThreadPoolExecutor(max_workers=len(groups)) as pool:
+        vms = {}
+        for parsed in pool.map(run, groups):
+            vms.update(parsed)
+
+    failed = sorted(name for name, r in vms.items() if not r['success'])
+    if failed:
+        return {'success': False, 'message': f"{operation} failed on {len(failed)} VM(s): {', '.join(failed)}", 'vms': vms}
+    return {'success': True, 'message': f"{operation}: {len(vms)} VM(s) on {len(groups)} hypervisor(s)", 'vms': vms}
+
+
+def vm_states(names=None):
+    """Current libvirt state of the desired VMs: {name: 'running' | 'shut off' | 'missing' | ...}."""
+    result = run_lifecycle('state', names)
+    return {name: r['state'] for name, r in result['vms'].items()}
@@ -0,0 +1,86 @@
+import re
+from pathlib import Path
+from ruamel.yaml import YAML
+from reef.manager.images import BASE_IMAGES, DEFAULT_OS
+from reef.manager.passwords import PasswordHasher
+
+# Desired state of the VMs provisioned on the manager, kept next to hosts.ini
+VMS_FILE = Path(__file__).parent.parent / "ansible" / "inventory" / "vms.yml"
+
+# Used as libvirt domain, terraform resource and Linux user name
+VM_NAME_RE = re.compile(r'^[a-z][a-z0-9-]{0,31}$')
+
+
+def load_vm_state():
+    """
+    Desired VMs: [{'name', 'os', 'ssh_password_hash', 'hypervisor'}], in creation order ('hypervisor'
+    once placed). Warm-pool VMs carry 'pool' (and 'ip' once up); claimed ones their pool 'domain' and 'user'.
+    """
+    if not VMS_FILE.exists():
+        return []
+    yaml = YAML()
+    with open(VMS_FILE, 'r') as f:
+        data = yaml.load(f) or {}
+    return [dict(vm) for vm in data.get('vms', [])]
+
+
+def save_vm_state(vms):
+    yaml = YAML()
+    yaml.default_flow_style = False
+    VMS_FILE.parent.mkdir(parents=True, exist_ok=True)
+    with open(VMS_FILE, 'w') as f:
+        yaml.dump({'vms': vms}, f)
+
+
+def next_vm_names(prefix, count, existing=None):
+    """`count` free names of the form <prefix>-<n>, continuing after the highest existing index."""
+    existing = existing if existing is not None else [vm['name'] for vm in load_vm_state()]
+    pattern = re.compile(rf'^{re.escape(prefix)}-(\d+)$')
+    indexes = [int(m.group(1)) for m in (pattern.match(name) for name in existing) if m]
+    start = max(indexes, default=0) + 1
+    return [f"{prefix}-{i}" for i in range(start, start + count)]
+
+
+def add_vms(specs, hasher=None):
+    """
+    Add VMs to the desired state. specs: [{'name', 'ssh_password', 'os'}].
+    Passwords are stored hashed only (in parallel, see PasswordHasher).
+
+    Returns: {'success': True/False, 'message': str, 'vms': [added names]}
+    """
+    vms = load_vm_state()
+    # Claimed pool VMs keep their domain name, which stays taken
+    names = {vm['name'] for vm in vms} | {vm['domain'] for vm in vms if vm.get('domain')}
+    added = []
+    for spec in specs:
+        name = spec.get('name', '')
+        os_name = spec.get('os') or DEFAULT_OS
+        if not VM_NAME_RE.match(name):
+            return {'success': False, 'message': f"Invalid VM name '{name}' (lowercase letters, digits and dashes, starting with a letter)", 'vms': []}
+        if name in names:
+            return {'success': False, 'message': f"VM '{name}' already exists", 'vms': []}
+        if os_name not in BASE_IMAGES:
+            return {'success': False, 'message': f"Unsupported OS '{os_name}' (choose from {', '.join(BASE_IMAGES)})", 'vms': []}
+        names.add(name)
+        added.append({'name': name, 'os': os_name})
+
+    hashes = (hasher or PasswordHasher()).hash_many([spec.get('ssh_password') or 'ubuntu' for spec in specs])
+    for vm, hashed in zip(added, hashes):
+        vm['ssh_password_hash'] = hashed
+    save_vm_state(vms + added)
+    return {'success': True, 'message': f"Added {len(added)} VM(s) to desired state", 'vms': [vm['name'] for vm in added]}
+
+
+def remove_vms(names):
+    """
+    Remove VMs from the desired state (they are destroyed on the next apply).
+
+    Returns: {'success': True/False, 'message': str, 'vms': [removed names]}
+    """
+    vms = load_vm_state()
+    known = {vm['name'] for vm in vms}
+    unknown = [n for n in names if n not in known]
+    if unknown:
+        return {'success': False, 'message': f"Unknown VM(s): {', '.join(unknown)}", 'vms': []}
+    save_vm_state([vm for vm in vms if vm['name'] not in names])
+    return {'success': True, 'message': f"Removed {len(names)} VM(s) from desired state", 'vms': list(names)}
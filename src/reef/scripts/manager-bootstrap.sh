@@ -0,0 +1,231 @@
+#!/bin/bash
+# Prepare a REEF manager for Terraform/libvirt provisioning in a single pass.
+#
+# Usage: bash manager-bootstrap.sh <ssh_user>
+#
+# Progress lines are printed as "[BOOTSTRAP] ...". The last line of output is
+# "REEF_BOOTSTRAP_REPORT <json>", a structured summary of what was found and
+# changed, parsed by reef.manager.bootstrap.
+
+SSH_USER="${1:-$(id -un)}"
+VIRSH="sudo virsh -c qemu:///system"
+ERRORS=()
+
+log() { echo "[BOOTSTRAP] $*"; }
+json_bool() { if [ "$1" = "1" ]; then echo true; else echo false; fi; }
+json_str() { printf '"%s"' "$(printf '%s' "$1" | sed -e 's/\\/\\\\/g' -e 's/"/\\"/g' | tr -d '\n\r')"; }
+
+# --- Readiness probes ------------------------------------------------------
+# wait_for <name> <timeout_s> <command...>
+# Polls the command with exponential backoff (0.1s doubling up to 2s) until it
+# succeeds or the deadline passes, and records how long it took in the report.
+PROBES_JSON=""
+now_ms() { date +%s%3N; }
+wait_for() {
+    local name="$1" timeout_ms=$(( $2 * 1000 )) start delay=0.1 ok=0 secs
+    shift 2
+    start=$(now_ms)
+    while :; do
+        if "$@" >/dev/null 2>&1; then ok=1; break; fi
+        [ $(( $(now_ms) - start )) -ge "$timeout_ms" ] && break
+        sleep "$delay"
+        delay=$(awk -v d="$delay" 'BEGIN { d *= 2; if (d > 2) d = 2; print d }')
+    done
+    secs=$(awk -v ms=$(( $(now_ms) - start )) 'BEGIN { printf "%.1f", ms / 1000 }')
+    [ -n "$PROBES_JSON" ] && PROBES_JSON="$PROBES_JSON,"
+    PROBES_JSON="$PROBES_JSON$(json_str "$name"):{\"ok\":$(json_bool $ok),\"seconds\":$secs}"
+    if [ "$ok" = "1" ]; then log "Probe $name ready after ${secs}s"; else log "Probe $name timed out after ${secs}s"; fi
+    [ "$ok" = "1" ]
+}
+socket_ready() { test -S /run/libvirt/libvirt-sock && $VIRSH version; }
+net_defined() { $VIRSH net-info "$1"; }
+net_gone() { ! $VIRSH net-info "$1"; }
+net_active() { $VIRSH net-info "$1" 2>/dev/null | grep -q "Active:.*yes"; }
+pool_running() { $VIRSH pool-info "$1" 2>/dev/null | grep -q "State:.*running"; }
+link_gone() { ! ip link show "$1"; }
+link_free() { ! ip link show "$1" | grep -q "master"; }
+
+# --- Terraform -------------------------------------------------------------
+TF_PRESENT=0; TF_INSTALLED=0; TF_VERSION=""
+if terraform version >/dev/null 2>&1; then
+    TF_PRESENT=1
+else
+    log "Terraform not functional, reinstalling..."
+    sudo rm -f /usr/local/bin/terraform
+    ARCH=$(dpkg --print-architecture)
+    if [ "$ARCH" = "aarch64" ]; then ARCH="arm64"; fi
+    if sudo apt-get update -qq >/dev/null 2>&1 && sudo apt-get install -y unzip >/dev/null 2>&1 \
+        && wget -q "https://releases.hashicorp.com/terraform/1.5.7/terraform_1.5.7_linux_${ARCH}.zip" -O /tmp/terraform.zip \
+        && unzip -o -q /tmp/terraform.zip -d /tmp && sudo mv /tmp/terraform /usr/local/bin/; then
+        TF_INSTALLED=1
+        TF_PRESENT=1
+    else
+        ERRORS+=("terraform install failed")
+    fi
+    rm -f /tmp/terraform.zip
+fi
+TF_VERSION=$(terraform version 2>/dev/null | head -n1)
+log "Terraform: ${TF_VERSION:-missing}"
+
+# --- apt/dpkg repair -------------------------------------------------------
+log "Repairing apt/dpkg state..."
+sudo dpkg --configure -a >/dev/null 2>&1
+sudo rm -f /var/lib/apt/lists/* 2>/dev/null
+sudo apt-get update -qq >/dev/null 2>&1 || true
+DPKG_REPAIRED=1
+
+# --- libvirt packages and daemon ------------------------------------------
+LIBVIRT_INSTALLED=0
+if ! systemctl list-unit-files 2>/dev/null | grep -q libvirtd; then
+    log "libvirt daemon service not found, installing..."
+    if sudo apt-get install -y libvirt-daemon libvirt-daemon-system libvirt-clients qemu-system-x86 qemu-kvm libvirt-daemon-driver-qemu virt-manager --no-install-recommends >/dev/null 2>&1; then
+        LIBVIRT_INSTALLED=1
+    else
+        ERRORS+=("libvirt install failed")
+    fi
+fi
+sudo apt-get install -y qemu-utils dnsmasq >/dev/null 2>&1 || true
+
+LIBVIRT_WAS_ACTIVE=0
+if sudo systemctl is-active --quiet libvirtd; then
+    LIBVIRT_WAS_ACTIVE=1
+fi
+
+# Disable libvirt security driver to avoid AppArmor denials on images
+if [ -f /etc/libvirt/qemu.conf ]; then
+    sudo cp -n /etc/libvirt/qemu.conf /etc/libvirt/qemu.conf.bak 2>/dev/null || true
+    sudo sed -i 's/^\s*#\?\s*security_driver\s*=\s*.*/security_driver = "none"/g' /etc/libvirt/qemu.conf
+    if ! grep -q '^\s*security_driver\s*=\s*"none"' /etc/libvirt/qemu.conf; then
+        echo 'security_driver = "none"' | sudo tee -a /etc/libvirt/qemu.conf >/dev/null
+    fi
+fi
+
+# Group membership for socket access
+GROUPS_UPDATED=0
+if sudo usermod -a -G libvirt "$SSH_USER" 2>/dev/null && sudo usermod -a -G kvm "$SSH_USER" 2>/dev/null; then
+    GROUPS_UPDATED=1
+else
+    ERRORS+=("failed to add $SSH_USER to libvirt/kvm groups")
+fi
+
+log "Restarting libvirtd to apply configuration and group changes..."
+sudo systemctl enable libvirtd >/dev/null 2>&1
+sudo systemctl restart libvirtd
+sudo ln -sf /run/libvirt /var/run/libvirt
+LIBVIRT_ACTIVE=0
+sudo systemctl is-active --quiet libvirtd && LIBVIRT_ACTIVE=1
+SOCKET_OK=0
+wait_for libvirt_socket 30 socket_ready && SOCKET_OK=1
+
+# --- genisoimage -----------------------------------------------------------
+GENISO=0
+if which mkisofs >/dev/null 2>&1 || sudo apt-get install -y genisoimage >/dev/null 2>&1; then
+    which mkisofs >/dev/null 2>&1 && GENISO=1
+fi
+[ "$GENISO" = "1" ] || ERRORS+=("genisoimage (mkisofs) not available")
+
+# --- Storage pool ----------------------------------------------------------
+log "Setting up storage pool..."
+sudo mkdir -p /var/lib/libvirt/images
+$VIRSH pool-define-as default dir - - - - "/var/lib/libvirt/images" >/dev/null 2>&1 || true
+$VIRSH pool-start default >/dev/null 2>&1 || true
+$VIRSH pool-autostart default >/dev/null 2>&1 || true
+POOL_ACTIVE=0
+wait_for pool_default 10 pool_running default && POOL_ACTIVE=1
+
+# --- Network ---------------------------------------------------------------
+log "Recreating default network..."
+$VIRSH net-destroy default >/dev/null 2>&1 || true
+$VIRSH net-undefine default >/dev/null 2>&1 || true
+wait_for network_removed 10 net_gone default
+
+# Free ens3 if it was enslaved to a bridge
+if sudo ip link show ens3 2>/dev/null | grep -q "master"; then
+    log "ens3 is enslaved to a bridge, freeing it..."
+    sudo ip link set ens3 nomaster 2>/dev/null || true
+    wait_for ens3_released 5 link_free ens3
+fi
+
+# Delete stale virbr0
+if sudo ip link show virbr0 >/dev/null 2>&1; then
+    sudo ip link set virbr0 down 2>/dev/null || true
+    sudo ip link delete virbr0 2>/dev/null || true
+    wait_for virbr0_removed 10 link_gone virbr0
+fi
+
+cat > /tmp/libvirt-default-net.xml << 'XMLEOF'
+<network>
+  <name>default</name>
+  <forward mode='nat'/>
+  <bridge name='virbr0' stp='on' delay='0'/>
+  <ip address='192.168.122.1' netmask='255.255.255.0'>
+    <dhcp>
+      <range start='192.168.122.100' end='192.168.122.254'/>
+    </dhcp>
+  </ip>
+</network>
+XMLEOF
+$VIRSH net-define /tmp/libvirt-default-net.xml >/dev/null 2>&1
+wait_for network_defined 10 net_defined default
+
+NETWORK="default"
+FALLBACK=0
+if $VIRSH net-start default >/dev/null 2>&1; then
+    log "Default network started"
+    $VIRSH net-autostart default >/dev/null 2>&1
+else
+    log "Default network failed to start, creating isolated reef network..."
+    $VIRSH net-destroy reef >/dev/null 2>&1 || true
+    $VIRSH net-undefine reef >/dev/null 2>&1 || true
+    cat > /tmp/libvirt-reef-net.xml << 'XMLEOF'
+<network>
+    <name>reef</name>
+    <forward mode='nat'/>
+    <bridge name='virbr1' stp='on' delay='0'/>
+    <ip address='192.168.200.1' netmask='255.255.255.0'>
+        <dhcp>
+            <range start='192.168.200.100' end='192.168.200.254'/>
+        </dhcp>
+    </ip>
+</network>
+XMLEOF
+    $VIRSH net-define /tmp/libvirt-reef-net.xml >/dev/null 2>&1
+    wait_for reef_network_defined 10 net_defined reef
+    $VIRSH net-start reef >/dev/null 2>&1
+    $VIRSH net-autostart reef >/dev/null 2>&1
+    NETWORK="reef"
+    FALLBACK=1
+fi
+
+# --- Verification ----------------------------------------------------------
+FORCED=0
+if ! wait_for network_active 15 net_active "$NETWORK"; then
+    log "Network $NETWORK is inactive, forcing activation..."
+    FORCED=1
+    sudo systemctl restart libvirtd
+    wait_for libvirt_socket_restarted 30 socket_ready
+    $VIRSH net-start "$NETWORK" >/dev/null 2>&1 || true
+    wait_for network_forced_active 10 net_active "$NETWORK"
+fi
+NET_ACTIVE=0
+net_active "$NETWORK" && NET_ACTIVE=1
+[ "$NET_ACTIVE" = "1" ] || ERRORS+=("network $NETWORK inactive after forced activation")
+log "Network $NETWORK active: $(json_bool $NET_ACTIVE)"
+
+# --- Report ----------------------------------------------------------------
+ERRORS_JSON=""
+for err in "${ERRORS[@]}"; do
+    [ -n "$ERRORS_JSON" ] && ERRORS_JSON="$ERRORS_JSON,"
+    ERRORS_JSON="$ERRORS_JSON$(json_str "$err")"
+done
+
+printf 'REEF_BOOTSTRAP_REPORT {"version":1,'
+printf '"terraform":{"present":%s,"installed":%s,"version":%s},' "$(json_bool $TF_PRESENT)" "$(json_bool $TF_INSTALLED)" "$(json_str "$TF_VERSION")"
+printf '"dpkg_repaired":%s,' "$(json_bool $DPKG_REPAIRED)"
+printf '"libvirt":{"installed":%s,"was_active":%s,"active":%s,"socket":%s,"groups_updated":%s},' \
+    "$(json_bool $LIBVIRT_INSTALLED)" "$(json_bool $LIBVIRT_WAS_ACTIVE)" "$(json_bool $LIBVIRT_ACTIVE)" "$(json_bool $SOCKET_OK)" "$(json_bool $GROUPS_UPDATED)"
+printf '"genisoimage":%s,' "$(json_bool $GENISO)"
+printf '"pool":{"name":"default","active":%s},' "$(json_bool $POOL_ACTIVE)"
+printf '"network":{"name":%s,"active":%s,"fallback":%s,"forced":%s},' "$(json_str "$NETWORK")" "$(json_bool $NET_ACTIVE)" "$(json_bool $FALLBACK)" "$(json_bool $FORCED)"
+printf '"probes":{%s},' "$PROBES_JSON"
+printf '"errors":[%s]}\n' "$ERRORS_JSON"
@@ -0,0 +1,45 @@
+#!/bin/bash
+# Print the provisioning readiness fingerprint of a REEF manager as JSON.
+#
+# Usage: bash manager-fingerprint.sh <ssh_user> <bootstrap_id> [--write-stamp]
+#
+# Output: one line, {"fingerprint": {...}, "stamp": {...}|null}
+# With --write-stamp the current fingerprint is stored as the readiness stamp
+# in /var/lib/reef/readiness.json (done after a successful bootstrap).
+
+SSH_USER="${1:-$(id -un)}"
+BOOTSTRAP_ID="${2:-unknown}"
+STAMP_FILE=/var/lib/reef/readiness.json
+STAMP_VERSION=1
+VIRSH="sudo -n virsh -c qemu:///system"
+
+json_str() { printf '"%s"' "$(printf '%s' "$1" | sed -e 's/\\/\\\\/g' -e 's/"/\\"/g' | tr -d '\n\r')"; }
+pkg_version() { dpkg-query -W -f='${Version}' "$1" 2>/dev/null; }
+
+NETWORK="default"
+if $VIRSH net-info reef 2>/dev/null | grep -q "Active:.*yes"; then
+    NETWORK="reef"
+fi
+NET_ACTIVE=false
+$VIRSH net-info "$NETWORK" 2>/dev/null | grep -q "Active:.*yes" && NET_ACTIVE=true
+NET_XML_SHA=$($VIRSH net-dumpxml "$NETWORK" 2>/dev/null | sha256sum | cut -c1-64)
+POOL_STATE=$($VIRSH pool-info default 2>/dev/null | awk '/^State:/{print $2}')
+GROUPS_OK=false
+id -nG "$SSH_USER" 2>/dev/null | tr ' ' '\n' | grep -qx libvirt && GROUPS_OK=true
+
+FINGERPRINT=$(printf '{"version":%s,"bootstrap":%s,"terraform":%s,"libvirt":%s,"qemu":%s,"genisoimage":%s,"network":{"name":%s,"active":%s,"xml_sha256":%s},"pool":{"name":"default","state":%s},"user_in_libvirt_group":%s}' \
+    "$STAMP_VERSION" "$(json_str "$BOOTSTRAP_ID")" \
+    "$(json_str "$(terraform version 2>/dev/null | head -n1)")" \
+    "$(json_str "$(pkg_version libvirt-daemon-system)")" \
+    "$(json_str "$(pkg_version qemu-system-x86)")" \
+    "$(json_str "$(pkg_version genisoimage)")" \
+    "$(json_str "$NETWORK")" "$NET_ACTIVE" "$(json_str "$NET_XML_SHA")" \
+    "$(json_str "$POOL_STATE")" "$GROUPS_OK")
+
+if [ "$3" = "--write-stamp" ]; then
+    sudo mkdir -p "$(dirname "$STAMP_FILE")"
+    echo "$FINGERPRINT" | sudo tee "$STAMP_FILE" >/dev/null
+fi
+
+STAMP=$(cat "$STAMP_FILE" 2>/dev/null)
+printf '{"fingerprint":%s,"stamp":%s}\n' "$FINGERPRINT" "${STAMP:-null}"
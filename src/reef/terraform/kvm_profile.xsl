@@ -0,0 +1,23 @@
+<?xml version="1.0" ?>
+<!-- Accelerated guests: virtio disks and NICs, qcow2 disks without host page cache and with native AIO -->
+<xsl:stylesheet version="1.0" xmlns:xsl="http://www.w3.org/1999/XSL/Transform">
+  <xsl:output omit-xml-declaration="yes" indent="yes"/>
+
+  <xsl:template match="node()|@*">
+    <xsl:copy>
+      <xsl:apply-templates select="node()|@*"/>
+    </xsl:copy>
+  </xsl:template>
+
+  <xsl:template match="/domain/devices/disk[@device='disk']/driver">
+    <driver name="qemu" type="qcow2" cache="none" io="native" discard="unmap"/>
+  </xsl:template>
+
+  <xsl:template match="/domain/devices/disk[@device='disk']/target/@bus">
+    <xsl:attribute name="bus">virtio</xsl:attribute>
+  </xsl:template>
+
+  <xsl:template match="/domain/devices/interface/model/@type">
+    <xsl:attribute name="type">virtio</xsl:attribute>
+  </xsl:template>
+</xsl:stylesheet>
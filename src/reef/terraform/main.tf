@@ -0,0 +1,115 @@
+terraform {
+  required_providers {
+    libvirt = {
+      source  = "dmacvicar/libvirt"
+      version = "0.7.6"
+    }
+  }
+}
+
+variable "libvirt_uri" {
+  description = "URI of the libvirt daemon on the manager (with SSH credentials)"
+  type        = string
+  default     = "qemu:///system"
+}
+
+variable "base_images" {
+  description = "Base image volume (already in the manager's pool) for each OS, set by run_terraform_apply"
+  type        = map(string)
+  default     = {}
+}
+
+variable "network_name" {
+  description = "libvirt network the VMs are attached to ('reef' when the manager avoids 'default')"
+  type        = string
+  default     = "default"
+}
+
+variable "vms" {
+  description = "VMs to provision, keyed by name (written to terraform.tfvars.json by generate_terraform_vm_config); domain is the libvirt domain and hostname, which a claimed warm-pool VM keeps from the pool"
+  type = map(object({
+    domain         = string
+    os             = string
+    user_name      = string
+    user_passwd    = string
+    cloudinit_name = string
+    memory         = number
+    vcpu           = number
+    disk_gb        = number
+    accelerated    = bool
+    qemu_agent     = bool
+    wait_for_lease = bool
+  }))
+  default = {}
+}
+
+provider "libvirt" {
+  uri = var.libvirt_uri
+}
+
+resource "libvirt_volume" "disk" {
+  for_each = var.vms
+
+  name             = "${each.value.domain}.qcow2"
+  pool             = "default"
+  base_volume_name = var.base_images[each.value.os]
+  base_volume_pool = "default"
+  format           = "qcow2"
+  size             = each.value.disk_gb * 1073741824
+}
+
+resource "libvirt_cloudinit_disk" "init" {
+  for_each = var.vms
+
+  name = each.value.cloudinit_name
+  pool = "default"
+
+  user_data = templatefile("${path.module}/cloud_init.cfg", {
+    hostname    = each.value.domain
+    user_name   = each.value.user_name
+    user_passwd = each.value.user_passwd
+  })
+}
+
+resource "libvirt_domain" "vm" {
+  for_each = var.vms
+
+  name       = each.value.domain
+  memory     = each.value.memory
+  vcpu       = each.value.vcpu
+  machine    = "pc"
+  arch       = "x86_64"
+  # KVM where the hypervisor supports it, TCG software emulation otherwise
+  type       = each.value.accelerated ? "kvm" : "qemu"
+  qemu_agent = each.value.qemu_agent
+
+  dynamic "cpu" {
+    for_each = each.value.accelerated ? [1] : []
+    content {
+      mode = "host-passthrough"
+    }
+  }
+
+  dynamic "xml" {
+    for_each = each.value.accelerated ? [1] : []
+    content {
+      xslt = file("${path.module}/kvm_profile.xsl")
+    }
+  }
+
+  disk {
+    volume_id = libvirt_volume.disk[each.key].id
+  }
+
+  network_interface {
+    network_name   = var.network_name
+    wait_for_lease = each.value.wait_for_lease
+  }
+
+  cloudinit = libvirt_cloudinit_disk.init[each.key].id
+}
+
+# IP address of each VM (null until known; run_terraform_apply fills the gaps from DHCP leases)
+output "vm_ips" {
+  value = { for name, vm in libvirt_domain.vm : name => try(vm.network_interface[0].addresses[0], null) }
+}
@@ -0,0 +1,44 @@
+import subprocess
+
+
+class FakeSession:
+    """
+    Fake SSH session shared by the tests.
+
+    run() answers with the (returncode, stdout) of the first `responses` key found in
+    the command, else with `returncode` and `stdout`. stream() feeds `lines` to
+    on_line and exits with `stream_returncode`.
+    """
+    user = "ubuntu"
+
+    def __init__(self, stdout="", returncode=0, responses=None, lines=(), stream_returncode=0):
+        self.stdout = stdout
+        self.returncode = returncode
+        self.responses = responses or {}
+        self.lines = list(lines)
+        self.stream_returncode = stream_returncode
+        self.commands = []
+        self.inputs = []
+        self.streamed = []
+        self.copies = []
+
+    def run(self, command, timeout=None, input=None):
+        self.commands.append(command)
+        self.inputs.append(input)
+        for needle, (rc, out) in self.responses.items():
+            if needle in command:
+                return subprocess.CompletedProcess(command, rc, stdout=out, stderr="")
+        return subprocess.CompletedProcess(command, self.returncode, stdout=self.stdout, stderr="")
+
+    def stream(self, command, on_line=None):
+        self.streamed.append(command)
+        for line in self.lines:
+            on_line(line)
+        return subprocess.CompletedProcess(command, self.stream_returncode, stdout="\n".join(self.lines), stderr="")
+
+    def copy(self, sources, remote_path, recursive=False, timeout=None):
+        self.copies.append((sources, remote_path))
+        return subprocess.CompletedProcess([], 0, stdout="", stderr="")
+
+    def close(self):
+        pass
@@ -0,0 +1,64 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+from reef.manager import ansible_events
+
+
+def test_events_env_enables_the_callback_on_the_pipe():
+    env = ansible_events.events_env({'ANSIBLE_CALLBACKS_ENABLED': "timer"}, 7)
+    assert env['ANSIBLE_CALLBACKS_ENABLED'] == "timer,reef_events"
+    assert env['ANSIBLE_CALLBACK_PLUGINS'].split(os.pathsep)[0] == str(ansible_events.CALLBACK_DIR)
+    assert env['REEF_EVENTS_FD'] == "7"
+    assert (ansible_events.CALLBACK_DIR / "reef_events.py").exists()
+
+
+def test_parse_event_ignores_noise():
+    assert ansible_events.parse_event(b'{"event": "task_start", "task": "x"}\n') == {'event': 'task_start', 'task': "x"}
+    assert ansible_events.parse_event("TASK [x] ****") is None
+    assert ansible_events.parse_event('{"no": "event"}') is None
+
+
+def test_progress_folds_results_into_task_rows():
+    progress = ansible_events.PlaybookProgress()
+    for event in [
+        {'event': 'playbook_start', 'playbook': "site.yml"},
+        {'event': 'task_start', 'task': "Install docker"},
+        {'event': 'result', 'host': "10.0.0.1", 'task': "Install docker", 'status': 'changed'},
+        {'event': 'result', 'host': "10.0.0.2", 'task': "Install docker", 'status': 'unreachable'},
+        {'event': 'task_start', 'task': "Probe"},
+        {'event': 'result', 'host': "10.0.0.1", 'task': "Probe", 'status': 'failed', 'ignored': True},
+        {'event': 'result', 'host': "10.0.0.1", 'task': "Probe", 'status': 'skipped'},
+        {'event': 'stats', 'hosts': {'10.0.0.1': {'failures': 0, 'unreachable': 0},
+                                     '10.0.0.2': {'failures': 0, 'unreachable': 1}}},
+    ]:
+        progress.feed(event)
+    assert progress.tasks_started == 2 and progress.current_task == "Probe"
+    assert [r['status'] for r in progress.results] == ['changed', 'unreachable', 'ignored']
+    assert progress.failed_hosts == ["10.0.0.2"]
+
+
+def test_stream_events_reads_the_inherited_pipe():
+    # Stand-in for ansible-playbook: writes events to REEF_EVENTS_FD and noise to stdout
+    child = ("import json, os\n"
+             "out = os.fdopen(int(os.environ['REEF_EVENTS_FD']), 'w')\n"
+             "print('PLAY RECAP')\n"
+             "for name in ('a', 'b'):\n"
+             "    out.write(json.dumps({'event': 'task_start', 'task': name}) + '\\n')\n")
+
+    async def scenario():
+        read_fd, write_fd = os.pipe()
+        process = subprocess.Popen([sys.executable, "-c", child], stdout=subprocess.DEVNULL,
+                                   env=ansible_events.events_env(os.environ, write_fd), pass_fds=(write_fd,))
+        os.close(write_fd)
+        events = []
+        await ansible_events.stream_events(read_fd, events.append)
+        process.wait()
+        return events
+
+    assert [e['task'] for e in asyncio.run(scenario())] == ['a', 'b']
+    read_fd, write_fd = os.pipe()
+    os.write(write_fd, json.dumps({'event': 'stats', 'hosts': {}}).encode() + b"\n")
+    os.close(write_fd)
+    assert list(ansible_events.iter_events(read_fd)) == [{'event': 'stats', 'hosts': {}}]
@@ -0,0 +1,27 @@
+from unittest.mock import patch
+from reef.manager import applied
+
+
+def _inputs(tmp_path, vms='{"vms": {"vm-1": {}}}'):
+    (tmp_path / "main.tf").write_text('resource "libvirt_domain" "vm" {}')
+    (tmp_path / "terraform.tfvars.json").write_text(vms)
+    return applied.inputs_hash(tmp_path, "10.0.0.5", "ubuntu")
+
+
+def test_inputs_hash_covers_tfvars_and_manager(tmp_path):
+    first = _inputs(tmp_path)
+    assert _inputs(tmp_path) == first
+    assert applied.inputs_hash(tmp_path, "10.0.0.6", "ubuntu") != first
+    assert _inputs(tmp_path, '{"vms": {"vm-1": {}, "vm-2": {}}}') != first
+
+
+def test_last_applied_matches_only_the_recorded_inputs(tmp_path):
+    with patch.object(applied, 'APPLIED_CACHE_FILE', tmp_path / "applied.json"):
+        assert applied.last_applied("10.0.0.5", "abc") is None
+        applied.record_applied("10.0.0.5", "abc", {'vm-1': "192.168.122.10"})
+        assert applied.last_applied("10.0.0.5", "abc") == {'vm-1': "192.168.122.10"}
+        assert applied.last_applied("10.0.0.5", "def") is None
+        assert applied.last_applied("10.0.0.6", "abc") is None
+
+        applied.forget_applied("10.0.0.5")
+        assert applied.last_applied("10.0.0.5", "abc") is None
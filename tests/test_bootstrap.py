@@ -0,0 +1,37 @@
+from reef.manager import bootstrap
+from fakes import FakeSession
+
+SAMPLE_OUTPUT = """[BOOTSTRAP] Terraform: Terraform v1.5.7
+[BOOTSTRAP] Network default active: true
+REEF_BOOTSTRAP_REPORT {"version":1,"terraform":{"present":true,"installed":false,"version":"Terraform v1.5.7"},"dpkg_repaired":true,"libvirt":{"installed":false,"was_active":true,"active":true,"socket":true,"groups_updated":true},"genisoimage":true,"pool":{"name":"default","active":true},"network":{"name":"default","active":true,"fallback":false,"forced":false},"errors":[]}
+"""
+
+
+def test_parse_report_reads_last_marker_line():
+    report = bootstrap.parse_report(SAMPLE_OUTPUT)
+    assert report['terraform']['version'] == "Terraform v1.5.7"
+    assert report['network'] == {"name": "default", "active": True, "fallback": False, "forced": False}
+    assert bootstrap.progress_lines(SAMPLE_OUTPUT) == [
+        "[BOOTSTRAP] Terraform: Terraform v1.5.7",
+        "[BOOTSTRAP] Network default active: true",
+    ]
+
+
+def test_run_bootstrap_is_a_single_call_with_script_on_stdin():
+    session = FakeSession(SAMPLE_OUTPUT)
+    result = bootstrap.run_bootstrap(session)
+
+    assert result['success'] is True
+    assert len(session.commands) == 1
+    command, script = session.commands[0], session.inputs[0]
+    assert "ubuntu" in command
+    assert script.startswith("#!/bin/bash")
+
+
+def test_run_bootstrap_fails_without_report_or_genisoimage():
+    assert bootstrap.run_bootstrap(FakeSession("boom", returncode=1))['success'] is False
+
+    no_iso = SAMPLE_OUTPUT.replace('"genisoimage":true', '"genisoimage":false')
+    result = bootstrap.run_bootstrap(FakeSession(no_iso))
+    assert result['success'] is False
+    assert "genisoimage" in result['message']
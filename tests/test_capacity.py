@@ -0,0 +1,56 @@
+import subprocess
+from reef.manager import capacity
+
+
+def test_parse_capacity_counts_memory_given_to_running_domains():
+    # 8 GB host, 6 GB available, 4 CPUs, two running 2 GB / 1 vCPU domains, 50 GB pool, KVM
+    cap = capacity.parse_capacity("noise\nREEF_CAPACITY 8000 6000 4 4096 2 51200 1\n")
+    assert cap == {'memory_mb': 8000 - 1024 - 4096, 'vcpus': 4 * 4 - 2, 'disk_mb': 51200, 'kvm': True}
+    assert capacity.parse_capacity("bash: virsh: command not found") is None
+
+
+def test_use_kvm_follows_acceleration_mode_and_host_support():
+    kvm, tcg = {'kvm': True}, {'kvm': False}
+    assert capacity.use_kvm('auto', kvm) == (True, None)
+    assert capacity.use_kvm('auto', tcg) == (False, None)
+    assert capacity.use_kvm('tcg', kvm) == (False, None)
+    assert capacity.use_kvm('kvm', kvm) == (True, None)
+    accelerated, error = capacity.use_kvm('kvm', tcg)
+    assert not accelerated and "KVM" in error
+
+
+def test_plan_placement_spreads_by_free_memory_and_reports_overflow():
+    caps = {
+        '10.0.0.5': {'memory_mb': 5000, 'vcpus': 8, 'disk_mb': 100000},
+        '10.0.0.6': {'memory_mb': 4500, 'vcpus': 8, 'disk_mb': 100000},
+        '10.0.0.7': None,  # unreachable
+    }
+    plan = capacity.plan_placement(['vm-1', 'vm-2', 'vm-3', 'vm-4', 'vm-5'], caps)
+
+    assert plan['success'] is False
+    assert plan['placement'] == {'vm-1': '10.0.0.5', 'vm-2': '10.0.0.6', 'vm-3': '10.0.0.5', 'vm-4': '10.0.0.6'}
+    assert plan['unplaced'] == ['vm-5']
+
+
+def test_capacity_command_is_valid_bash():
+    assert subprocess.run(["bash", "-n", "-c", capacity.capacity_command()]).returncode == 0
+
+
+def test_size_vms_shrinks_the_largest_vms_until_they_fit():
+    requested = {name: {'memory': 2048, 'vcpu': 1, 'disk_gb': 16} for name in ('vm-1', 'vm-2', 'vm-3')}
+    sizing = capacity.size_vms(requested, {'memory_mb': 5000, 'vcpus': 8, 'disk_mb': 40 * 1024})
+
+    assert sizing['success'] is True
+    assert sum(size['memory'] for size in sizing['sizes'].values()) <= 5000
+    assert sum(size['disk_gb'] for size in sizing['sizes'].values()) <= 40
+    assert sizing['sizes']['vm-1'] == {'memory': 2048, 'vcpu': 1, 'disk_gb': 16}
+    assert sorted(sizing['resized']) == ['vm-2', 'vm-3']
+    assert requested['vm-2']['memory'] == 2048
+
+
+def test_size_vms_refuses_early_with_the_minimum_needed():
+    requested = {f"vm-{i}": {'memory': 2048, 'vcpu': 1, 'disk_gb': 16} for i in range(5)}
+    sizing = capacity.size_vms(requested, {'memory_mb': 1000, 'vcpus': 8, 'disk_mb': 100 * 1024})
+
+    assert sizing['success'] is False
+    assert "1280 MB" in sizing['message']
@@ -0,0 +1,28 @@
+import re
+import subprocess
+from reef.manager import cloudinit
+from fakes import FakeSession
+
+
+def test_user_data_is_rendered_from_template():
+    rendered = cloudinit.render_user_data("vm-1", "vm-1", "$6$salt$hash")
+    assert "hostname: vm-1" in rendered
+    assert "passwd: $6$salt$hash" in rendered
+    assert "${" not in rendered
+
+
+def test_iso_name_only_changes_with_user_data():
+    data = cloudinit.render_user_data("vm-1", "vm-1", "$6$salt$hash")
+    assert cloudinit.iso_name("vm-1", data) == cloudinit.iso_name("vm-1", cloudinit.render_user_data("vm-1", "vm-1", "$6$salt$hash"))
+    assert cloudinit.iso_name("vm-1", data) != cloudinit.iso_name("vm-1", cloudinit.render_user_data("vm-1", "vm-1", "$6$other$hash"))
+    assert re.match(cloudinit.iso_pattern("vm-1"), cloudinit.iso_name("vm-1", data))
+    assert not re.match(cloudinit.iso_pattern("vm-1"), cloudinit.iso_name("vm-1-2", data))
+
+
+def test_collect_orphaned_isos_keeps_referenced_names():
+    session = FakeSession("cloudinit-vm-1-87654321.iso\n")
+    removed = cloudinit.collect_orphaned_isos(session, keep=["cloudinit-vm-2-aaaaaaaaaaaa.iso"])
+
+    assert removed == ["cloudinit-vm-1-87654321.iso"]
+    assert "cloudinit-vm-2-aaaaaaaaaaaa.iso" in session.commands[0]
+    assert subprocess.run(["bash", "-n", "-c", session.commands[0]]).returncode == 0
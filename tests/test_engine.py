@@ -0,0 +1,99 @@
+import asyncio
+import sys
+import textwrap
+from unittest.mock import patch
+
+import pytest
+
+from reef.manager import core, engine
+from fakes import FakeSession
+
+FAKE_WORKER = textwrap.dedent('''
+    import json, signal, sys, time
+    def emit(event, **data):
+        print(json.dumps({"event": event, **data}), flush=True)
+    def on_term(signum, frame):
+        emit("result", result={"success": False, "message": "Provisioning cancelled"})
+        sys.exit(0)
+    signal.signal(signal.SIGTERM, on_term)
+    request = json.loads(sys.stdin.read())
+    emit("log", line="[TF] Running: terraform plan (on manager)\\n")
+    emit("ip", vm="vm-1", ip="192.168.122.10")
+    if request["action"] == "hang":
+        emit("log", line="[TF] Running: terraform apply (on manager)\\n")
+        time.sleep(30)
+    emit("result", result={"success": True, "message": "done", "params": request["params"]})
+''')
+
+
+def fake_job(action, **kwargs):
+    job = engine.ProvisioningJob(action, {'passwords': {'vm-1': 'pw'}}, **kwargs)
+    job.argv = [sys.executable, "-c", FAKE_WORKER]
+    return job
+
+
+def test_job_streams_logs_and_ips_and_returns_the_result():
+    lines, ips = [], []
+    result = asyncio.run(fake_job('apply_vm_state').run(lines.append, lambda vm, ip: ips.append((vm, ip))))
+
+    assert result == {'success': True, 'message': 'done', 'params': {'passwords': {'vm-1': 'pw'}}}
+    assert lines == ["[TF] Running: terraform plan (on manager)\n"]
+    assert ips == [("vm-1", "192.168.122.10")]
+
+
+def test_step_timeout_cancels_the_job():
+    async def scenario():
+        job = fake_job('hang', step_timeouts={'apply': 0.5})
+        steps = []
+        await job.start()
+        async for event in job.events():
+            if event['event'] == 'step':
+                steps.append(event['step'])
+        return job, steps
+
+    job, steps = asyncio.run(scenario())
+    assert steps == ['plan', 'apply']
+    assert job.result == {'success': False, 'message': "Step 'apply' timed out after 0.5s"}
+
+
+def test_step_markers():
+    assert engine.step_of("[TF] Running: terraform init -no-color\n") == 'init'
+    assert engine.step_of("[TF] Lease timeout; disabling wait_for_lease and retrying...\n") == 'apply'
+    assert engine.step_of("[10.0.0.6] [TF] Running: terraform apply (on manager)\n") == 'apply'
+    assert engine.step_of("[TF] libvirt_domain.vm[\"vm-1\"]: Creating...") is None
+
+
+def test_cancel_during_a_multi_hypervisor_apply_leaves_hosts_ini_alone(tmp_path):
+    hypervisors = [{'ip': "10.0.0.5", 'user': 'root', 'password': "pw", 'key': ""},
+                   {'ip': "10.0.0.6", 'user': 'root', 'password': "pw", 'key': ""}]
+    vms = [{'name': "vm-1", 'hypervisor': "10.0.0.5"}, {'name': "vm-2", 'hypervisor': "10.0.0.6"}]
+    synced, forgotten = [], []
+
+    def log(line):
+        # The worker's log callback once the job was cancelled
+        if engine.step_of(line):
+            raise engine.ProvisioningCancelled("Provisioning cancelled")
+
+    def apply_on_manager(session, terraform_dir, log_callback, timings, on_ip):
+        log_callback("[TF] Running: terraform apply (on manager)\n")
+        return {'success': True, 'message': "ok", 'output': ""}
+
+    with patch.object(core, 'get_hypervisors', lambda: hypervisors), \
+         patch.object(core, 'load_vm_state', lambda: vms), \
+         patch.object(core, 'pool_settings', lambda: (0, None, None)), \
+         patch.object(core, 'place_vms', lambda vms, hypervisors, log_callback: {'success': True}), \
+         patch.object(core, 'get_inventory_hosts', lambda: []), \
+         patch.object(core, 'HYPERVISOR_TF_DIR', tmp_path / "terraform"), \
+         patch.object(core, 'load_applied_cache', dict), \
+         patch.object(core, 'generate_terraform_vm_config', lambda *a, **k: {'success': True, 'terraform_dir': tmp_path}), \
+         patch.object(core, 'last_applied', lambda ip, inputs: None), \
+         patch.object(core, 'forget_applied', forgotten.append), \
+         patch.object(core, 'SSHSession', lambda *a, **k: FakeSession()), \
+         patch.object(core, '_terraform_apply_on_manager', apply_on_manager), \
+         patch.object(core, 'record_pool_ips', lambda ips: synced.append(ips)), \
+         patch.object(core, 'sync_vm_inventory', lambda ips, passwords: synced.append(ips)):
+        with pytest.raises(engine.ProvisioningCancelled):
+            core.apply_vm_state(log)
+
+    assert synced == []
+    assert sorted(forgotten) == ["10.0.0.5", "10.0.0.6"]
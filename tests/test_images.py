@@ -0,0 +1,44 @@
+import hashlib
+from unittest.mock import patch
+from reef.manager import images
+from fakes import FakeSession
+
+
+def test_existing_volume_is_reused_without_download(tmp_path):
+    with patch.object(images, 'IMAGE_INDEX_FILE', tmp_path / "index.json"):
+        session = FakeSession(responses={"find ": (0, "reef-base-ubuntu-22.04-0123456789abcdef.qcow2\n")})
+        result = images.ensure_base_image(session, 'ubuntu-22.04')
+
+    assert result['volume'] == "reef-base-ubuntu-22.04-0123456789abcdef.qcow2"
+    assert len(session.commands) == 1
+
+
+def test_manager_download_records_content_address(tmp_path):
+    sha = "ab" * 32
+    with patch.object(images, 'IMAGE_CACHE_DIR', tmp_path), patch.object(images, 'IMAGE_INDEX_FILE', tmp_path / "index.json"):
+        session = FakeSession(responses={"curl ": (0, f"REEF_IMAGE {sha} {images.volume_name('ubuntu-22.04', sha)}\n")})
+        result = images.ensure_base_image(session, 'ubuntu-22.04')
+        index = images.load_image_index()
+
+    assert result['success'] is True
+    assert result['volume'] == f"reef-base-ubuntu-22.04-{'ab' * 8}.qcow2"
+    assert index['ubuntu-22.04']['sha256'] == sha
+    assert session.copies == []
+
+
+def test_offline_manager_gets_image_from_controller_cache(tmp_path):
+    content = b"qcow2 image bytes"
+    sha = hashlib.sha256(content).hexdigest()
+    url = images.BASE_IMAGES['ubuntu-22.04']
+    with patch.object(images, 'IMAGE_CACHE_DIR', tmp_path), patch.object(images, 'IMAGE_INDEX_FILE', tmp_path / "index.json"):
+        (tmp_path / f"ubuntu-22.04-{sha}.img").write_bytes(content)
+        images._record('ubuntu-22.04', sha, url)
+        session = FakeSession(responses={
+            "curl ": (1, ""),
+            "sha256sum": (0, f"REEF_IMAGE {sha} {images.volume_name('ubuntu-22.04', sha)}\n"),
+        })
+        result = images.ensure_base_image(session, 'ubuntu-22.04')
+
+    assert result['success'] is True
+    assert result['volume'] == images.volume_name('ubuntu-22.04', sha)
+    assert len(session.copies) == 1
@@ -0,0 +1,39 @@
+import subprocess
+from reef.manager import ip_discovery
+from fakes import FakeSession
+
+
+def test_discover_ips_reports_each_lease_as_it_appears():
+    session = FakeSession(lines=["REEF_IP vm-2 192.168.122.112", "noise", "REEF_IP vm-1 192.168.122.140"])
+    seen = []
+    result = ip_discovery.discover_ips(session, ["vm-1", "vm-2"], on_ip=lambda name, ip: seen.append((name, ip)))
+
+    assert result['success'] is True
+    assert seen == [("vm-2", "192.168.122.112"), ("vm-1", "192.168.122.140")]
+    assert "net-dhcp-leases default" in session.streamed[0]
+    # Rendered like terraform's vm_ips output so terraform_ips() parses both the same way
+    assert ip_discovery.terraform_ips(ip_discovery.terraform_ip_output(result['ips'])) == result['ips']
+
+
+def test_discover_ips_lists_pending_domains_on_timeout():
+    session = FakeSession(lines=["REEF_IP vm-1 192.168.200.101", "REEF_IP_PENDING vm-2"])
+    result = ip_discovery.discover_ips(session, ["vm-1", "vm-2"], network="reef", timeout=5)
+
+    assert result['success'] is False
+    assert result['pending'] == ["vm-2"]
+    assert result['ips'] == {"vm-1": "192.168.200.101"}
+
+
+def test_watch_leases_command_is_valid_bash():
+    cmd = ip_discovery.watch_leases_command(["vm-1", "vm-2"], "default", 60)
+    assert subprocess.run(["bash", "-n", "-c", cmd]).returncode == 0
+
+
+def test_terraform_ips_reads_the_vm_ips_map_output():
+    output = (
+        "Apply complete! Resources: 6 added, 0 changed, 0 destroyed.\n\nOutputs:\n\n"
+        'vm_ips = {\n  "vm-1" = "192.168.122.10"\n  "vm-2" = tostring(null)\n}\n'
+    )
+    assert ip_discovery.terraform_ips(output) == {"vm-1": "192.168.122.10"}
+    merged = output + ip_discovery.terraform_ip_output({"vm-2": "192.168.122.11"})
+    assert ip_discovery.terraform_ips(merged) == {"vm-1": "192.168.122.10", "vm-2": "192.168.122.11"}
@@ -0,0 +1,34 @@
+from passlib.hash import sha512_crypt
+
+from reef.manager.passwords import PasswordHasher
+
+
+def test_identical_passwords_share_one_hash():
+    hasher = PasswordHasher(rounds=1000, max_workers=1)
+    first, second, other = hasher.hash_many(["secret", "secret", "other"])
+    assert first == second
+    assert first != other
+    assert hasher.hash("secret") == first
+    assert len(hasher._cache) == 2
+
+
+def test_rounds_are_applied():
+    hashed = PasswordHasher(rounds=1000, max_workers=1).hash("secret")
+    assert hashed.startswith("$6$rounds=1000$")
+    assert sha512_crypt.verify("secret", hashed)
+
+
+def test_parallel_hashes_keep_input_order():
+    passwords = ["a", "b", "c", "a"]
+    hashes = PasswordHasher(rounds=1000, max_workers=2).hash_many(passwords)
+    assert hashes[0] == hashes[3]
+    for password, hashed in zip(passwords, hashes):
+        assert sha512_crypt.verify(password, hashed)
+
+
+def test_verify_rejects_other_and_missing_hashes():
+    hasher = PasswordHasher(rounds=1000, max_workers=1)
+    hashed = hasher.hash("secret")
+    assert hasher.verify("secret", hashed)
+    assert not hasher.verify("other", hashed)
+    assert not hasher.verify("secret", None)
@@ -0,0 +1,54 @@
+import asyncio
+import sys
+from unittest.mock import patch
+from reef.manager import pipeline
+
+
+def test_commands_target_one_host():
+    assert pipeline.wait_for_ssh_command("10.0.0.7", 60)[:2] == ["ansible", "10.0.0.7"]
+    assert "timeout=60" in pipeline.wait_for_ssh_command("10.0.0.7", 60)
+    assert pipeline.agent_playbook_command("10.0.0.7")[-2:] == ["--limit", "10.0.0.7"]
+
+
+def test_each_vm_deploys_as_soon_as_it_is_up():
+    synced = []
+    # Stand-ins for ansible: SSH answers, the playbook fails on vm-2 only
+    commands = {
+        'wait': lambda host, timeout: [sys.executable, "-c", "print('pong')"],
+        'play': lambda host, playbook: [sys.executable, "-c", f"import sys; sys.exit({int(host == '10.0.0.2')})"],
+    }
+
+    async def scenario():
+        lines = []
+        pipe = pipeline.AgentPipeline({'vm-1': "pw"}, vm_names=['vm-1', 'vm-2'], log_callback=lines.append)
+        pipe.on_ip('vm-1', "10.0.0.1")
+        pipe.on_ip('vm-3', "10.0.0.3")  # not part of the batch
+        await asyncio.sleep(0)
+        pipe.on_ip('vm-2', "10.0.0.2")
+        return await pipe.finish({'vm-1': "10.0.0.1", 'vm-2': "10.0.0.2"}), lines
+
+    with patch.object(pipeline, 'sync_vm_inventory', lambda ips, passwords: synced.append(dict(ips))), \
+         patch.object(pipeline, 'wait_for_ssh_command', commands['wait']), \
+         patch.object(pipeline, 'agent_playbook_command', commands['play']):
+        result, lines = asyncio.run(scenario())
+
+    assert not result['success'] and result['message'].endswith("vm-2")
+    assert result['hosts']['vm-1']['success'] and not result['hosts']['vm-2']['success']
+    assert 'vm-3' not in result['hosts']
+    assert {'vm-1': "10.0.0.1"} in synced and synced[-1] == {'vm-1': "10.0.0.1", 'vm-2': "10.0.0.2"}
+    assert "[vm-1] pong\n" in lines
+
+
+def test_idle_pool_vms_are_not_deployed():
+    started = []
+
+    async def scenario():
+        pipe = pipeline.AgentPipeline()
+        pipe._deploy = lambda vm_name, ip: started.append(vm_name) or asyncio.sleep(0)
+        pipe.on_ip('pool-1', "10.0.0.8")
+        pipe.on_ip('vm-1', "10.0.0.1")
+        await pipe.finish()
+
+    with patch.object(pipeline, 'load_vm_state', lambda: [{'name': 'pool-1', 'pool': True}, {'name': 'vm-1'}]):
+        asyncio.run(scenario())
+    assert started == ['vm-1']
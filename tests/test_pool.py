@@ -0,0 +1,97 @@
+from unittest.mock import patch
+from reef.manager import core, pool, vm_state
+
+
+class FakeHasher:
+    def hash_many(self, passwords):
+        return [f"$6$fake${p}" for p in passwords]
+
+    def verify(self, password, password_hash):
+        return password_hash == f"$6$fake${password}"
+
+
+POOL_HASH = "$6$fake$ubuntu"
+
+
+def test_resize_pool_tops_up_each_hypervisor_and_trims_extras():
+    vms = [{'name': 'vm-1', 'os': 'ubuntu-22.04', 'hypervisor': "10.0.0.5"},
+           {'name': 'lab', 'os': 'ubuntu-22.04', 'hypervisor': "10.0.0.5", 'domain': 'pool-1'},
+           {'name': 'pool-2', 'os': 'ubuntu-22.04', 'ssh_password_hash': POOL_HASH, 'hypervisor': "10.0.0.6", 'pool': True},
+           {'name': 'pool-3', 'os': 'ubuntu-22.04', 'ssh_password_hash': POOL_HASH, 'hypervisor': "10.0.0.6", 'pool': True}]
+    added, removed = pool.resize_pool(vms, ["10.0.0.5", "10.0.0.6"], 1, hasher=FakeHasher())
+
+    # pool-1 is still the domain of a claimed VM: not handed out again
+    assert [(vm['name'], vm['hypervisor']) for vm in added] == [('pool-4', "10.0.0.5")]
+    assert [vm['name'] for vm in removed] == ['pool-3']
+    assert [vm['name'] for vm in vms if vm.get('pool')] == ['pool-2', 'pool-4']
+
+
+def test_resize_pool_rebuilds_vms_of_an_old_password_or_os():
+    vms = [{'name': 'pool-1', 'os': 'ubuntu-22.04', 'ssh_password_hash': "$6$fake$old", 'hypervisor': "10.0.0.5", 'pool': True},
+           {'name': 'pool-2', 'os': 'ubuntu-22.04', 'ssh_password_hash': "$6$fake$new", 'hypervisor': "10.0.0.5", 'pool': True},
+           {'name': 'pool-3', 'os': 'debian-11', 'ssh_password_hash': "$6$fake$new", 'hypervisor': "10.0.0.5", 'pool': True}]
+    added, removed = pool.resize_pool(vms, ["10.0.0.5"], 2, "new", "debian-11", hasher=FakeHasher())
+
+    assert [vm['name'] for vm in removed] == ['pool-1', 'pool-2']
+    assert [(vm['name'], vm['os'], vm['ssh_password_hash']) for vm in added] == [('pool-4', 'debian-11', "$6$fake$new")]
+    assert [vm['name'] for vm in vms] == ['pool-3', 'pool-4']
+
+
+def test_claim_renames_an_idle_pool_vm_and_keeps_its_domain(tmp_path):
+    synced = []
+    with patch.object(vm_state, 'VMS_FILE', tmp_path / "vms.yml"), \
+         patch.object(pool, 'pool_settings', lambda: (1, "poolpw", 'ubuntu-22.04')), \
+         patch.object(core, 'sync_vm_inventory', lambda ips, passwords: synced.append((ips, passwords))):
+        vm_state.save_vm_state([{'name': 'pool-1', 'os': 'ubuntu-22.04', 'ssh_password_hash': "$6$fake$poolpw",
+                                 'hypervisor': "10.0.0.5", 'pool': True},
+                                {'name': 'pool-2', 'os': 'ubuntu-22.04', 'ssh_password_hash': "$6$fake$poolpw",
+                                 'hypervisor': "10.0.0.5", 'pool': True}])
+        assert not pool.claim_vm('lab-1', hasher=FakeHasher())['success']  # none booted yet
+
+        pool.record_pool_ips({'pool-1': "192.168.122.30"})
+        assert "vm_pool_os" in pool.claim_vm('lab-1', 'debian-11', hasher=FakeHasher())['message']
+        result = pool.claim_vm('lab-1', hasher=FakeHasher())
+        assert result['success'] and result['vm']['ip'] == "192.168.122.30"
+        vms = {vm['name']: vm for vm in vm_state.load_vm_state()}
+
+        assert vms['lab-1'] == {'name': 'lab-1', 'os': 'ubuntu-22.04', 'ssh_password_hash': "$6$fake$poolpw",
+                                'hypervisor': "10.0.0.5", 'domain': 'pool-1', 'user': 'pool-1'}
+        assert synced == [({'lab-1': "192.168.122.30"}, {'lab-1': "poolpw"})]
+        assert not pool.claim_vm('lab-2', hasher=FakeHasher())['success']
+        assert not vm_state.add_vms([{'name': 'pool-1'}])['success']
+
+
+def test_claimed_vm_renders_like_its_pool_vm(tmp_path):
+    with patch.object(core, 'TERRAFORM_DIR', tmp_path / "tf"):
+        spec = {'name': 'pool-1', 'os': 'ubuntu-22.04', 'ssh_password_hash': "$6$fake$pw"}
+        core.generate_terraform_vm_config([spec], '10.0.0.5', 'ubuntu', 'pw')
+        before = core.load_tfvars(tmp_path / "tf")['vms']['pool-1']
+        core.generate_terraform_vm_config([dict(spec, name='lab-1', domain='pool-1', user='pool-1')], '10.0.0.5', 'ubuntu', 'pw')
+        after = core.load_tfvars(tmp_path / "tf")['vms']['lab-1']
+    assert after == before
+
+
+def test_emptying_the_pool_still_applies_its_hypervisor(tmp_path):
+    hypervisors = [{'ip': "10.0.0.5", 'user': 'root', 'password': "pw", 'key': ""},
+                   {'ip': "10.0.0.6", 'user': 'root', 'password': "pw", 'key': ""}]
+    applied = {}
+
+    def apply_on(hypervisor, vms, terraform_dir, log_callback=None, on_ip=None):
+        applied[hypervisor['ip']] = [vm['name'] for vm in vms]
+        return {'success': True, 'message': "ok", 'output': ""}
+
+    with patch.object(vm_state, 'VMS_FILE', tmp_path / "vms.yml"), \
+         patch.object(core, 'HYPERVISOR_TF_DIR', tmp_path / "terraform"), \
+         patch.object(core, 'load_applied_cache', dict), \
+         patch.object(core, 'get_hypervisors', lambda: hypervisors), \
+         patch.object(core, 'get_inventory_hosts', lambda: []), \
+         patch.object(core, 'pool_settings', lambda: (0, "poolpw", 'ubuntu-22.04')), \
+         patch.object(core, '_apply_on_hypervisor', apply_on), \
+         patch.object(core, 'record_pool_ips', lambda ips: None), \
+         patch.object(core, 'sync_vm_inventory', lambda ips, passwords: True):
+        vm_state.save_vm_state([{'name': 'pool-1', 'os': 'ubuntu-22.04', 'hypervisor': "10.0.0.6", 'pool': True}])
+        assert core.apply_vm_state()['success']
+        assert vm_state.load_vm_state() == []
+
+    # The secondary hypervisor only ran the pool VM: applied with nothing left on it
+    assert applied == {"10.0.0.5": [], "10.0.0.6": []}
@@ -0,0 +1,31 @@
+import subprocess
+from reef.manager import probes
+
+
+def test_wait_for_returns_as_soon_as_condition_holds():
+    calls = []
+
+    def check():
+        calls.append(1)
+        return "ready" if len(calls) == 3 else None
+
+    timings = {}
+    assert probes.wait_for(check, timeout=5, initial=0.01, name="net", timings=timings) == "ready"
+    assert len(calls) == 3
+    assert timings["net"]["ok"] is True
+    assert timings["net"]["seconds"] < 1
+
+
+def test_wait_for_gives_up_at_deadline():
+    timings = {}
+    assert probes.wait_for(lambda: False, timeout=0.2, initial=0.05, name="pool", timings=timings) is False
+    assert timings["pool"]["ok"] is False
+
+
+def test_remote_wait_command_polls_until_condition_or_timeout(tmp_path):
+    flag = tmp_path / "flag"
+    cmd = probes.remote_wait_command(f"test -f {flag}", timeout=1)
+    assert subprocess.run(["bash", "-c", cmd]).returncode == 124
+
+    flag.touch()
+    assert subprocess.run(["bash", "-c", cmd]).returncode == 0
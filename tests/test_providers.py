@@ -0,0 +1,31 @@
+from unittest.mock import patch
+from reef.manager import providers
+from fakes import FakeSession
+
+
+def test_mirrored_provider_needs_no_download():
+    session = FakeSession(responses={"uname -m": (0, "linux_amd64\npresent\n")})
+    timings = {}
+    result = providers.ensure_provider_mirror(session, timings=timings)
+
+    assert result['success'] is True
+    assert not any("providers mirror" in c for c in session.commands)
+    assert any("filesystem_mirror" in c for c in session.commands)
+    assert timings == {}
+
+
+def test_offline_manager_gets_provider_pushed_from_controller(tmp_path):
+    cached = tmp_path / providers.PROVIDER_SOURCE / providers.provider_zip_name("linux_arm64")
+    cached.parent.mkdir(parents=True)
+    cached.write_bytes(b"zip")
+    with patch.object(providers, 'PROVIDER_CACHE_DIR', tmp_path):
+        session = FakeSession(responses={
+            "uname -m": (0, "linux_arm64\nmissing\n"),
+            "providers mirror": (1, ""),
+        })
+        timings = {}
+        result = providers.ensure_provider_mirror(session, timings=timings)
+
+    assert result['success'] is True
+    assert session.copies == [(cached, f"{providers.REMOTE_MIRROR_DIR}/{providers.PROVIDER_SOURCE}/")]
+    assert timings['provider_download']['ok'] is True
@@ -0,0 +1,46 @@
+from unittest.mock import patch
+from reef.manager import readiness
+
+
+def _fingerprint():
+    return {
+        'version': 1,
+        'bootstrap': readiness.bootstrap_id(),
+        'terraform': 'Terraform v1.5.7',
+        'libvirt': '8.0.0-1ubuntu7',
+        'qemu': '1:6.2+dfsg-2ubuntu6',
+        'genisoimage': '9:1.1.11-3.2ubuntu1',
+        'network': {'name': 'default', 'active': True, 'xml_sha256': 'ab' * 32},
+        'pool': {'name': 'default', 'state': 'running'},
+        'user_in_libvirt_group': True,
+    }
+
+
+def test_ready_only_when_live_stamp_and_cache_agree(tmp_path):
+    with patch.object(readiness, 'READINESS_CACHE_FILE', tmp_path / "cache.json"):
+        fp = _fingerprint()
+        probe = {'fingerprint': fp, 'stamp': dict(fp)}
+
+        # Stamp on the manager but nothing cached locally yet
+        assert readiness.is_ready("10.0.0.5", probe) is False
+
+        readiness.save_readiness("10.0.0.5", fp)
+        assert readiness.is_ready("10.0.0.5", probe) is True
+        # Cache is keyed by manager IP
+        assert readiness.is_ready("10.0.0.6", probe) is False
+
+
+def test_drift_or_stale_bootstrap_invalidates_stamp(tmp_path):
+    with patch.object(readiness, 'READINESS_CACHE_FILE', tmp_path / "cache.json"):
+        stamp = _fingerprint()
+        readiness.save_readiness("10.0.0.5", stamp)
+
+        drifted = _fingerprint()
+        drifted['network'] = dict(drifted['network'], xml_sha256='cd' * 32)
+        assert readiness.is_ready("10.0.0.5", {'fingerprint': drifted, 'stamp': stamp}) is False
+
+        old_script = dict(stamp, bootstrap='0' * 16)
+        assert readiness.is_ready("10.0.0.5", {'fingerprint': old_script, 'stamp': old_script}) is False
+
+        readiness.forget_readiness("10.0.0.5")
+        assert readiness.load_readiness_cache() == {}
@@ -0,0 +1,51 @@
+from unittest.mock import patch
+from reef.manager import run_history
+from reef.manager.ansible_events import PlaybookProgress
+
+
+def _progress(durations, t0=1000.0):
+    """PlaybookProgress of a linear run: {(role, task): {host: seconds}}, tasks one after the other."""
+    progress = PlaybookProgress()
+    progress.feed({'event': 'playbook_start', 'playbook': "experimental.yml", 'time': t0})
+    clock = t0
+    for (role, task), hosts in durations.items():
+        progress.feed({'event': 'task_start', 'task': task, 'role': role, 'time': clock})
+        for host, seconds in hosts.items():
+            progress.feed({'event': 'result', 'host': host, 'task': task, 'role': role, 'status': 'ok',
+                           'time': clock + seconds, 'duration': seconds})
+        clock += max(hosts.values())
+    return progress
+
+
+def test_slowest_tasks_and_hosts():
+    run = {'timings': _progress({
+        ('common', "Repair dpkg"): {'a': 30, 'b': 90},
+        ('suricata', "Download rules"): {'a': 40, 'b': 20},
+        (None, "Gather facts"): {'a': 2, 'b': 3},
+    }).timings}
+    assert [(r['task'], r['seconds'], r['hosts']) for r in run_history.slowest_tasks(run, 2)] == \
+        [("Repair dpkg", 90, 2), ("Download rules", 40, 2)]
+    assert run_history.slowest_hosts(run)[0] == {'host': 'b', 'seconds': 113, 'tasks': 3, 'slowest_task': "Repair dpkg"}
+    assert run_history.role_seconds(run) == {'common': 90, 'suricata': 40, None: 3}
+
+
+def test_history_flags_what_got_slower(tmp_path):
+    with patch.object(run_history, 'RUN_HISTORY_FILE', tmp_path / "runs.json"), \
+         patch.object(run_history, 'MAX_RUNS', 2), \
+         patch.object(run_history.time, 'time', side_effect=[1.0, 2.0, 3.0]):
+        assert run_history.record_run(PlaybookProgress(), 0) is None  # nothing timed
+        first = run_history.record_run(_progress({('suricata', "Download rules"): {'a': 20},
+                                                  ('common', "Repair dpkg"): {'a': 5}}), 0)
+        run_history.record_run(_progress({('suricata', "Download rules"): {'a': 25},
+                                          ('common', "Repair dpkg"): {'a': 3}}), 0)
+        last = run_history.record_run(_progress({('suricata', "Download rules"): {'a': 70},
+                                                 ('common', "Repair dpkg"): {'a': 9}}), 2)
+        runs = run_history.load_runs()
+
+    assert [r['id'] for r in runs] == [2000, 3000] and first['id'] not in [r['id'] for r in runs]
+    assert runs[-1]['returncode'] == 2 and runs[-1]['playbook'] == "experimental.yml"
+    slower = run_history.compare_runs(last, run_history.previous_run(last, runs))
+    # Repair dpkg tripled but stays under REGRESSION_MIN_SECONDS
+    assert [(r['kind'], r['name'], r['ratio']) for r in slower] == \
+        [('role', "suricata", 2.8), ('task', "suricata: Download rules", 2.8)]
+    assert run_history.compare_runs(last, None) == []
@@ -0,0 +1,114 @@
+import asyncio
+import json
+import sys
+import time
+from unittest.mock import patch
+from reef.manager import scheduler
+
+ALL_ROLES = ['cleanup', 'common', 'wazuh-indexer', 'wazuh-server', 'wazuh-dashboard', 'wazuh-agent', 'suricata', 'ufw']
+
+
+ENROLLMENT = 'agents:wazuh-agent'
+
+
+def test_stages_are_split_where_a_role_waits_for_another_host_group(tmp_path):
+    playbook = tmp_path / "site.yml"
+    playbook.write_text("""
+- hosts: agents
+  tasks:
+    - include_role:
+        name: "{{ role_item }}"
+        tasks_from: clean.yml
+      loop: [agent]
+      loop_control:
+        loop_var: role_item
+    - include_role:
+        name: "{{ role_item }}"
+      loop: [base, agent, sensor]
+      loop_control:
+        loop_var: role_item
+- hosts: servers
+  tasks:
+    - include_role:
+        name: "{{ role_item }}"
+      loop: [base, manager]
+      loop_control:
+        loop_var: role_item
+""")
+    # Awaited roles that no other play installs are ignored
+    dependencies = {'agent': {'waits_for': ['wazuh-server', 'manager']}, 'sensor': {'waits_for': ['agent']}}
+    with patch.dict(scheduler.BARRIERS, {'manager': 'manager_up'}):
+        stages = scheduler.deploy_stages(playbook, dependencies)
+
+    assert stages == [
+        {'name': 'agents', 'hosts': 'agents', 'roles': ['base'], 'after': []},
+        {'name': 'agents:agent', 'hosts': 'agents', 'roles': ['agent', 'sensor'], 'after': ['agents', 'servers'],
+         'barrier': 'manager_up'},
+        {'name': 'servers', 'hosts': 'servers', 'roles': ['base', 'manager'], 'after': []},
+    ]
+
+
+def test_deploy_stages_follow_the_playbook_and_role_dependencies():
+    stages = {s['name']: s for s in scheduler.deploy_stages()}
+    assert stages[ENROLLMENT]['roles'] == ['wazuh-agent', 'suricata']
+    assert stages[ENROLLMENT]['after'] == ['agents', 'security_server']
+    assert stages[ENROLLMENT]['barrier'] == 'wazuh_manager'
+    assert 'wazuh-server' in stages['security_server']['roles']
+
+
+def test_plan_keeps_enabled_roles_and_drops_empty_stages():
+    stages = {s['name']: s for s in scheduler.plan_stages(['common', 'wazuh-agent', 'wazuh-server'])}
+    assert stages['security_server']['roles'] == ['common', 'wazuh-server']
+    assert stages[ENROLLMENT]['roles'] == ['wazuh-agent']
+
+    # No server roles: enrollment only waits for the agents' base roles
+    stages = scheduler.plan_stages(['common', 'suricata'], {'agents': {"10.0.0.2"}})
+    assert [(s['name'], s['after']) for s in stages] == [('agents', []), (ENROLLMENT, ['agents'])]
+
+
+def test_stage_command_narrows_hosts_and_roles_but_keeps_enabled_roles():
+    argv = scheduler.stage_command({'hosts': 'agents', 'roles': ['wazuh-agent']}, ['cleanup', 'wazuh-agent'],
+                                   "site.yml", "hosts.ini")
+    assert argv[argv.index("-l") + 1] == "agents"
+    # 'cleanup' stays enabled, so the stage skips the per-role clean.yml like a sequential run
+    assert json.loads(argv[argv.index("-e") + 1]) == {'enabled_roles': ['cleanup', 'wazuh-agent'],
+                                                      'reef_stage_roles': ['wazuh-agent']}
+
+
+def _run(tmp_path, fail=(), barrier=True):
+    inventory = tmp_path / "hosts.ini"
+    inventory.write_text("[security_server]\n10.0.0.1\n\n[agents]\n10.0.0.2\n")
+    started = {}
+
+    def command(stage, enabled_roles, playbook, inventory, extra_args=()):
+        started[stage['name']] = time.monotonic()
+        code = 1 if stage['name'] in fail else 0
+        return [sys.executable, "-c", f"import sys, time; print('{stage['name']}'); time.sleep(0.4); sys.exit({code})"]
+
+    lines = []
+    with patch.object(scheduler, 'stage_command', command), \
+         patch.object(scheduler, 'record_run', lambda *args: None), \
+         patch.object(scheduler.StagedDeploy, '_barrier', lambda self, name: barrier):
+        staged = scheduler.StagedDeploy(ALL_ROLES, inventory=inventory, log_callback=lines.append)
+        start = time.monotonic()
+        result = asyncio.run(staged.run())
+    return result, {name: t - start for name, t in started.items()}, lines
+
+
+def test_independent_stages_run_side_by_side(tmp_path):
+    result, started, lines = _run(tmp_path)
+    assert result['success'], result
+    assert started['agents'] < 0.3 and started['security_server'] < 0.3
+    # Enrollment only starts once both are done
+    assert started[ENROLLMENT] >= 0.4
+    assert "[agents] agents\n" in lines
+
+
+def test_failed_or_closed_dependency_stops_enrollment(tmp_path):
+    result, started, _ = _run(tmp_path, fail=('security_server',))
+    assert not result['success'] and ENROLLMENT not in started
+    assert result['stages'][ENROLLMENT]['message'] == "skipped: security_server failed"
+    assert result['stages']['agents']['success']
+
+    result, started, _ = _run(tmp_path, barrier=False)
+    assert ENROLLMENT not in started and "not ready" in result['stages'][ENROLLMENT]['message']
@@ -0,0 +1,51 @@
+import subprocess
+from unittest.mock import patch
+from reef.manager.ssh import SSHSession
+
+
+def _ok(argv, **kwargs):
+    return subprocess.CompletedProcess(argv, 0, stdout="ok\n", stderr="")
+
+
+def test_password_session_uses_sshpass_env_and_control_socket():
+    with SSHSession("10.0.0.5", "ubuntu", password="s3cret") as session:
+        argv = session.ssh_argv("uptime")
+        assert argv[:2] == ["sshpass", "-e"]
+        assert "s3cret" not in " ".join(argv)
+        assert f"ControlPath={session.control_path}" in argv
+        assert argv[-2:] == ["ubuntu@10.0.0.5", "uptime"]
+        assert session._env()['SSHPASS'] == "s3cret"
+
+
+def test_key_session_scp_argv():
+    with SSHSession("10.0.0.5", "ubuntu", key="/keys/id_rsa") as session:
+        argv = session.scp_argv(["a.tf", "b.tf"], "/tmp/tf/", recursive=True)
+        assert argv[0] == "scp"
+        assert argv[1:3] == ["-i", "/keys/id_rsa"]
+        assert argv[-3:] == ["a.tf", "b.tf", "ubuntu@10.0.0.5:/tmp/tf/"]
+        assert "-r" in argv
+
+
+def test_metrics_count_commands_and_transfers():
+    with patch("reef.manager.ssh.subprocess.run", side_effect=_ok):
+        session = SSHSession("10.0.0.5", "ubuntu", key="/keys/id_rsa")
+        session.run("true")
+        session.run("true")
+        session.copy("main.tf", "/tmp/")
+        session.close()
+
+    assert session.metrics['commands'] == 2
+    assert session.metrics['transfers'] == 1
+    assert session.metrics['failures'] == 0
+    # No master socket was ever created by the mock, so every call counted as a new connection
+    assert session.metrics['connections'] == 3
+
+
+def test_stream_delivers_lines_and_stops_on_request():
+    seen = []
+    with SSHSession("10.0.0.5", "ubuntu") as session:
+        with patch.object(session, "ssh_argv", side_effect=lambda cmd: ["sh", "-c", cmd]):
+            result = session.stream("echo one; echo two >&2; echo three", lambda line: seen.append(line) or line == "two")
+
+    assert seen == ["one", "two"]
+    assert "three" not in result.stdout
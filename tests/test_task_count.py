@@ -0,0 +1,83 @@
+from unittest.mock import patch
+from reef.manager import task_count
+
+
+def _tree(tmp_path):
+    """Playbook looping include_role over enabled_roles, like experimental.yml."""
+    (tmp_path / "playbooks").mkdir()
+    (tmp_path / "tasks").mkdir()
+    for role, main, clean in (("common", 3, 0), ("suricata", 2, 1)):
+        (tmp_path / "roles" / role / "tasks").mkdir(parents=True)
+        (tmp_path / "roles" / role / "tasks" / "main.yml").write_text(
+            "".join(f"- name: {role} {i}\n  debug: msg=x\n" for i in range(main)))
+        if clean:
+            (tmp_path / "roles" / role / "tasks" / "clean.yml").write_text("- debug: msg=clean\n")
+    (tmp_path / "tasks" / "check.yml").write_text(
+        "- debug: msg=a\n- block:\n    - debug: msg=b\n  rescue:\n    - debug: msg=c\n  always:\n    - debug: msg=d\n")
+    (tmp_path / "playbooks" / "site.yml").write_text("""
+- hosts: agents
+  tasks:
+    - include_tasks: ../tasks/check.yml
+    - name: Loop items still report one result
+      debug: msg={{ item }}
+      loop: [1, 2, 3]
+    - include_role:
+        name: "{{ role_item }}"
+        tasks_from: clean.yml
+      loop: [suricata]
+      loop_control:
+        loop_var: role_item
+      when:
+        - "'cleanup' not in enabled_roles"
+        - role_item in enabled_roles
+        - role_item in (reef_stage_roles | default(enabled_roles))
+    - include_role:
+        name: "{{ role_item }}"
+      loop: [common, suricata]
+      loop_control:
+        loop_var: role_item
+      when:
+        - role_item in enabled_roles
+        - role_item in (reef_stage_roles | default(enabled_roles))
+- hosts: security_server
+  gather_facts: false
+  roles:
+    - common
+""")
+    (tmp_path / "hosts.ini").write_text(
+        "[security_server]\n10.0.0.1 ansible_user=root\n\n[agents]\n10.0.0.2\n10.0.0.3  # lab\n\n[all:vars]\nx=1\n")
+    return tmp_path / "playbooks" / "site.yml", tmp_path / "hosts.ini"
+
+
+def test_counts_results_per_host_with_enabled_roles(tmp_path):
+    playbook, inventory = _tree(tmp_path)
+    # agents: facts + check (3) + loop (1) + suricata clean (1) + common (3) + suricata (2); server: common (3)
+    assert task_count.count_playbook_results(playbook, inventory, ['common', 'suricata']) == 2 * 11 + 3
+    assert task_count.count_playbook_results(playbook, inventory, ['common']) == 2 * 8 + 3
+    assert task_count.count_playbook_results(playbook, inventory, ['cleanup', 'suricata']) == 2 * 7 + 3
+    assert task_count.count_playbook_results(playbook, inventory, ['common'], limit="10.0.0.2") == 8
+
+
+def test_stage_roles_narrow_the_count_but_not_the_cleanup_condition(tmp_path):
+    playbook, inventory = _tree(tmp_path)
+    # agents: facts + check (3) + loop (1) + suricata (2), no clean.yml with cleanup enabled; server: common (3)
+    assert task_count.count_playbook_results(playbook, inventory, ['cleanup', 'common', 'suricata'],
+                                             stage_roles=['suricata']) == 2 * 7 + 3
+    assert task_count.count_playbook_results(playbook, inventory, ['common', 'suricata'], stage_roles=['suricata']) == 2 * 8 + 3
+    assert task_count.count_playbook_results(playbook, inventory, ['common', 'suricata'], stage_roles=['common']) == 2 * 8 + 3
+
+
+def test_expected_results_is_cached_by_inputs(tmp_path):
+    playbook, inventory = _tree(tmp_path)
+    with patch.object(task_count, 'TASK_COUNT_CACHE_FILE', tmp_path / "counts.json"):
+        assert task_count.expected_results(playbook, inventory, ['common']) == 19
+        with patch.object(task_count, 'count_playbook_results', side_effect=AssertionError):
+            assert task_count.expected_results(playbook, inventory, ['common']) == 19
+        inventory.write_text("[agents]\n10.0.0.2\n")
+        assert task_count.expected_results(playbook, inventory, ['common']) == 8
+
+
+def test_eta_uses_the_pace_of_past_runs():
+    assert task_count.eta_seconds(10, 40, 2.0) == 60
+    assert task_count.eta_seconds(10, 40, None) is None
+    assert task_count.format_eta(45) == "~45s left" and task_count.format_eta(150) == "~2 min left"
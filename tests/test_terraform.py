@@ -0,0 +1,51 @@
+import json
+from reef.manager import terraform
+from fakes import FakeSession
+
+APPLY_OUTPUT = [
+    "libvirt_volume.agent1-disk: Creating...",
+    "libvirt_domain.agent1: Creating...",
+    "Error: error creating libvirt domain: internal error: process exited while connecting to monitor: "
+    "qemu-system-x86_64: cannot set up guest memory 'pc.ram': Cannot allocate memory",
+    "libvirt_domain.agent2: Still creating... [10s elapsed]",
+]
+
+
+def test_classifier_reports_first_signature_and_lock_id():
+    classifier = terraform.FailureClassifier()
+    assert classifier.feed("Terraform will perform the following actions:") is None
+    assert classifier.feed("Error: Error acquiring the state lock") == 'state_lock'
+    classifier.feed("  ID:        3f2a9c1e-77aa-4b1c-9d0e-8b1f0e2d5a11")
+    assert classifier.feed("context deadline exceeded") == 'state_lock'
+    assert classifier.lock_id == "3f2a9c1e-77aa-4b1c-9d0e-8b1f0e2d5a11"
+
+
+def test_stream_interrupts_once_on_cancelling_signature():
+    session = FakeSession(lines=APPLY_OUTPUT + ["Error: timeout waiting for lease"], stream_returncode=1)
+    logged = []
+    result, failure = terraform.stream_terraform(session, "/tmp/tf", "apply tfplan", logged.append,
+                                                 cancel_on=('memory', 'lease_timeout'))
+
+    assert failure.kind == 'memory'
+    assert result.returncode == 1
+    assert len(session.commands) == 1 and "kill -INT" in session.commands[0]
+    assert "[TF] libvirt_domain.agent1: Creating...\n" in logged
+
+
+def test_error_summary_starts_at_error_block():
+    assert terraform.error_summary("\n".join(APPLY_OUTPUT), max_lines=1).startswith("Error: error creating libvirt domain")
+    assert terraform.error_summary("a\nb\nc", max_lines=2) == "b\nc"
+
+
+def test_state_vm_profiles_reads_domain_and_disk_sizes():
+    show = {'values': {'root_module': {'resources': [
+        {'type': 'libvirt_domain', 'index': 'lab-1', 'values': {'name': 'vm-1', 'memory': 1024, 'vcpu': 1, 'type': 'qemu'}},
+        {'type': 'libvirt_volume', 'values': {'name': 'vm-1.qcow2', 'size': 8 * 1073741824}},
+        {'type': 'libvirt_domain', 'values': {'name': 'vm-2', 'memory': 2048, 'vcpu': 2, 'type': 'kvm'}},
+        {'type': 'libvirt_cloudinit_disk', 'values': {'name': 'vm-2-init-abc.iso'}},
+    ]}}}
+    assert terraform.state_vm_profiles(json.dumps(show)) == {
+        'vm-1': {'key': 'lab-1', 'memory': 1024, 'vcpu': 1, 'accelerated': False, 'disk_gb': 8},
+        'vm-2': {'key': 'vm-2', 'memory': 2048, 'vcpu': 2, 'accelerated': True},
+    }
+    assert terraform.state_vm_profiles("No state.") == {}
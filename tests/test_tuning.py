@@ -0,0 +1,25 @@
+import json
+from reef.manager import tuning
+
+
+def test_forks_follow_hosts_within_controller_limits():
+    assert tuning.auto_forks(3, cpus=8, available_mb=16000) == 3
+    assert tuning.auto_forks(1000, cpus=4, available_mb=16000) == 40
+    assert tuning.auto_forks(1000, cpus=64, available_mb=2000) == 20
+    assert tuning.auto_forks(1000, cpus=64) == tuning.MAX_FORKS
+
+
+def test_auto_settings_depend_on_fleet_size():
+    small = tuning.ansible_settings({}, hosts=4, resources=(4, 8000))
+    assert small == {'forks': 4, 'strategy': 'linear', 'serial': 0, 'hosts': 4}
+    fleet = tuning.ansible_settings({}, hosts=500, resources=(8, 8000))
+    assert fleet == {'forks': 80, 'strategy': 'free', 'serial': 80, 'hosts': 500}
+
+
+def test_explicit_settings_win():
+    config = {'deploy_forks': 12, 'deploy_strategy': 'linear', 'deploy_serial': 50}
+    settings = tuning.ansible_settings(config, hosts=500, resources=(8, 8000))
+    assert (settings['forks'], settings['strategy'], settings['serial']) == (12, 'linear', 50)
+    args = tuning.playbook_args(settings)
+    assert args[:2] == ["--forks", "12"]
+    assert json.loads(args[3]) == {'reef_strategy': 'linear', 'reef_serial': 50}
@@ -0,0 +1,57 @@
+import subprocess
+from unittest.mock import patch
+from reef.manager import vm_lifecycle
+
+HYPERVISORS = [
+    {'ip': "10.0.0.5", 'user': "ubuntu", 'password': "pw", 'key': None},
+    {'ip': "10.0.0.6", 'user': "ubuntu", 'password': None, 'key': "~/.ssh/id"},
+]
+VMS = [{'name': "vm-1", 'hypervisor': "10.0.0.5"}, {'name': "vm-2", 'hypervisor': "10.0.0.6"},
+       {'name': "vm-3", 'hypervisor': "10.0.0.5"}]
+
+
+class FakeSession:
+    calls = []
+
+    def __init__(self, host, user, password=None, key=None):
+        self.host = host
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def run(self, command, timeout=None, input=None):
+        FakeSession.calls.append((self.host, input))
+        domains = [line.split()[0] for line in input.split(vm_lifecycle.RESULT_MARKER)[1:]]
+        out = "".join(f"{vm_lifecycle.RESULT_MARKER}{d} {'failed' if d == 'vm-3' else 'ok'} shut-off boom\n" for d in domains)
+        return subprocess.CompletedProcess(command, 0, stdout=out, stderr="")
+
+
+def test_lifecycle_script_is_valid_bash():
+    script = vm_lifecycle.lifecycle_script('snapshot', ["vm-1", "vm-2"], "before-upgrade")
+    assert subprocess.run(["bash", "-n"], input=script, text=True).returncode == 0
+    assert script.count("snapshot-create-as") == 2
+
+
+def test_parse_lifecycle_output():
+    out = "noise\nREEF_VM vm-1 ok running \nREEF_VM vm-2 failed shut-off error: Domain not found\n"
+    assert vm_lifecycle.parse_lifecycle_output(out) == {
+        'vm-1': {'success': True, 'state': "running", 'message': ""},
+        'vm-2': {'success': False, 'state': "shut off", 'message': "error: Domain not found"},
+    }
+
+
+def test_one_ssh_call_per_hypervisor():
+    FakeSession.calls = []
+    with patch.object(vm_lifecycle, 'get_hypervisors', lambda: HYPERVISORS), \
+         patch.object(vm_lifecycle, 'load_vm_state', lambda: VMS), \
+         patch.object(vm_lifecycle, 'SSHSession', FakeSession):
+        result = vm_lifecycle.run_lifecycle('stop')
+        assert sorted(host for host, _ in FakeSession.calls) == ["10.0.0.5", "10.0.0.6"]
+        assert not result['success'] and result['message'].endswith("vm-3")
+        assert result['vms']['vm-2'] == {'success': True, 'state': "shut off", 'message': "boom"}
+
+        assert not vm_lifecycle.run_lifecycle('snapshot', ["vm-1"], "bad name")['success']
+        assert not vm_lifecycle.run_lifecycle('start', ["vm-9"])['success']
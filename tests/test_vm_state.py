@@ -0,0 +1,88 @@
+import re
+from unittest.mock import patch
+from reef.manager import core, vm_state
+from reef.manager.providers import PROVIDER_VERSION
+
+
+def test_add_and_remove_keep_order_and_store_hashes_only(tmp_path):
+    with patch.object(vm_state, 'VMS_FILE', tmp_path / "vms.yml"):
+        assert vm_state.add_vms([{'name': 'vm-1', 'ssh_password': 's3cret'}])['success']
+        assert vm_state.add_vms([{'name': 'vm-2', 'ssh_password': 's3cret', 'os': 'debian-11'}])['success']
+
+        vms = vm_state.load_vm_state()
+        assert [vm['name'] for vm in vms] == ['vm-1', 'vm-2']
+        assert vms[1]['os'] == 'debian-11'
+        assert vms[0]['ssh_password_hash'].startswith('$6$')
+        assert 's3cret' not in (tmp_path / "vms.yml").read_text()
+
+        assert vm_state.next_vm_names('vm', 2) == ['vm-3', 'vm-4']
+        assert vm_state.add_vms([{'name': 'vm-1'}])['success'] is False
+        assert vm_state.add_vms([{'name': 'VM_1'}])['success'] is False
+
+        assert vm_state.remove_vms(['vm-1'])['success']
+        assert [vm['name'] for vm in vm_state.load_vm_state()] == ['vm-2']
+        assert vm_state.remove_vms(['nope'])['success'] is False
+
+
+def test_stored_hash_keeps_rendered_config_stable(tmp_path):
+    with patch.object(vm_state, 'VMS_FILE', tmp_path / "vms.yml"), patch.object(core, 'TERRAFORM_DIR', tmp_path / "tf"):
+        vm_state.add_vms([{'name': 'vm-1', 'ssh_password': 's3cret'}])
+        core.generate_terraform_vm_config(vm_state.load_vm_state(), '10.0.0.5', 'ubuntu', 'pw')
+        first = (tmp_path / "tf" / "terraform.tfvars.json").read_text()
+        core.generate_terraform_vm_config(vm_state.load_vm_state(), '10.0.0.5', 'ubuntu', 'pw')
+        assert (tmp_path / "tf" / "terraform.tfvars.json").read_text() == first
+
+
+def test_vms_map_matches_the_for_each_module(tmp_path):
+    with patch.object(core, 'TERRAFORM_DIR', tmp_path / "tf"):
+        core.generate_terraform_vm_config([{'name': 'vm-1', 'ssh_password': 's3cret', 'os': 'debian-11'}],
+                                          '10.0.0.5', 'ubuntu', 'pw')
+        vm = core.load_tfvars(tmp_path / "tf")['vms']['vm-1']
+
+    module = (core.TERRAFORM_DIR / "main.tf").read_text()
+    attributes = re.search(r'type = map\(object\(\{(.*?)\}\)\)', module, re.DOTALL).group(1).split()[::3]
+    assert sorted(attributes) == sorted(vm)
+    assert vm['os'] == 'debian-11'
+    assert vm['cloudinit_name'].startswith('cloudinit-vm-1-')
+    assert f'version = "{PROVIDER_VERSION}"' in module
+
+
+def test_sync_vm_inventory_adds_updates_and_drops_vms(tmp_path):
+    hosts = tmp_path / "hosts.ini"
+    hosts.write_text(
+        "[security_server]\n10.0.0.5 ansible_user=ubuntu ansible_password=pw ansible_become_password=pw\n\n"
+        "[agents]\n192.168.122.10 ansible_user=vm-1 ansible_password=keep type=vm hypervisor=10.0.0.5 vm_name=vm-1\n"
+        "192.168.122.11 ansible_user=old type=vm hypervisor=10.0.0.5 vm_name=old\n"
+        "10.0.0.9 ansible_user=root\n"
+    )
+    with patch.object(vm_state, 'VMS_FILE', tmp_path / "vms.yml"), patch.object(core, 'HOSTS_INI_FILE', hosts):
+        vm_state.save_vm_state([{'name': 'vm-1', 'os': 'ubuntu-22.04'}, {'name': 'vm-2', 'os': 'ubuntu-22.04'}])
+        assert core.sync_vm_inventory({'vm-1': '192.168.122.20', 'vm-2': '192.168.122.21'}, {'vm-2': 'new'})
+        by_ip = {h['ip']: h for h in core.get_inventory_hosts()}
+
+    assert '192.168.122.11' not in by_ip
+    assert by_ip['192.168.122.20']['password'] == 'keep'
+    assert by_ip['192.168.122.21']['password'] == 'new'
+    assert by_ip['192.168.122.21']['ansible_ssh_common_args'].startswith('-o ProxyCommand=')
+    assert '10.0.0.9' in by_ip
+
+
+def test_vms_keep_their_hypervisor_and_reach_it_through_a_proxy(tmp_path):
+    hosts = tmp_path / "hosts.ini"
+    hosts.write_text(
+        "[security_server]\n10.0.0.5 ansible_user=ubuntu ansible_password=pw\n\n"
+        "[hypervisors]\n10.0.0.6 ansible_user=kvm ansible_ssh_private_key_file=~/.ssh/kvm\n\n"
+        "[agents]\n192.168.122.10 ansible_user=vm-1 type=vm hypervisor=10.0.0.6 vm_name=vm-1\n"
+    )
+    with patch.object(vm_state, 'VMS_FILE', tmp_path / "vms.yml"), patch.object(core, 'HOSTS_INI_FILE', hosts):
+        vm_state.save_vm_state([{'name': 'vm-1', 'os': 'ubuntu-22.04'}])
+        vms = vm_state.load_vm_state()
+        assert core.place_vms(vms, core.get_hypervisors())['success']
+        assert vm_state.load_vm_state()[0]['hypervisor'] == '10.0.0.6'
+
+        assert core.sync_vm_inventory({'vm-1': '192.168.122.20'})
+        by_ip = {h['ip']: h for h in core.get_inventory_hosts()}
+        assert [h['ip'] for h in core.get_hypervisors()] == ['10.0.0.5', '10.0.0.6']
+
+    assert by_ip['192.168.122.20']['hypervisor'] == '10.0.0.6'
+    assert 'kvm@10.0.0.6' in by_ip['192.168.122.20']['ansible_ssh_common_args']